@@ -13,58 +13,17 @@ from documentflow.models import (
     DocumentRouteStep,
     DocumentVersion,
     Notification,
-    Replacement,
-    EmployeeStatus,
 )
+from documentflow.services.approval_flow import start_document_route
+from documentflow.services.chunked_uploads import claim_uploads, requested_uploads, upload_session_errors
+from documentflow.services.document_files import attach_files
+from documentflow.services.registration import next_registration_number
+from documentflow.services.route_state import sync_route_state
+from documentflow.uploads import upload_errors
 from django.utils import timezone
-from django.db.models import Count, Max, Min
-
-
-def _resolve_approver(user):
-    if user.status in [
-        EmployeeStatus.VACATION,
-        EmployeeStatus.SICK,
-        EmployeeStatus.BUSINESS_TRIP,
-        EmployeeStatus.MATERNITY,
-        EmployeeStatus.IDLE,
-        EmployeeStatus.OTHER,
-        EmployeeStatus.DISMISSED,
-    ]:
-        today = timezone.localdate()
-        replacement = (
-            Replacement.objects
-            .filter(
-                absent_employee=user,
-                is_active=True,
-                start_date__lte=today,
-                end_date__gte=today,
-                replacement_employee__is_active=True,
-                replacement_employee__status=EmployeeStatus.WORKING
-            )
-            .order_by('-start_date')
-            .first()
-        )
-        if replacement:
-            return replacement.replacement_employee
-        if user.department and user.department.head:
-            head = user.department.head
-            if head.is_active and head.status == EmployeeStatus.WORKING and head.id != user.id:
-                return head
-        fallback = (
-            User.objects
-            .filter(
-                department=user.department,
-                is_active=True,
-                status=EmployeeStatus.WORKING
-            )
-            .exclude(id=user.id)
-            .order_by('last_name', 'first_name')
-            .first()
-        )
-        if fallback:
-            return fallback
-        return None
-    return user
+from django.db import transaction
+from django.db.models import Count
+
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField(required=True)
@@ -164,37 +123,28 @@ class DocumentSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return None
-        base_qs = Approval.objects.filter(document=obj, approver=request.user)
-        max_cycle = base_qs.aggregate(max_cycle=Max('cycle'))['max_cycle']
-        if max_cycle:
-            # Prefer latest cycle to avoid showing old decisions
-            cycle_qs = base_qs.filter(cycle=max_cycle)
-        else:
-            cycle_qs = base_qs
-
-        pending = (
-            cycle_qs
-            .filter(decision='pending')
-            .order_by('-created_at')
-            .first()
-        )
+        # Списки заранее подгружают согласования сотрудника для всей страницы (user_approvals)
+        approvals = getattr(obj, 'user_approvals', None)
+        if approvals is None:
+            approvals = list(
+                Approval.objects
+                .filter(document=obj, approver=request.user)
+                .order_by('-cycle', '-created_at')
+            )
+        if not approvals:
+            return None
+
+        # Prefer latest cycle to avoid showing old decisions
+        cycle_rows = [a for a in approvals if a.cycle == approvals[0].cycle]
+        pending = [a for a in cycle_rows if a.decision == 'pending']
         if pending:
-            if obj.approval_order == 'sequential':
-                min_step = cycle_qs.filter(decision='pending').aggregate(min_step=Min('step'))['min_step']
-                if min_step is not None and pending.step != min_step:
-                    return pending
-            return pending
-
-        decided = (
-            cycle_qs
-            .exclude(decision='pending')
-            .order_by('-decided_at', '-created_at')
-            .first()
-        )
+            return pending[0]
+
+        decided = [a for a in cycle_rows if a.decided_at]
         if decided:
-            return decided
+            return max(decided, key=lambda a: (a.decided_at, a.created_at))
 
-        return cycle_qs.order_by('-created_at').first()
+        return cycle_rows[0]
 
     def get_user_decision(self, obj):
         approval = self._get_user_approval(obj)
@@ -205,47 +155,32 @@ class DocumentSerializer(serializers.ModelSerializer):
         return approval.get_decision_display() if approval else None
     
     def create(self, validated_data):
-        # Автоматически генерируем регистрационный номер
-        from datetime import datetime
-        today = datetime.now()
-        year = today.year
-        month = today.month
-        
-        # Находим последний номер за текущий месяц
-        last_doc = Document.objects.filter(
-            registration_number__startswith=f"{year:04d}-{month:02d}-"
-        ).order_by('-registration_number').first()
-        
-        if last_doc:
-            last_num = int(last_doc.registration_number.split('-')[-1])
-            next_num = last_num + 1
-        else:
-            next_num = 1
-        
-        validated_data['registration_number'] = f"{year:04d}-{month:02d}-{next_num:04d}"
-        
         # Устанавливаем текущего пользователя как автора, если не указан
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             if 'author' not in validated_data:
                 validated_data['author'] = request.user
-        
-        # Создаем документ
-        document = Document.objects.create(**validated_data)
-        
-        # Если выбрана автоматическая рассылка, создаем получателей
-        if document.delivery_mode == 'auto' and hasattr(document.document_type, 'routes'):
-            routes = document.document_type.routes.all().order_by('step')
-            for i, route in enumerate(routes, 1):
-                # Находим пользователей с нужной ролью
-                users_with_role = User.objects.filter(role=route.role, is_active=True)
-                for user in users_with_role:
-                    DocumentRecipient.objects.create(
-                        document=document,
-                        user=user,
-                        order=i
-                    )
-        
+
+        with transaction.atomic():
+            # Автоматически выдаём регистрационный номер из счётчика периода
+            validated_data['registration_number'] = next_registration_number(validated_data.get('document_type'))
+
+            # Создаем документ
+            document = Document.objects.create(**validated_data)
+
+            # Если выбрана автоматическая рассылка, создаем получателей
+            if document.delivery_mode == 'auto' and hasattr(document.document_type, 'routes'):
+                routes = document.document_type.routes.all().order_by('step')
+                for i, route in enumerate(routes, 1):
+                    # Находим пользователей с нужной ролью
+                    users_with_role = User.objects.filter(role=route.role, is_active=True)
+                    for user in users_with_role:
+                        DocumentRecipient.objects.create(
+                            document=document,
+                            user=user,
+                            order=i
+                        )
+
         return document
     
     def update(self, instance, validated_data):
@@ -254,6 +189,7 @@ class DocumentSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         
         instance.save()
+        sync_route_state(instance)
         return instance
 
 from rest_framework import serializers
@@ -262,19 +198,42 @@ from documentflow.models import Document, DocumentType, DocumentStatus, Document
 
 class DocumentFileSerializer(serializers.ModelSerializer):
     uploaded_by = UserShortSerializer(read_only=True)
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
     
     class Meta:
         model = DocumentFile
-        fields = ['id', 'file', 'file_name', 'file_size', 'file_type', 
-                 'uploaded_at', 'uploaded_by', 'description']
-        read_only_fields = ['file_name', 'file_size', 'file_type', 'uploaded_at', 'uploaded_by']
+        fields = ['id', 'file', 'download_url', 'thumbnail_url', 'preview_status', 'preview_text',
+                 'file_name', 'file_size', 'file_type', 'uploaded_at', 'uploaded_by', 'description']
+        read_only_fields = ['file_name', 'file_size', 'file_type', 'uploaded_at', 'uploaded_by',
+                            'preview_status', 'preview_text']
+        # Путь в хранилище наружу не отдаётся: файл скачивается только через download_url
+        extra_kwargs = {'file': {'write_only': True}}
+
+    def get_download_url(self, obj):
+        return f'/api/files/{obj.id}/download/'
+
+    def get_thumbnail_url(self, obj):
+        if obj.preview_status == 'ready' and obj.thumbnail:
+            return f'/api/files/{obj.id}/thumbnail/'
+        return None
 
 class DocumentVersionSerializer(serializers.ModelSerializer):
     created_by = UserShortSerializer(read_only=True)
+    download_url = serializers.SerializerMethodField()
+    file_id = serializers.SerializerMethodField()
 
     class Meta:
         model = DocumentVersion
-        fields = ['id', 'file', 'version', 'created_at', 'created_by']
+        fields = ['id', 'file', 'file_id', 'download_url', 'version', 'created_at', 'created_by']
+        extra_kwargs = {'file': {'write_only': True}}
+
+    def get_download_url(self, obj):
+        return f'/api/versions/{obj.id}/download/'
+
+    def get_file_id(self, obj):
+        """Файл документа с тем же содержимым, что и версия"""
+        return next((f.id for f in obj.document.files.all() if f.file.name == obj.file.name), None)
 
 
 # 🆕 Сериализаторы для новых моделей
@@ -384,6 +343,16 @@ class DocumentCreateSerializer(serializers.ModelSerializer):
             'action_type',
         ]
 
+    def validate(self, attrs):
+        request = self.context.get('request')
+        if request is not None and hasattr(request, 'FILES'):
+            errors = upload_errors(request, request.FILES.getlist('files')) + upload_session_errors(
+                request.user, requested_uploads(request.data)
+            )
+            if errors:
+                raise serializers.ValidationError({'files': errors})
+        return attrs
+
     def create(self, validated_data):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
@@ -438,204 +407,48 @@ class DocumentCreateSerializer(serializers.ModelSerializer):
                 if not manual_route:
                     raise serializers.ValidationError("Для ручного маршрута нужен manual_route")
 
-        # ❗ author НЕ передаём здесь, если он передаётся через serializer.save()
-        document = Document.objects.create(
-            title=validated_data["title"],
-            document_type=validated_data["document_type"],
-            priority=validated_data.get("priority", "normal"),
-            description=validated_data.get("description", ""),
-            deadline=validated_data["deadline"],
-            delivery_mode=delivery_mode,
-            approval_order=approval_order,
-            manual_route=manual_route if delivery_mode == 'manual' else None,
-            action_type=action_type,
-            author=user,
-            responsible=user,   # ← ОБЯЗАТЕЛЬНО ЗДЕСЬ
-            status=status,
-        )
-
-
-        # ===== Генерация регистрационного номера =====
-        from datetime import datetime
-        today = datetime.now()
-        prefix = f"{today.year:04d}-{today.month:02d}-"
-
-        last_doc = Document.objects.filter(
-            registration_number__startswith=prefix
-        ).order_by('-registration_number').first()
-
-        next_num = int(last_doc.registration_number.split('-')[-1]) + 1 if last_doc else 1
-        document.registration_number = f"{prefix}{next_num:04d}"
-        if not document.external_number:
-            document.external_number = document.registration_number
-        if not document.external_date:
-            document.external_date = timezone.now().date()
-        document.save()
-
-        # ===== Сохранение файлов =====
-        files = []
-        if request and hasattr(request, 'FILES'):
-            files = request.FILES.getlist('files')
-
-        for file_obj in files:
-            doc_file = DocumentFile.objects.create(
-                document=document,
-                file=file_obj,
-                uploaded_by=user,
+        # Номер, документ, файлы и маршрут записываются в одной транзакции:
+        # при любой ошибке откатывается и выдача номера, поэтому в нумерации
+        # не остаётся пропусков. Строка счётчика периода остаётся
+        # заблокированной до фиксации, claim_uploads блокирует сессии загрузок
+        with transaction.atomic():
+            registration_number = next_registration_number(document_type)
+
+            # ❗ author НЕ передаём здесь, если он передаётся через serializer.save()
+            document = Document.objects.create(
+                registration_number=registration_number,
+                external_number=registration_number,
+                external_date=timezone.now().date(),
+                title=validated_data["title"],
+                document_type=validated_data["document_type"],
+                priority=validated_data.get("priority", "normal"),
+                description=validated_data.get("description", ""),
+                deadline=validated_data["deadline"],
+                delivery_mode=delivery_mode,
+                approval_order=approval_order,
+                manual_route=manual_route if delivery_mode == 'manual' else None,
+                action_type=action_type,
+                author=user,
+                responsible=user,   # ← ОБЯЗАТЕЛЬНО ЗДЕСЬ
+                status=status,
             )
-            DocumentVersion.objects.create(
-                document=document,
-                file=doc_file.file,
-                created_by=user,
-            )
-
-        # ===== Формирование маршрута =====
-        if status_code == 'draft':
-            return document
-
-        if delivery_mode == 'auto':
-            approval_order = template.approval_order
-
-            sequential_created = []
-            for step in template.steps.all().order_by('step_number'):
-                users = []
-
-                if step.user:
-                    resolved = _resolve_approver(step.user)
-                    if resolved and resolved != document.author:
-                        users.append(resolved)
-                elif step.department:
-                    users.extend(
-                        User.objects.filter(
-                            department=step.department,
-                            is_active=True
-                        )
-                    )
-                users = [_resolve_approver(u) for u in users]
-                users = [u for u in users if u]
-                users = [u for u in users if u != document.author]
-                users = list({u.id: u for u in users}.values())
-
-                for approver in users:
-                    approval, created = Approval.objects.get_or_create(
-                        document=document,
-                        approver=approver,
-                        step=step.step_number if approval_order == 'sequential' else 1,
-                        cycle=1,
-                        defaults={
-                            'decision': 'pending',
-                            'is_required': True
-                        }
-                    )
-                    if created:
-                        if approval_order == 'sequential':
-                            sequential_created.append(approval)
-                        else:
-                            Notification.objects.create(
-                                user=approver,
-                                notification_type='new_document',
-                                title='Новый документ',
-                                text=f'{document.registration_number} — {document.title}',
-                                link=f'/documents/incoming/?open={document.id}',
-                                document=document,
-                                sender=user
-                            )
-            if approval_order == 'sequential' and sequential_created:
-                min_step = min(a.step for a in sequential_created)
-                for approval in [a for a in sequential_created if a.step == min_step]:
-                    Notification.objects.create(
-                        user=approval.approver,
-                        notification_type='new_document',
-                        title='Новый документ',
-                        text=f'{document.registration_number} — {document.title}',
-                        link=f'/documents/incoming/?open={document.id}',
-                        document=document,
-                        sender=user
-                    )
 
-        else:
-            sequential_created = []
-            for i, step_data in enumerate(manual_route, start=1):
-                step_number = i if approval_order == 'sequential' else 1
-
-                if step_data.get('type') == 'user':
-                    try:
-                        approver = User.objects.get(
-                            id=step_data['id'],
-                            is_active=True
-                        )
-                        approver = _resolve_approver(approver)
-                        if not approver:
-                            continue
-                        approval, created = Approval.objects.get_or_create(
-                            document=document,
-                            approver=approver,
-                            step=step_number,
-                            cycle=1,
-                            defaults={
-                                'decision': 'pending',
-                                'is_required': True
-                            }
-                        )
-                        if created:
-                            if approval_order == 'sequential':
-                                sequential_created.append(approval)
-                            else:
-                                Notification.objects.create(
-                                    user=approver,
-                                    notification_type='new_document',
-                                    title='Новый документ',
-                                    text=f'{document.registration_number} — {document.title}',
-                                    link=f'/documents/incoming/?open={document.id}',
-                                    document=document,
-                                    sender=user
-                                )
-                    except User.DoesNotExist:
-                        continue
-
-                elif step_data.get('type') == 'department':
-                    users = User.objects.filter(
-                        department_id=step_data['id'],
-                        is_active=True
-                    )
-                    resolved_users = [_resolve_approver(u) for u in users]
-                    resolved_users = [u for u in resolved_users if u]
-                    resolved_users = list({u.id: u for u in resolved_users}.values())
-                    for approver in resolved_users:
-                        approval, created = Approval.objects.get_or_create(
-                            document=document,
-                            approver=approver,
-                            step=step_number,
-                            cycle=1,
-                            defaults={
-                                'decision': 'pending',
-                                'is_required': True
-                            }
-                        )
-                        if created:
-                            if approval_order == 'sequential':
-                                sequential_created.append(approval)
-                            else:
-                                Notification.objects.create(
-                                    user=approver,
-                                    notification_type='new_document',
-                                    title='Новый документ',
-                                    text=f'{document.registration_number} — {document.title}',
-                                    link=f'/documents/incoming/?open={document.id}',
-                                    document=document,
-                                    sender=user
-                                )
-            if approval_order == 'sequential' and sequential_created:
-                min_step = min(a.step for a in sequential_created)
-                for approval in [a for a in sequential_created if a.step == min_step]:
-                    Notification.objects.create(
-                        user=approval.approver,
-                        notification_type='new_document',
-                        title='Новый документ',
-                        text=f'{document.registration_number} — {document.title}',
-                        link=f'/documents/incoming/?open={document.id}',
-                        document=document,
-                        sender=user
-                    )
+            # ===== Сохранение файлов =====
+            files = []
+            if request and hasattr(request, 'FILES'):
+                files = request.FILES.getlist('files') + claim_uploads(user, requested_uploads(request.data))
+
+            attach_files(document, files, user)
+
+            # ===== Формирование маршрута =====
+            if status_code != 'draft':
+                start_document_route(
+                    document,
+                    cycle=1,
+                    template=template,
+                    manual_route=manual_route,
+                    approval_order=approval_order,
+                    sender=user,
+                )
 
         return document
@@ -24,8 +24,21 @@ from .views import (
     ReplacementSelfAPIView,
     MeAPIView,
     DocumentHistoryAPIView,
+    DocumentHistoryReportAPIView,
+    HistoryExportAPIView,
+    HistoryReportStatusAPIView,
+    DocumentFileDownloadAPIView,
+    DocumentFileThumbnailAPIView,
+    DocumentFilesZipAPIView,
+    DocumentVersionDownloadAPIView,
+    UploadSessionCreateAPIView,
+    UploadSessionAPIView,
+    UploadSessionCompleteAPIView,
     DashboardStatsAPIView,
+    PersonalStatsAPIView,
     NotificationsAPIView,
+    NotificationsStreamAPIView,
+    NotificationsPollAPIView,
     MarkAllNotificationsReadAPIView,
     MarkNotificationReadAPIView,
 )
@@ -89,8 +102,21 @@ urlpatterns = [
     path('documents/<int:pk>/archive/', DocumentApprovalViewSet.as_view({'post': 'archive'}), name='document-archive'),
     path('documents/<int:pk>/unarchive/', DocumentApprovalViewSet.as_view({'post': 'unarchive'}), name='document-unarchive'),
     path('documents/<int:pk>/history/', DocumentHistoryAPIView, name='document-history'),
+    path('documents/<int:pk>/history/report/', DocumentHistoryReportAPIView, name='document-history-report'),
+    path('history-reports/<int:pk>/', HistoryReportStatusAPIView, name='history-report-status'),
+    path('documents/history-export/', HistoryExportAPIView, name='document-history-export'),
+    path('documents/<int:pk>/files.zip', DocumentFilesZipAPIView, name='document-files-zip'),
+    path('files/<int:pk>/download/', DocumentFileDownloadAPIView, name='document-file-download'),
+    path('files/<int:pk>/thumbnail/', DocumentFileThumbnailAPIView, name='document-file-thumbnail'),
+    path('versions/<int:pk>/download/', DocumentVersionDownloadAPIView, name='document-version-download'),
+    path('uploads/', UploadSessionCreateAPIView, name='upload-session-create'),
+    path('uploads/<uuid:pk>/', UploadSessionAPIView, name='upload-session'),
+    path('uploads/<uuid:pk>/complete/', UploadSessionCompleteAPIView, name='upload-session-complete'),
     path('dashboard/stats/', DashboardStatsAPIView, name='dashboard-stats'),
+    path('stats/', PersonalStatsAPIView, name='personal-stats'),
     path('notifications/', NotificationsAPIView, name='notifications'),
+    path('notifications/stream/', NotificationsStreamAPIView, name='notifications-stream'),
+    path('notifications/poll/', NotificationsPollAPIView, name='notifications-poll'),
     path('notifications/mark-all-read/', MarkAllNotificationsReadAPIView, name='notifications-mark-all-read'),
     path('notifications/<int:pk>/read/', MarkNotificationReadAPIView, name='notification-mark-read'),
 
@@ -7,26 +7,51 @@ from django.contrib.auth import authenticate, login as django_login, logout as d
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Min, Max, OuterRef, Subquery, Count, Exists
 from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.utils.html import strip_tags
 from django.utils.crypto import get_random_string
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.password_validation import validate_password
-import json
-from django.http import HttpResponse
+import asyncio
 import io
+import json
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import content_disposition_header
+from asgiref.sync import sync_to_async
 
 from documentflow.models import (
     DocumentType, Department, Document, DocumentStatus, DocumentRouteTemplate,
     User, Approval, DocumentFile, DocumentVersion, Notification, EmailChangeRequest,
-    Replacement, EmployeeStatus
+    Replacement, EmployeeStatus, HistoryReport, UploadSession
+)
+from documentflow.services.analytics import dashboard_summary, personal_stats
+from documentflow.services.approval_flow import start_document_route
+from documentflow.services.chunked_uploads import (
+    UploadError, claim_uploads, finish_upload, parse_content_range, requested_uploads,
+    start_upload, upload_payload, upload_session_errors, write_chunk
+)
+from documentflow.services.document_files import attach_files
+from documentflow.services.email_templates import send_template_email
+from documentflow.services.file_bundle import bundle_entries, iter_files_zip
+from documentflow.services.history_export import export_documents, iter_history_zip
+from documentflow.services.history_report import (
+    build_report, history_documents, render_history, report_for, start_report
 )
+from documentflow.services.notification_bus import (
+    get_broker, latest_notification_id, notification_payload, notifications_since, resync_interval,
+    streaming_supported
+)
+from documentflow.services.notifications import notify
+from documentflow.services.rollups import record_decision
+from documentflow.services.route_state import sync_route_state
+from documentflow.services.unread import mark_read, unread_count
+from documentflow.downloads import PREVIEW_CACHE_CONTROL, serve_file, viewable_documents
+from documentflow.filters import DocumentSearchFilter
+from documentflow.uploads import discard_unattached_uploads, install_upload_handlers, upload_errors
 from .serializers import (
     DocumentTypeSerializer, DepartmentSerializer,
     UserSerializer, DocumentSerializer,
@@ -41,6 +66,8 @@ from .serializers import (
 def _is_current_step(document, approval):
     if document.approval_order != 'sequential':
         return True
+    if approval.cycle == document.current_cycle:
+        return document.current_step is None or approval.step == document.current_step
     min_step = Approval.objects.filter(
         document=document,
         decision='pending',
@@ -49,59 +76,28 @@ def _is_current_step(document, approval):
     return min_step is None or approval.step == min_step
 
 
+def _with_user_approvals(queryset, user):
+    """
+    Подгружает согласования текущего сотрудника одним запросом на страницу,
+    чтобы DocumentSerializer не обращался к БД для каждой строки.
+    """
+    if not user.is_authenticated:
+        return queryset
+    return queryset.prefetch_related(
+        models.Prefetch(
+            'approvals',
+            queryset=Approval.objects.filter(approver=user).order_by('-cycle', '-created_at'),
+            to_attr='user_approvals',
+        )
+    )
+
+
 class StandardPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
 
-def _resolve_approver(user):
-    if user.status in [
-        EmployeeStatus.VACATION,
-        EmployeeStatus.SICK,
-        EmployeeStatus.BUSINESS_TRIP,
-        EmployeeStatus.MATERNITY,
-        EmployeeStatus.IDLE,
-        EmployeeStatus.OTHER,
-        EmployeeStatus.DISMISSED,
-    ]:
-        today = timezone.localdate()
-        replacement = (
-            Replacement.objects
-            .filter(
-                absent_employee=user,
-                is_active=True,
-                start_date__lte=today,
-                end_date__gte=today,
-                replacement_employee__is_active=True,
-                replacement_employee__status=EmployeeStatus.WORKING
-            )
-            .order_by('-start_date')
-            .first()
-        )
-        if replacement:
-            return replacement.replacement_employee
-        if user.department and user.department.head:
-            head = user.department.head
-            if head.is_active and head.status == EmployeeStatus.WORKING and head.id != user.id:
-                return head
-        fallback = (
-            User.objects
-            .filter(
-                department=user.department,
-                is_active=True,
-                status=EmployeeStatus.WORKING
-            )
-            .exclude(id=user.id)
-            .order_by('last_name', 'first_name')
-            .first()
-        )
-        if fallback:
-            return fallback
-        return None
-    return user
-
-
 # ============ VIEWSETS ============
 
 
@@ -262,45 +258,8 @@ def RequestEmailChangeAPIView(request):
     code = get_random_string(6, allowed_chars='0123456789')
     EmailChangeRequest.objects.create(user=request.user, new_email=new_email, code=code)
 
-    subject = 'Подтверждение смены email'
-    html_message = f"""
-    <div style="font-family: Arial, sans-serif; background:#f6f7fb; padding:24px;">
-        <div style="max-width:640px; margin:0 auto; background:#ffffff; border-radius:14px; border:1px solid #e6e8ef; overflow:hidden;">
-            <div style="padding:18px 22px; background:#0f766e;">
-                <div style="color:#ffffff; font-size:18px; font-weight:700;">DocumentFlow</div>
-                <div style="color:#d1fae5; font-size:12px;">Подтверждение смены email</div>
-            </div>
-            <div style="padding:22px;">
-                <p style="margin:0 0 10px 0; color:#111827; font-size:14px;">Здравствуйте!</p>
-                <p style="margin:0 0 16px 0; color:#374151; font-size:13px;">
-                    Вы запросили смену email в системе DocumentFlow. Используйте код ниже, чтобы подтвердить действие.
-                </p>
-                <div style="border:1px solid #e5e7eb; border-radius:10px; padding:14px; background:#f9fafb; text-align:center;">
-                    <div style="color:#6b7280; font-size:11px; text-transform:uppercase; letter-spacing:0.08em;">Код подтверждения</div>
-                    <div style="font-size:22px; font-weight:700; color:#111827; letter-spacing:0.2em;">{code}</div>
-                </div>
-                <p style="margin:16px 0 0 0; color:#6b7280; font-size:12px;">
-                    Код действует 10 минут. Если вы не запрашивали смену email — просто проигнорируйте это письмо.
-                </p>
-            </div>
-            <div style="padding:12px 22px; background:#f3f4f6; color:#9ca3af; font-size:11px;">
-                Это письмо отправлено автоматически, отвечать на него не нужно.
-            </div>
-        </div>
-    </div>
-    """
-    message = strip_tags(html_message)
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=message,
-            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-            to=[request.user.email],
-        )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-    except Exception as exc:
-        return Response({'error': f'Не удалось отправить письмо: {exc}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Письмо уходит через очередь (команда send_outbox), запрос не ждёт почтовый сервер
+    send_template_email(request.user.email, 'email_change_code', {'code': code})
 
     return Response({'status': 'code_sent'}, status=status.HTTP_200_OK)
 
@@ -365,45 +324,7 @@ def ResendEmailChangeCodeAPIView(request):
     req.last_sent_at = now
     req.save(update_fields=['resend_count', 'last_sent_at'])
 
-    subject = 'Подтверждение смены email'
-    html_message = f"""
-    <div style="font-family: Arial, sans-serif; background:#f6f7fb; padding:24px;">
-        <div style="max-width:640px; margin:0 auto; background:#ffffff; border-radius:14px; border:1px solid #e6e8ef; overflow:hidden;">
-            <div style="padding:18px 22px; background:#0f766e;">
-                <div style="color:#ffffff; font-size:18px; font-weight:700;">DocumentFlow</div>
-                <div style="color:#d1fae5; font-size:12px;">Повторная отправка кода</div>
-            </div>
-            <div style="padding:22px;">
-                <p style="margin:0 0 10px 0; color:#111827; font-size:14px;">Здравствуйте!</p>
-                <p style="margin:0 0 16px 0; color:#374151; font-size:13px;">
-                    Вы запросили повторную отправку кода для смены email.
-                </p>
-                <div style="border:1px solid #e5e7eb; border-radius:10px; padding:14px; background:#f9fafb; text-align:center;">
-                    <div style="color:#6b7280; font-size:11px; text-transform:uppercase; letter-spacing:0.08em;">Код подтверждения</div>
-                    <div style="font-size:22px; font-weight:700; color:#111827; letter-spacing:0.2em;">{req.code}</div>
-                </div>
-                <p style="margin:16px 0 0 0; color:#6b7280; font-size:12px;">
-                    Код действует 10 минут. Если вы не запрашивали смену email — просто проигнорируйте это письмо.
-                </p>
-            </div>
-            <div style="padding:12px 22px; background:#f3f4f6; color:#9ca3af; font-size:11px;">
-                Это письмо отправлено автоматически, отвечать на него не нужно.
-            </div>
-        </div>
-    </div>
-    """
-    message = strip_tags(html_message)
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=message,
-            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-            to=[request.user.email],
-        )
-        email.attach_alternative(html_message, "text/html")
-        email.send(fail_silently=False)
-    except Exception as exc:
-        return Response({'error': f'Не удалось отправить письмо: {exc}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    send_template_email(request.user.email, 'email_change_code', {'code': req.code, 'resend': True})
 
     return Response({'status': 'resent'}, status=status.HTTP_200_OK)
 
@@ -544,10 +465,34 @@ class DocumentRouteListAPIView(generics.ListAPIView):
 # ============ DOCUMENT CRUD ============
 
 
-class DocumentListCreateAPIView(generics.ListCreateAPIView):
+class StreamingUploadMixin:
+    """
+    Файлы из multipart-запроса пишутся сразу в хранилище потоковым
+    обработчиком; не привязанные к документу после ответа удаляются.
+    Обработчик ставится до проверки CSRF, которая уже читает тело запроса.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        install_upload_handlers(request, DocumentFile._meta.get_field('file'))
+        return super().initialize_request(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            discard_unattached_uploads(request)
+
+
+class DocumentListCreateAPIView(StreamingUploadMixin, generics.ListCreateAPIView):
     queryset = Document.objects.all()
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        documents = Document.objects.select_related(
+            'status', 'author__department', 'responsible__department'
+        )
+        return _with_user_approvals(documents, self.request.user)
+
     def get_serializer_class(self):
         return DocumentCreateSerializer if self.request.method == 'POST' else DocumentSerializer
 
@@ -575,11 +520,15 @@ class DocumentRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
         """Пользователи видят только свои документы"""
         user = self.request.user
         if user.is_authenticated:
-            return Document.objects.filter(
+            documents = Document.objects.filter(
                 models.Q(author=user)
                 | models.Q(responsible=user)
                 | models.Q(approvals__approver=user)
             ).distinct()
+            if self.request.method == 'GET':
+                # Версии сопоставляются с файлами документа (file_id) без запроса на версию
+                documents = documents.prefetch_related('files__uploaded_by__department', 'versions__created_by__department')
+            return documents
         return Document.objects.none()
 
 
@@ -599,12 +548,12 @@ class IncomingDocumentsAPIView(generics.ListAPIView):
     - status: статус документа
     - priority: приоритет
     - document_type: тип документа
-    - search: поиск по названию или номеру
+    - search: полнотекстовый поиск по названию, номеру, описанию и тексту вложений
     """
     serializer_class = DocumentSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DocumentSearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'registration_number', 'description']
     ordering_fields = ['created_at', 'deadline', 'priority']
     ordering = ['-created_at']
@@ -615,59 +564,19 @@ class IncomingDocumentsAPIView(generics.ListAPIView):
         if not user.is_authenticated:
             return Document.objects.none()
 
-        _ensure_cycle()
-
-        doc_max_cycle = (
-            Approval.objects.filter(document_id=OuterRef('pk'))
-            .values('document_id')
-            .annotate(max_cycle=Max('cycle'))
-            .values('max_cycle')
-        )
-        approval_max_cycle = (
-            Approval.objects.filter(document_id=OuterRef('document_id'))
-            .values('document_id')
-            .annotate(max_cycle=Max('cycle'))
-            .values('max_cycle')
-        )
-        approval_min_pending_step = (
-            Approval.objects.filter(
-                document_id=OuterRef('document_id'),
-                decision='pending',
-                cycle=Subquery(approval_max_cycle),
-            )
-            .values('document_id')
-            .annotate(min_step=Min('step'))
-            .values('min_step')
-        )
-        current_pending_ids = (
-            Approval.objects.filter(
-                approver=user,
-                decision='pending',
-                cycle=Subquery(approval_max_cycle),
-            )
-            .filter(
-                models.Q(step=Subquery(approval_min_pending_step))
-                | models.Q(document__approval_order='parallel')
-            )
-            .values('document_id')
-        )
-
         documents = (
             Document.objects
-            .filter(is_archived=False)
             .filter(
-                models.Q(id__in=Subquery(current_pending_ids))
-                | models.Q(
-                    approvals__approver=user,
-                    approvals__decision__in=[
-                        'approved', 'rejected', 'acknowledged', 'executed', 'returned'
-                    ],
-                    approvals__cycle=Subquery(doc_max_cycle),
-                )
+                inbox_entries__user=user,
+                inbox_entries__is_archived=False,
+                inbox_entries__is_visible=True,
+            )
+            .select_related(
+                'document_type', 'status',
+                'author__department', 'responsible__department'
             )
-            .select_related('document_type', 'status', 'author', 'responsible')
-            .distinct()
         )
+        documents = _with_user_approvals(documents, user)
 
         # Применяем фильтры
         status_filter = self.request.query_params.get('status')
@@ -692,11 +601,12 @@ class MyDocumentsAPIView(generics.ListAPIView):
     - status: статус документа
     - priority: приоритет
     - document_type: тип документа
+    - search: полнотекстовый поиск по названию, номеру, описанию и тексту вложений
     """
     serializer_class = DocumentSerializer
     permission_classes = [AllowAny]
     pagination_class = StandardPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DocumentSearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'registration_number', 'description']
     ordering_fields = ['created_at', 'deadline', 'priority']
     ordering = ['-created_at']
@@ -709,7 +619,11 @@ class MyDocumentsAPIView(generics.ListAPIView):
 
         documents = Document.objects.filter(
             author=user
-        ).select_related('document_type', 'status', 'author', 'responsible')
+        ).select_related(
+            'document_type', 'status',
+            'author__department', 'responsible__department'
+        )
+        documents = _with_user_approvals(documents, user)
 
         archived_filter = self.request.query_params.get('archived')
         if archived_filter is not None:
@@ -739,7 +653,7 @@ class MyDocumentsAPIView(generics.ListAPIView):
 # ============ DOCUMENT APPROVAL VIEWSET ============
 
 
-class DocumentApprovalViewSet(viewsets.ModelViewSet):
+class DocumentApprovalViewSet(StreamingUploadMixin, viewsets.ModelViewSet):
     """
     ViewSet для операций с документами и их согласованием
     
@@ -751,6 +665,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def approve(self, request, pk=None):
         """Согласовать документ"""
         document = self.get_object()
@@ -771,6 +686,8 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             approval.decided_at = timezone.now()
             approval.comment = request.data.get('comment', '')
             approval.save()
+            sync_route_state(document)
+            record_decision(approval)
             _maybe_set_actual_deadline(document)
 
             return Response({
@@ -784,6 +701,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def reject(self, request, pk=None):
         """Отклонить документ"""
         document = self.get_object()
@@ -805,13 +723,17 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             approval.comment = request.data.get('comment', '')
             approval.save()
 
-            Approval.objects.filter(
-                document=document,
-                decision='pending'
-            ).exclude(id=approval.id).update(
+            closed_ids = list(
+                Approval.objects.select_for_update().filter(
+                    document=document,
+                    decision='pending'
+                ).exclude(id=approval.id).values_list('id', flat=True)
+            )
+            Approval.objects.filter(id__in=closed_ids).update(
                 decision='returned',
                 decided_at=approval.decided_at
             )
+            record_decision(approval, closed_ids=closed_ids)
 
             returned_status = (
                 DocumentStatus.objects.filter(name__iexact='Возвращено на доработку').first()
@@ -823,6 +745,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
                 document.last_rejection_comment = approval.comment
                 document.last_rejection_at = approval.decided_at
                 document.save(update_fields=['status', 'last_rejection_comment', 'last_rejection_at'])
+            sync_route_state(document)
 
             return Response({
                 'status': 'success',
@@ -835,11 +758,20 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def return_to_author(self, request, pk=None):
         """Вернуть документ на доработку после выполнения"""
         document = self.get_object()
         user = request.user
 
+        upload_ids = requested_uploads(request.data)
+        errors = upload_errors(request, request.FILES.getlist('files')) + upload_session_errors(user, upload_ids)
+        if errors:
+            return Response({
+                'status': 'error',
+                'message': '; '.join(errors)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         approval = (
             Approval.objects
             .filter(document=document, approver=user)
@@ -852,6 +784,8 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
                 'message': 'Вы не являетесь согласующим для этого документа'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # Возвращать можно и по уже принятому решению: его вклад в сводки снимается
+        previous = (approval.decision, approval.decided_at)
         approval.decision = 'returned'
         approval.decided_at = timezone.now()
         approval.comment = request.data.get('comment', '')
@@ -862,14 +796,18 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         approval.save()
 
-        Approval.objects.filter(
-            document=document,
-            decision='pending',
-            cycle=approval.cycle
-        ).exclude(id=approval.id).update(
+        closed_ids = list(
+            Approval.objects.select_for_update().filter(
+                document=document,
+                decision='pending',
+                cycle=approval.cycle
+            ).exclude(id=approval.id).values_list('id', flat=True)
+        )
+        Approval.objects.filter(id__in=closed_ids).update(
             decision='returned',
             decided_at=approval.decided_at
         )
+        record_decision(approval, previous=previous, closed_ids=closed_ids)
 
         returned_status = (
             DocumentStatus.objects.filter(name__iexact='Возвращено на доработку').first()
@@ -883,26 +821,14 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             document.actual_deadline = None
             document.save(update_fields=['status', 'last_rejection_comment', 'last_rejection_at', 'actual_deadline'])
 
-        files = []
-        if hasattr(request, 'FILES'):
-            files = request.FILES.getlist('files')
+        attach_files(document, request.FILES.getlist('files') + claim_uploads(user, upload_ids), user)
 
-        for file_obj in files:
-            doc_file = DocumentFile.objects.create(
-                document=document,
-                file=file_obj,
-                uploaded_by=user,
-            )
-            DocumentVersion.objects.create(
-                document=document,
-                file=doc_file.file,
-                created_by=user,
-            )
+        sync_route_state(document)
 
-        if document.author:
-            Notification.objects.create(
-                user=document.author,
-                notification_type='status_change',
+        if document.author_id:
+            notify(
+                document.author_id,
+                'status_change',
                 title='Документ возвращен на доработку',
                 text=f'{document.registration_number} — {document.title}',
                 link=f'/documents/outgoing/?open={document.id}',
@@ -916,6 +842,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def acknowledge(self, request, pk=None):
         """Ознакомиться с документом"""
         document = self.get_object()
@@ -936,6 +863,8 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             approval.decided_at = timezone.now()
             approval.comment = request.data.get('comment', '')
             approval.save()
+            sync_route_state(document)
+            record_decision(approval)
             _maybe_set_actual_deadline(document)
 
             return Response({
@@ -949,6 +878,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def execute(self, request, pk=None):
         """Отметить документ как исполненный"""
         document = self.get_object()
@@ -969,6 +899,8 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             approval.decided_at = timezone.now()
             approval.comment = request.data.get('comment', '')
             approval.save()
+            sync_route_state(document)
+            record_decision(approval)
             _maybe_set_actual_deadline(document)
 
             return Response({
@@ -982,11 +914,23 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def resubmit(self, request, pk=None):
         """Повторно отправить документ после отклонения"""
         document = self.get_object()
+        # Строка документа блокируется до конца действия: параллельная повторная
+        # отправка дождётся фиксации и прочитает уже новый current_cycle
+        document = Document.objects.select_for_update().get(pk=document.pk)
         user = request.user
 
+        upload_ids = requested_uploads(request.data)
+        errors = upload_errors(request, request.FILES.getlist('files')) + upload_session_errors(user, upload_ids)
+        if errors:
+            return Response({
+                'status': 'error',
+                'message': '; '.join(errors)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         if not user.is_authenticated or document.author != user:
             return Response({
                 'status': 'error',
@@ -1025,27 +969,14 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
         document.actual_deadline = None
         document.save(update_fields=['status', 'action_type', 'actual_deadline'])
 
-        files = []
-        if hasattr(request, 'FILES'):
-            files = request.FILES.getlist('files')
+        attach_files(document, request.FILES.getlist('files') + claim_uploads(user, upload_ids), user)
 
-        for file_obj in files:
-            doc_file = DocumentFile.objects.create(
-                document=document,
-                file=file_obj,
-                uploaded_by=user,
-            )
-            DocumentVersion.objects.create(
-                document=document,
-                file=doc_file.file,
-                created_by=user,
-            )
-
-        max_cycle = Approval.objects.filter(document=document).aggregate(max_cycle=Max('cycle'))['max_cycle'] or 1
-        next_cycle = max_cycle + 1
+        next_cycle = (document.current_cycle or 1) + 1
 
         delivery_mode = document.delivery_mode
         approval_order = request.data.get('approval_order') or document.approval_order or 'sequential'
+        template = None
+        manual_route = None
 
         if delivery_mode == 'auto':
             template = (
@@ -1067,60 +998,6 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             if document.approval_order != approval_order:
                 document.approval_order = approval_order
                 document.save(update_fields=['approval_order'])
-            sequential_created = []
-            for step in template.steps.all().order_by('step_number'):
-                users = []
-                if step.user:
-                    resolved = _resolve_approver(step.user)
-                    if resolved and resolved != document.author:
-                        users.append(resolved)
-                elif step.department:
-                    users.extend(
-                        User.objects.filter(
-                            department=step.department,
-                            is_active=True
-                        )
-                    )
-                users = [_resolve_approver(u) for u in users]
-                users = [u for u in users if u]
-                users = [u for u in users if u != document.author]
-                users = list({u.id: u for u in users}.values())
-                for approver in users:
-                    approval, created = Approval.objects.get_or_create(
-                        document=document,
-                        approver=approver,
-                        step=step.step_number if approval_order == 'sequential' else 1,
-                        cycle=next_cycle,
-                        defaults={
-                            'decision': 'pending',
-                            'is_required': True
-                        }
-                    )
-                    if created:
-                        if approval_order == 'sequential':
-                            sequential_created.append(approval)
-                        else:
-                            Notification.objects.create(
-                                user=approver,
-                                notification_type='new_document',
-                                title='Новый документ',
-                                text=f'{document.registration_number} — {document.title}',
-                                link=f'/documents/incoming/?open={document.id}',
-                                document=document,
-                                sender=user
-                            )
-            if approval_order == 'sequential' and sequential_created:
-                min_step = min(a.step for a in sequential_created)
-                for approval in [a for a in sequential_created if a.step == min_step]:
-                    Notification.objects.create(
-                        user=approval.approver,
-                        notification_type='new_document',
-                        title='Новый документ',
-                        text=f'{document.registration_number} — {document.title}',
-                        link=f'/documents/incoming/?open={document.id}',
-                        document=document,
-                        sender=user
-                    )
         else:
             manual_route = request.data.get('manual_route', document.manual_route or [])
             if isinstance(manual_route, str):
@@ -1135,88 +1012,14 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
                     'message': 'Для ручного маршрута нужен manual_route'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            sequential_created = []
-            for i, step_data in enumerate(manual_route, start=1):
-                step_number = i if approval_order == 'sequential' else 1
-
-                if step_data.get('type') == 'user':
-                    try:
-                        approver = User.objects.get(
-                            id=step_data['id'],
-                            is_active=True
-                        )
-                        approver = _resolve_approver(approver)
-                        if not approver:
-                            continue
-                        approval, created = Approval.objects.get_or_create(
-                            document=document,
-                            approver=approver,
-                            step=step_number,
-                            cycle=next_cycle,
-                            defaults={
-                                'decision': 'pending',
-                                'is_required': True
-                            }
-                        )
-                        if created:
-                            if approval_order == 'sequential':
-                                sequential_created.append(approval)
-                            else:
-                                Notification.objects.create(
-                                    user=approver,
-                                    notification_type='new_document',
-                                    title='Новый документ',
-                                    text=f'{document.registration_number} — {document.title}',
-                                    link=f'/documents/incoming/?open={document.id}',
-                                    document=document,
-                                    sender=user
-                                )
-                    except User.DoesNotExist:
-                        continue
-                elif step_data.get('type') == 'department':
-                    users = User.objects.filter(
-                        department_id=step_data['id'],
-                        is_active=True
-                    )
-                    resolved_users = [_resolve_approver(u) for u in users]
-                    resolved_users = [u for u in resolved_users if u]
-                    resolved_users = list({u.id: u for u in resolved_users}.values())
-                    for approver in resolved_users:
-                        approval, created = Approval.objects.get_or_create(
-                            document=document,
-                            approver=approver,
-                            step=step_number,
-                            cycle=next_cycle,
-                            defaults={
-                                'decision': 'pending',
-                                'is_required': True
-                            }
-                        )
-                        if created:
-                            if approval_order == 'sequential':
-                                sequential_created.append(approval)
-                            else:
-                                Notification.objects.create(
-                                    user=approver,
-                                    notification_type='new_document',
-                                    title='Новый документ',
-                                    text=f'{document.registration_number} — {document.title}',
-                                    link=f'/documents/incoming/?open={document.id}',
-                                    document=document,
-                                    sender=user
-                                )
-            if approval_order == 'sequential' and sequential_created:
-                min_step = min(a.step for a in sequential_created)
-                for approval in [a for a in sequential_created if a.step == min_step]:
-                    Notification.objects.create(
-                        user=approval.approver,
-                        notification_type='new_document',
-                        title='Новый документ',
-                        text=f'{document.registration_number} — {document.title}',
-                        link=f'/documents/incoming/?open={document.id}',
-                        document=document,
-                        sender=user
-                    )
+        start_document_route(
+            document,
+            cycle=next_cycle,
+            template=template,
+            manual_route=manual_route,
+            approval_order=approval_order,
+            sender=user,
+        )
 
         return Response({
             'status': 'success',
@@ -1224,6 +1027,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def archive(self, request, pk=None):
         """Архивировать документ (только автор и только финальный статус)"""
         document = self.get_object()
@@ -1263,6 +1067,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
             document.save(update_fields=['is_archived', 'status'])
         else:
             document.save(update_fields=['is_archived'])
+        sync_route_state(document)
 
         return Response({
             'status': 'success',
@@ -1270,6 +1075,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def unarchive(self, request, pk=None):
         """Вернуть документ из архива (только автор)"""
         document = self.get_object()
@@ -1289,6 +1095,7 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
 
         document.is_archived = False
         document.save(update_fields=['is_archived'])
+        sync_route_state(document)
 
         return Response({
             'status': 'success',
@@ -1297,16 +1104,14 @@ class DocumentApprovalViewSet(viewsets.ModelViewSet):
 
 
 def _maybe_set_actual_deadline(document):
-    _ensure_cycle(document=document)
-    max_cycle = Approval.objects.filter(document=document).aggregate(max_cycle=Max('cycle'))['max_cycle']
-    if not max_cycle:
-        return
-    approvals = Approval.objects.filter(document=document, cycle=max_cycle)
-    if not approvals.exists():
+    # current_cycle/pending_count уже пересчитаны sync_route_state
+    if not document.current_cycle or document.pending_count:
         return
-    if approvals.filter(decision='pending').exists():
-        return
-    if approvals.filter(decision__in=['rejected', 'returned']).exists():
+    if Approval.objects.filter(
+        document=document,
+        cycle=document.current_cycle,
+        decision__in=['rejected', 'returned']
+    ).exists():
         return
     status_map = {
         'approve': ['Согласовано', 'Согласован'],
@@ -1339,7 +1144,12 @@ def _maybe_set_actual_deadline(document):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def DocumentHistoryAPIView(request, pk):
-    document = Document.objects.filter(pk=pk, author=request.user).first()
+    """
+    GET /api/documents/<id>/history/ - Отчёт об истории документа.
+    Готовый отчёт по неизменившемуся документу отдаётся из файла,
+    иначе формируется на месте и сохраняется для следующих выгрузок.
+    """
+    document = history_documents().filter(pk=pk, author=request.user).first()
     if not document:
         return Response({
             'status': 'error',
@@ -1347,201 +1157,295 @@ def DocumentHistoryAPIView(request, pk):
         }, status=status.HTTP_404_NOT_FOUND)
 
     _ensure_cycle(document=document)
-    approvals = (
-        Approval.objects
-        .filter(document=document)
-        .select_related('approver')
-        .order_by('cycle', 'step', 'created_at')
+    report, rows = report_for(document)
+    if report.status != 'ready':
+        report = build_report(report.id, rows)
+
+    if report is None or report.status != 'ready':
+        # Отчёт прямо сейчас формирует фоновая задача: отдаём собранный на месте
+        content, extension, content_type = render_history(rows)
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="history_{document.registration_number}.{extension}"'
+        return response
+
+    return FileResponse(
+        report.file.open('rb'),
+        as_attachment=True,
+        filename=report.file_name,
+        content_type=report.content_type,
     )
-    files = DocumentFile.objects.filter(document=document).order_by('uploaded_at')
-    versions = DocumentVersion.objects.filter(document=document).order_by('version')
-
-    lines = [
-        f"Документ: {document.registration_number}",
-        f"Тема: {document.title}",
-        f"Тип: {document.document_type.name}",
-        f"Автор: {document.author.full_name}",
-        f"Статус: {document.status.name}",
-        f"Создан: {document.created_at.strftime('%d.%m.%Y %H:%M')}",
-        f"Срок: {document.deadline.strftime('%d.%m.%Y') if document.deadline else '—'}",
-        f"Фактический срок: {document.actual_deadline.strftime('%d.%m.%Y') if document.actual_deadline else '—'}",
-        f"Тип обработки: {document.get_action_type_display()}",
-        f"Приоритет: {document.get_priority_display()}",
-        f"Входящий номер: {document.external_number or '—'}",
-        f"Входящая дата: {document.external_date.strftime('%d.%m.%Y') if document.external_date else '—'}",
-        f"Корреспондент: {document.correspondent or '—'}",
-        f"Описание: {document.description or '—'}",
-        "",
-        "История согласования:",
-    ]
-
-    for approval in approvals:
-        decided_at = approval.decided_at.strftime('%d.%m.%Y %H:%M') if approval.decided_at else '—'
-        comment = approval.comment or '—'
-        lines.append(
-            f"- Раунд {approval.cycle}, шаг {approval.step}: {approval.approver.full_name} — "
-            f"{approval.get_decision_display()} ({decided_at})"
-        )
-        lines.append(f"  Комментарий: {comment}")
-
-    lines.append("")
-    lines.append("Файлы документа:")
-    if files.exists():
-        for f in files:
-            uploaded_at = f.uploaded_at.strftime('%d.%m.%Y %H:%M') if f.uploaded_at else '—'
-            lines.append(
-                f"- {f.file_name or f.file.name} | {f.file_type or '—'} | "
-                f"{f.file_size or 0} байт | {uploaded_at} | "
-                f"Загрузил: {f.uploaded_by.full_name if f.uploaded_by else '—'}"
-            )
-    else:
-        lines.append("- —")
-
-    lines.append("")
-    lines.append("Версии документа:")
-    if versions.exists():
-        for v in versions:
-            created_at = v.created_at.strftime('%d.%m.%Y %H:%M') if v.created_at else '—'
-            lines.append(
-                f"- Версия {v.version}: {v.file.name} | {created_at} | "
-                f"Создал: {v.created_by.full_name if v.created_by else '—'}"
-            )
-    else:
-        lines.append("- —")
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def HistoryExportAPIView(request):
+    """
+    GET /api/documents/history-export/ - ZIP с отчётами об истории многих документов.
+    Фильтры: author, document_type, date_from, date_to (ГГГГ-ММ-ДД), archived (1/0).
+    Сотрудник выгружает свои документы, администратор — любые.
+    """
+    params = request.query_params
     try:
-        from docx import Document as DocxDocument
-    except Exception:
-        content = "\n".join(lines)
-        response = HttpResponse(content, content_type='text/plain; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="history_{document.registration_number}.txt"'
-        return response
+        author = int(params['author']) if params.get('author') else None
+        document_type = int(params['document_type']) if params.get('document_type') else None
+    except ValueError:
+        return Response({'error': 'Некорректный фильтр'}, status=status.HTTP_400_BAD_REQUEST)
+    date_from = parse_date(params['date_from']) if params.get('date_from') else None
+    date_to = parse_date(params['date_to']) if params.get('date_to') else None
+    if (params.get('date_from') and not date_from) or (params.get('date_to') and not date_to):
+        return Response({'error': 'Некорректная дата'}, status=status.HTTP_400_BAD_REQUEST)
+    archived = None
+    if params.get('archived') not in (None, ''):
+        archived = params['archived'].lower() in ('1', 'true', 'yes')
+
+    if not request.user.is_staff:
+        author = request.user.id
+
+    documents = export_documents(
+        author=author,
+        date_from=date_from,
+        date_to=date_to,
+        document_type=document_type,
+        archived=archived,
+    )
+    response = StreamingHttpResponse(iter_history_zip(documents), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="history_{timezone.localdate():%Y%m%d}.zip"'
+    return response
 
-    from docx.shared import Pt
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-
-    docx = DocxDocument()
-    normal_style = docx.styles['Normal']
-    normal_style.font.name = 'Times New Roman'
-    normal_style.font.size = Pt(12)
-
-    title = docx.add_paragraph()
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    title_run = title.add_run("ОТЧЕТ О ДОКУМЕНТЕ")
-    title_run.bold = True
-    title_run.font.size = Pt(16)
-
-    subtitle = docx.add_paragraph()
-    subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    subtitle_run = subtitle.add_run(f"{document.registration_number} — {document.title}")
-    subtitle_run.font.size = Pt(12)
-
-    meta = docx.add_paragraph()
-    meta.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    meta.add_run(f"Сформировано: {timezone.now().strftime('%d.%m.%Y %H:%M')}")
-
-    docx.add_paragraph("")
-
-    docx.add_heading("Основные сведения", level=2)
-    info_table = docx.add_table(rows=0, cols=2)
-    info_table.style = 'Table Grid'
-    info_rows = [
-        ("Регистрационный номер", document.registration_number),
-        ("Тема документа", document.title),
-        ("Тип документа", document.document_type.name),
-        ("Статус", document.status.name),
-        ("Тип обработки", document.get_action_type_display()),
-        ("Приоритет", document.get_priority_display()),
-        ("Автор", document.author.full_name),
-        ("Создан", document.created_at.strftime('%d.%m.%Y %H:%M')),
-        ("Срок", document.deadline.strftime('%d.%m.%Y') if document.deadline else '—'),
-        ("Фактический срок", document.actual_deadline.strftime('%d.%m.%Y') if document.actual_deadline else '—'),
-        ("Входящий номер", document.external_number or '—'),
-        ("Входящая дата", document.external_date.strftime('%d.%m.%Y') if document.external_date else '—'),
-        ("Корреспондент", document.correspondent or '—'),
-        ("Описание", document.description or '—'),
-    ]
-    for label, value in info_rows:
-        row = info_table.add_row().cells
-        row[0].text = label
-        row[1].text = value
-
-    docx.add_paragraph("")
-    docx.add_heading("История согласования", level=2)
-    if approvals.exists():
-        table = docx.add_table(rows=1, cols=6)
-        table.style = 'Table Grid'
-        hdr = table.rows[0].cells
-        hdr[0].text = "Раунд"
-        hdr[1].text = "Шаг"
-        hdr[2].text = "Согласующий"
-        hdr[3].text = "Решение"
-        hdr[4].text = "Дата"
-        hdr[5].text = "Комментарий"
-        for approval in approvals:
-            decided_at = approval.decided_at.strftime('%d.%m.%Y %H:%M') if approval.decided_at else '—'
-            comment = approval.comment or '—'
-            row = table.add_row().cells
-            row[0].text = str(approval.cycle)
-            row[1].text = str(approval.step)
-            row[2].text = approval.approver.full_name
-            row[3].text = approval.get_decision_display()
-            row[4].text = decided_at
-            row[5].text = comment
-    else:
-        docx.add_paragraph("—")
-
-    docx.add_heading("Файлы документа", level=2)
-    if files.exists():
-        table = docx.add_table(rows=1, cols=5)
-        table.style = 'Table Grid'
-        hdr = table.rows[0].cells
-        hdr[0].text = "Имя"
-        hdr[1].text = "Тип"
-        hdr[2].text = "Размер"
-        hdr[3].text = "Дата загрузки"
-        hdr[4].text = "Загрузил"
-        for f in files:
-            uploaded_at = f.uploaded_at.strftime('%d.%m.%Y %H:%M') if f.uploaded_at else '—'
-            row = table.add_row().cells
-            row[0].text = f.file_name or f.file.name
-            row[1].text = f.file_type or '—'
-            row[2].text = str(f.file_size or 0)
-            row[3].text = uploaded_at
-            row[4].text = f.uploaded_by.full_name if f.uploaded_by else '—'
-    else:
-        docx.add_paragraph("—")
-
-    docx.add_heading("Версии документа", level=2)
-    if versions.exists():
-        table = docx.add_table(rows=1, cols=4)
-        table.style = 'Table Grid'
-        hdr = table.rows[0].cells
-        hdr[0].text = "Версия"
-        hdr[1].text = "Файл"
-        hdr[2].text = "Дата"
-        hdr[3].text = "Создал"
-        for v in versions:
-            created_at = v.created_at.strftime('%d.%m.%Y %H:%M') if v.created_at else '—'
-            row = table.add_row().cells
-            row[0].text = str(v.version)
-            row[1].text = v.file.name
-            row[2].text = created_at
-            row[3].text = v.created_by.full_name if v.created_by else '—'
-    else:
-        docx.add_paragraph("—")
-
-    buffer = io.BytesIO()
-    docx.save(buffer)
-    buffer.seek(0)
-    response = HttpResponse(
-        buffer.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def DocumentFileDownloadAPIView(request, pk):
+    """
+    GET /api/files/<id>/download/ - Скачать файл документа.
+    Поддерживаются Range и If-None-Match; ?download=1 — сохранить как вложение.
+    """
+    doc_file = DocumentFile.objects.filter(
+        pk=pk, document__in=viewable_documents(request.user)
+    ).first()
+    if not doc_file or not doc_file.file:
+        return Response({
+            'status': 'error',
+            'message': 'Файл не найден или нет доступа'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return serve_file(
+        request,
+        doc_file.file.storage,
+        doc_file.file.name,
+        file_name=doc_file.file_name,
+        content_type=doc_file.mime_type,
+        sha256=doc_file.sha256,
+        as_attachment=bool(request.query_params.get('download')),
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def DocumentFileThumbnailAPIView(request, pk):
+    """
+    GET /api/files/<id>/thumbnail/ - Миниатюра изображения, кэшируется браузером надолго
+    """
+    doc_file = DocumentFile.objects.filter(
+        pk=pk, document__in=viewable_documents(request.user), preview_status='ready'
+    ).exclude(thumbnail='').first()
+    if not doc_file:
+        return Response({
+            'status': 'error',
+            'message': 'Миниатюра не найдена'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return serve_file(
+        request,
+        doc_file.file.storage,
+        doc_file.thumbnail,
+        file_name=f'{doc_file.id}.jpg',
+        content_type='image/jpeg',
+        sha256=f'{doc_file.sha256}-thumb' if doc_file.sha256 else '',
+        cache_control=PREVIEW_CACHE_CONTROL,
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def DocumentVersionDownloadAPIView(request, pk):
+    """
+    GET /api/versions/<id>/download/ - Скачать файл версии документа
+    """
+    version = DocumentVersion.objects.filter(
+        pk=pk, document__in=viewable_documents(request.user)
+    ).first()
+    if not version or not version.file:
+        return Response({
+            'status': 'error',
+            'message': 'Файл не найден или нет доступа'
+        }, status=status.HTTP_404_NOT_FOUND)
+    # Имя и тип берутся из записи о файле с тем же содержимым, если она есть
+    doc_file = DocumentFile.objects.filter(document_id=version.document_id, file=version.file.name).first()
+    return serve_file(
+        request,
+        version.file.storage,
+        version.file.name,
+        file_name=doc_file.file_name if doc_file else '',
+        content_type=doc_file.mime_type if doc_file else '',
+        as_attachment=bool(request.query_params.get('download')),
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def DocumentFilesZipAPIView(request, pk):
+    """
+    GET /api/documents/<id>/files.zip - Все файлы документа одним ZIP-архивом.
+    ?versions=1 — добавить файлы всех версий (папка versions/).
+    """
+    document = viewable_documents(request.user).filter(pk=pk).first()
+    if not document:
+        return Response({
+            'status': 'error',
+            'message': 'Документ не найден или нет доступа'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    entries = bundle_entries(document, include_versions=request.query_params.get('versions') in ('1', 'true'))
+    response = StreamingHttpResponse(iter_files_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(
+        True, f'files_{document.registration_number or document.id}.zip'
     )
-    response['Content-Disposition'] = f'attachment; filename="history_{document.registration_number}.docx"'
     return response
 
 
+def _upload_error(error):
+    return Response({
+        'status': 'error',
+        'message': str(error)
+    }, status=error.status)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def UploadSessionCreateAPIView(request):
+    """
+    POST /api/uploads/ - Начать загрузку файла частями.
+    Параметры: file_name, size, sha256 (необязательно, проверяется при завершении).
+    Затем части отправляются PUT на upload_url с заголовком Content-Range,
+    загрузка завершается POST на complete_url, а id передаётся в поле
+    uploads при создании документа, возврате или повторной отправке.
+    """
+    file_name = (request.data.get('file_name') or '').strip()
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        size = -1
+    if not file_name:
+        return Response({
+            'status': 'error',
+            'message': 'Не указано имя файла'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        session = start_upload(request.user, file_name, size, request.data.get('sha256') or '')
+    except UploadError as error:
+        return _upload_error(error)
+    return Response(upload_payload(session), status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def UploadSessionAPIView(request, pk):
+    """
+    GET /api/uploads/<id>/ - Состояние загрузки, offset — с какого байта продолжать
+    PUT /api/uploads/<id>/ - Очередная часть файла, Content-Range: bytes <начало>-<конец>/<размер>
+    DELETE /api/uploads/<id>/ - Отменить загрузку
+    """
+    session = UploadSession.objects.filter(pk=pk, user=request.user).first()
+    if not session:
+        return Response({
+            'status': 'error',
+            'message': 'Загрузка не найдена'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return Response(upload_payload(session))
+
+    if request.method == 'DELETE':
+        session.delete()
+        DocumentFile._meta.get_field('file').storage.delete(session.stored_name)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        start, end = parse_content_range(request.headers.get('Content-Range'), session.size)
+        # Тело читается из потока запроса напрямую, без разбора парсерами DRF
+        session = write_chunk(pk, request.user, start, end, request.stream or io.BytesIO())
+    except UploadError as error:
+        response = _upload_error(error)
+        response.data['offset'] = UploadSession.objects.filter(pk=pk).values_list('received', flat=True).first()
+        return response
+    return Response(upload_payload(session))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def UploadSessionCompleteAPIView(request, pk):
+    """
+    POST /api/uploads/<id>/complete/ - Завершить загрузку: проверка размера,
+    SHA-256 и типа содержимого
+    """
+    try:
+        session = finish_upload(pk, request.user)
+    except UploadError as error:
+        return _upload_error(error)
+    return Response(upload_payload(session))
+
+
+def _history_report_payload(report):
+    data = {
+        'id': report.id,
+        'status': report.status,
+        'status_display': report.get_status_display(),
+        'status_url': f'/api/history-reports/{report.id}/',
+    }
+    if report.status == 'ready':
+        data['download_url'] = f'/api/documents/{report.document_id}/history/'
+    if report.status == 'failed':
+        data['error'] = report.error
+    return data
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def DocumentHistoryReportAPIView(request, pk):
+    """
+    POST /api/documents/<id>/history/report/ - Запуск фонового формирования
+    отчёта. Состояние опрашивается по status_url, готовый файл — по download_url.
+    """
+    document = history_documents().filter(pk=pk, author=request.user).first()
+    if not document:
+        return Response({
+            'status': 'error',
+            'message': 'Документ не найден или нет доступа'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    _ensure_cycle(document=document)
+    report = start_report(document)
+    return Response(
+        _history_report_payload(report),
+        status=status.HTTP_200_OK if report.status == 'ready' else status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def HistoryReportStatusAPIView(request, pk):
+    """
+    GET /api/history-reports/<id>/ - Состояние формирования отчёта
+    """
+    report = HistoryReport.objects.filter(pk=pk, document__author=request.user).first()
+    if not report:
+        return Response({
+            'status': 'error',
+            'message': 'Отчёт не найден'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return Response(_history_report_payload(report))
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def DashboardStatsAPIView(request):
@@ -1556,94 +1460,186 @@ def DashboardStatsAPIView(request):
             'processed_today': 0,
         })
 
-    today = timezone.localdate()
-
-    min_pending_step = (
-        Approval.objects.filter(
-            document_id=OuterRef('document_id'),
-            decision='pending',
-        )
-        .values('document_id')
-        .annotate(min_step=Min('step'))
-        .values('min_step')
-    )
-
-    pending_approvals = (
-        Approval.objects
-        .filter(approver=user, decision='pending', document__is_archived=False)
-        .annotate(min_step=Subquery(min_pending_step))
-        .filter(
-            models.Q(document__action_type='acknowledge')
-            | models.Q(document__approval_order='parallel')
-            | models.Q(step=models.F('min_step'))
-        )
-    )
-
-    incoming_doc_ids = pending_approvals.values('document_id').distinct()
-    incoming_count = incoming_doc_ids.count()
-    incoming_urgent = pending_approvals.filter(document__priority='urgent').values('document_id').distinct().count()
-    overdue_count = pending_approvals.filter(document__deadline__lt=today).values('document_id').distinct().count()
-
-    approval_count = (
-        Document.objects
-        .filter(author=user, is_archived=False)
-        .exclude(status__is_final=True)
-        .exclude(status__name__iexact='Черновик')
-        .exclude(status__name__icontains='доработ')
-        .exclude(status__name__icontains='возвращ')
-        .count()
-    )
-
-    processed_today = Approval.objects.filter(
-        approver=user,
-        decided_at__date=today,
-        decision__in=['approved', 'rejected', 'acknowledged', 'executed']
-    ).count()
-
+    summary = dashboard_summary(user, timezone.localdate())
     return Response({
-        'incoming_count': incoming_count,
-        'incoming_urgent': incoming_urgent,
-        'approval_count': approval_count,
-        'overdue_count': overdue_count,
-        'approval_overdue': overdue_count,
-        'processed_today': processed_today,
+        'incoming_count': summary['incoming_count'],
+        'incoming_urgent': summary['incoming_urgent'],
+        'approval_count': summary['approval_count'],
+        'overdue_count': summary['overdue_count'],
+        'approval_overdue': summary['approval_overdue'],
+        'processed_today': summary['processed_today'],
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def PersonalStatsAPIView(request):
+    """Показатели сотрудника для страницы статистики в JSON"""
+    return Response(personal_stats(request.user, timezone.localdate()))
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def NotificationsAPIView(request):
-    notifications = (
-        Notification.objects
-        .filter(user=request.user)
-        .order_by('-created_at')[:20]
-    )
-    data = [
-        {
-            'id': n.id,
-            'title': n.title,
-            'text': n.text,
-            'link': n.link,
-            'created_at': n.created_at.isoformat(),
-            'is_read': n.is_read,
-            'type': n.notification_type,
-        }
-        for n in notifications
-    ]
-    unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return Response({
-        'unread_count': unread_count,
+    """
+    Последние 20 уведомлений или, при since_id / since (ISO-время), только
+    более новые: до 20 по возрастанию id, last_id — последнее из отданных,
+    с него запрашивается следующая пачка. Счётчик непрочитанных берётся из NotificationCounter.
+    Если новых уведомлений нет и состояние не изменилось (ETag), отвечает 304.
+    """
+    user = request.user
+    latest_id = latest_notification_id(user.id)
+    unread = unread_count(user.id)
+    etag = f'W/"{latest_id}-{unread}"'
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and if_none_match == etag:
+        return _not_modified(etag)
+
+    notifications = Notification.objects.filter(user=user)
+    since_id = _since_id(request)
+    since = parse_datetime(request.GET.get('since') or '')
+    is_delta = since_id is not None or since is not None
+    if since_id is not None:
+        if since_id >= latest_id and not if_none_match:
+            return _not_modified(etag)
+        notifications = notifications.filter(id__gt=since_id)
+    if since is not None:
+        notifications = notifications.filter(created_at__gt=since)
+
+    if is_delta:
+        # Дельта идёт по возрастанию id: отставший клиент догоняет пачками,
+        # курсор — последнее отданное уведомление, а не самое новое
+        data = [notification_payload(n) for n in notifications.order_by('id')[:20]]
+        if not data and not if_none_match:
+            return _not_modified(etag)
+        last_id = data[-1]['id'] if data else (latest_id if since_id is None else since_id)
+    else:
+        data = [notification_payload(n) for n in notifications.order_by('-created_at')[:20]]
+        last_id = latest_id
+
+    response = Response({
+        'unread_count': unread,
+        'last_id': last_id,
         'results': data
     })
+    response['ETag'] = etag
+    return response
+
+
+def _not_modified(etag):
+    response = HttpResponse(status=304)
+    response['ETag'] = etag
+    return response
+
+
+def _stream_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def _since_id(request, default=None):
+    # Last-Event-ID присылает EventSource при переподключении, он новее since_id из адреса
+    value = request.headers.get('Last-Event-ID') or request.GET.get('since_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _sse_event(payload):
+    return f"id: {payload['id']}\nevent: notification\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _notification_events(user_id, since_id):
+    """
+    Поток Server-Sent Events: сначала уведомления после since_id,
+    затем новые по мере публикации. Пока событий нет, отправляется
+    комментарий-heartbeat; сверка с БД выполняется раз в resync_interval().
+    """
+    loop = asyncio.get_running_loop()
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    subscription = get_broker().subscribe(user_id)
+    try:
+        if since_id is None:
+            cursor = await sync_to_async(latest_notification_id)(user_id)
+            backlog = []
+        else:
+            cursor = since_id
+            backlog = await sync_to_async(notifications_since)(user_id, cursor)
+        yield 'retry: 5000\n\n'
+
+        next_resync = loop.time() + resync_interval()
+        while True:
+            for payload in backlog:
+                if payload['id'] > cursor:
+                    cursor = payload['id']
+                    yield _sse_event(payload)
+            try:
+                backlog = [await subscription.get(timeout=heartbeat)] + subscription.drain()
+            except asyncio.TimeoutError:
+                backlog = []
+                if loop.time() >= next_resync:
+                    next_resync = loop.time() + resync_interval()
+                    backlog = await sync_to_async(notifications_since)(user_id, cursor)
+                if not backlog:
+                    yield ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+async def NotificationsStreamAPIView(request):
+    """Уведомления в реальном времени (text/event-stream), курсор since_id или Last-Event-ID"""
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Требуется авторизация'}, status=401)
+    if not streaming_supported(request):
+        # 204 закрывает EventSource без переподключения, клиент переходит на опрос
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        _notification_events(user.id, _since_id(request)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def NotificationsPollAPIView(request):
+    """
+    Long-poll для клиентов без EventSource: ждёт уведомления после since_id
+    до timeout секунд. Под WSGI отвечает сразу, без ожидания.
+    """
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Требуется авторизация'}, status=401)
+
+    since_id = _since_id(request, default=0)
+    try:
+        timeout = min(max(int(request.GET.get('timeout', 25)), 0), 55)
+    except ValueError:
+        timeout = 25
+    if not streaming_supported(request):
+        timeout = 0
+
+    with get_broker().subscribe(user.id) as subscription:
+        results = await sync_to_async(notifications_since)(user.id, since_id)
+        if not results and timeout:
+            try:
+                results = [await subscription.get(timeout=timeout)] + subscription.drain()
+            except asyncio.TimeoutError:
+                results = []
+
+    results = [payload for payload in results if payload['id'] > since_id]
+    last_id = max([since_id] + [payload['id'] for payload in results])
+    return JsonResponse({'last_id': last_id, 'results': results})
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def MarkAllNotificationsReadAPIView(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(
-        is_read=True,
-        read_at=timezone.now()
-    )
+    mark_read(request.user.id)
     return Response({'status': 'success'})
 
 
@@ -1653,10 +1649,7 @@ def MarkNotificationReadAPIView(request, pk):
     notification = Notification.objects.filter(id=pk, user=request.user).first()
     if not notification:
         return Response({'status': 'error', 'message': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
-    if not notification.is_read:
-        notification.is_read = True
-        notification.read_at = timezone.now()
-        notification.save(update_fields=['is_read', 'read_at'])
+    notification.mark_as_read()
     return Response({'status': 'success'})
 
 
@@ -1,11 +1,12 @@
 from django import forms
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.utils.html import strip_tags
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from .models import *
+from .services.email_templates import send_template_emails, send_template_email
+from .services.route_state import sync_route_state
+from .services.unread import recount_unread
 
 # ================== Роли ==================
 @admin.register(Role)
@@ -67,54 +68,44 @@ class UserAdmin(BaseUserAdmin):
             messages.warning(request, 'Письмо не отправлено: у сотрудника не указан email.')
             return
 
-        subject = 'Доступ в DocumentFlow'
+        send_template_email(obj.email, 'account_access', {
+            'username': obj.username,
+            'password': raw_password,
+            'login_url': request.build_absolute_uri("/"),
+        })
+        messages.success(request, f'Письмо с доступом поставлено в очередь на {obj.email}.')
+
+    actions = ['send_access']
+
+    @admin.action(description='Выдать новый пароль и отправить доступ новым сотрудникам')
+    def send_access(self, request, queryset):
+        # Только для первичной выдачи доступа: пароль работающих сотрудников не сбрасываем
+        newcomers = queryset.filter(last_login__isnull=True, is_superuser=False)
+        already_active = queryset.count() - newcomers.count()
+        users = list(newcomers.exclude(email=''))
+        skipped = newcomers.count() - len(users)
+        recipients = []
         login_url = request.build_absolute_uri("/")
-        html_message = f"""
-        <div style="font-family: Arial, sans-serif; background:#f6f7fb; padding:24px;">
-            <div style="max-width:640px; margin:0 auto; background:#ffffff; border-radius:14px; border:1px solid #e6e8ef; overflow:hidden;">
-                <div style="padding:18px 22px; background:#0f766e;">
-                    <div style="color:#ffffff; font-size:18px; font-weight:700;">DocumentFlow</div>
-                    <div style="color:#d1fae5; font-size:12px;">Учетная запись сотрудника</div>
-                </div>
-                <div style="padding:22px;">
-                    <p style="margin:0 0 10px 0; color:#111827; font-size:14px;">Здравствуйте!</p>
-                    <p style="margin:0 0 16px 0; color:#374151; font-size:13px;">
-                        Для вас создан аккаунт в системе DocumentFlow. Ниже — данные для входа.
-                    </p>
-                    <div style="border:1px solid #e5e7eb; border-radius:10px; padding:14px; background:#f9fafb;">
-                        <div style="margin-bottom:6px; color:#6b7280; font-size:11px; text-transform:uppercase; letter-spacing:0.08em;">Логин</div>
-                        <div style="font-size:14px; font-weight:700; color:#111827;">{obj.username}</div>
-                        <div style="margin:12px 0 6px 0; color:#6b7280; font-size:11px; text-transform:uppercase; letter-spacing:0.08em;">Пароль</div>
-                        <div style="font-size:14px; font-weight:700; color:#111827;">{raw_password}</div>
-                    </div>
-                    <div style="margin-top:18px;">
-                        <a href="{login_url}" style="display:inline-block; background:#0f766e; color:#ffffff; text-decoration:none; padding:10px 16px; border-radius:8px; font-size:13px;">
-                            Войти в систему
-                        </a>
-                    </div>
-                    <p style="margin:16px 0 0 0; color:#6b7280; font-size:12px;">
-                        Рекомендуем изменить пароль после первого входа.
-                    </p>
-                </div>
-                <div style="padding:12px 22px; background:#f3f4f6; color:#9ca3af; font-size:11px;">
-                    Это письмо отправлено автоматически, отвечать на него не нужно.
-                </div>
-            </div>
-        </div>
-        """
-        message = strip_tags(html_message)
-        try:
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=message,
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                to=[obj.email],
+        for user in users:
+            raw_password = get_random_string(12)
+            user.set_password(raw_password)
+            user.must_change_password = True
+            recipients.append((user.email, {
+                'username': user.username,
+                'password': raw_password,
+                'login_url': login_url,
+            }))
+        User.objects.bulk_update(users, ['password', 'must_change_password'], batch_size=500)
+        send_template_emails('account_access', recipients)
+
+        messages.success(request, f'Письма с доступом поставлены в очередь: {len(users)}')
+        if skipped:
+            messages.warning(request, f'Без email, письма не отправлены: {skipped}')
+        if already_active:
+            messages.warning(
+                request,
+                f'Пропущены администраторы и сотрудники, уже входившие в систему: {already_active}'
             )
-            email.attach_alternative(html_message, "text/html")
-            email.send(fail_silently=False)
-            messages.success(request, f'Письмо с доступом отправлено на {obj.email}.')
-        except Exception as exc:
-            messages.error(request, f'Не удалось отправить письмо: {exc}')
 
 
 # ================== Типы и статусы документов ==================
@@ -161,6 +152,11 @@ class DocumentAdmin(admin.ModelAdmin):
     ordering = ['-created_at']
     inlines = [DocumentFileInline, ApprovalInline, DocumentRecipientInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Решения в ApprovalInline, срок, приоритет и архив меняют строки входящих
+        sync_route_state(form.instance)
+
 
 # ================== Замены сотрудников ==================
 @admin.register(Replacement)
@@ -179,6 +175,60 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'title', 'text']
     ordering = ['-created_at']
 
+    # Правка и удаление здесь идут мимо mark_read, счётчики непрочитанных пересчитываются
+    def save_model(self, request, obj, form, change):
+        previous = Notification.objects.filter(pk=obj.pk).values_list('user_id', flat=True).first()
+        super().save_model(request, obj, form, change)
+        recount_unread({obj.user_id, previous})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recount_unread([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        recount_unread(user_ids)
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'title', 'notification_type', 'is_read', 'created_at', 'archived_at']
+    list_filter = ['notification_type', 'is_read']
+    search_fields = ['user__username', 'title']
+    ordering = ['-created_at']
+    list_select_related = ['user']
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at', 'updated_at']
+    list_filter = ['ref_count']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'ref_count', 'created_at', 'updated_at']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_at', 'last_error']
+    # Текст письма может содержать пароль или код подтверждения
+    exclude = ['body', 'html_body']
+    actions = ['retry_emails']
+
+    @admin.action(description='Отправить повторно')
+    def retry_emails(self, request, queryset):
+        # У ошибочных писем текст стёрт, повторять их нечего: доступ выдаётся заново
+        retryable = queryset.exclude(status='sent').exclude(status='failed', body='', html_body='')
+        skipped = queryset.exclude(status='sent').count() - retryable.count()
+        updated = retryable.update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        messages.success(request, f'Поставлено в очередь повторно: {updated}')
+        if skipped:
+            messages.warning(request, f'Пропущено писем без текста: {skipped}')
+
 
 # ================== Журнал действий ==================
 @admin.register(ActionLog)
@@ -0,0 +1,6 @@
+from documentflow.services.notification_bus import streaming_supported
+
+
+def notification_delivery(request):
+    """Способ доставки уведомлений в шаблоне: поток под ASGI, иначе опрос."""
+    return {'notification_stream': streaming_supported(request)}
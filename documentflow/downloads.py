@@ -0,0 +1,160 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import content_disposition_header, parse_etags
+
+from documentflow.models import Approval, Document
+from documentflow.storage import BLOB_PREFIX
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+READ_SIZE = 64 * 1024
+# Кэшировать можно, но каждый раз с проверкой: права на документ могут измениться
+CACHE_CONTROL = 'private, no-cache'
+# Превью файла по id не меняется, пока существует сам файл
+PREVIEW_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def viewable_documents(user):
+    """Документы, файлы которых пользователь может скачивать."""
+    if user.is_staff:
+        return Document.objects.all()
+    return Document.objects.filter(
+        Q(author=user)
+        | Q(responsible=user)
+        | Exists(Approval.objects.filter(document=OuterRef('pk'), approver=user))
+    )
+
+
+def file_etag(name, sha256=''):
+    """
+    ETag по хэшу содержимого: для файлов хранилища он есть в имени.
+    None для старых имён, если хэш не сохранён.
+    """
+    if not sha256 and name.startswith(f'{BLOB_PREFIX}/'):
+        sha256 = os.path.splitext(os.path.basename(name))[0]
+    if sha256:
+        return f'"{sha256}"'
+    return None
+
+
+def serve_file(request, storage, name, file_name='', content_type='', sha256='', as_attachment=False,
+               cache_control=CACHE_CONTROL):
+    """
+    Отдаёт файл документа с учётом If-None-Match (304) и одного диапазона
+    Range (206). Если настроена передача файла прокси (X-Accel-Redirect
+    для nginx или X-Sendfile для Apache), Python только проверяет доступ
+    и заголовки, а сами байты и диапазоны отдаёт прокси.
+    """
+    file_name = file_name or os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+
+    try:
+        size = storage.size(name)
+    except OSError:
+        return HttpResponse('Файл не найден', status=404)
+    etag = file_etag(name, sha256)
+    if etag is None:
+        # Старое имя без хэша: ETag по размеру и времени изменения
+        etag = f'"{size:x}-{int(storage.get_modified_time(name).timestamp()):x}"'
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponseNotModified()
+        _set_cache_headers(response, etag, cache_control)
+        return response
+
+    offload = getattr(settings, 'FILE_DOWNLOAD_OFFLOAD', '')
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == 'x-accel-redirect':
+            prefix = getattr(settings, 'FILE_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+        else:
+            response['X-Sendfile'] = storage.path(name)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, file_name)
+        _set_cache_headers(response, etag, cache_control)
+        return response
+
+    byte_range = _requested_range(request, size, etag)
+    if byte_range == 'invalid':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    source = storage.open(name, 'rb')
+    if byte_range is None:
+        response = FileResponse(source, as_attachment=as_attachment, filename=file_name, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        source.seek(start)
+        response = FileResponse(
+            _RangeReader(source, end - start + 1),
+            as_attachment=as_attachment,
+            filename=file_name,
+            content_type=content_type,
+            status=206,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    _set_cache_headers(response, etag, cache_control)
+    return response
+
+
+class _RangeReader:
+    """Ограничивает чтение файла заданным числом байт для ответа 206."""
+
+    def __init__(self, source, length):
+        self.source = source
+        self.remaining = length
+
+    def read(self, size=READ_SIZE):
+        if self.remaining <= 0:
+            return b''
+        data = self.source.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.source.close()
+
+
+def _requested_range(request, size, etag):
+    """
+    (начало, конец) из заголовка Range; None — отдавать файл целиком,
+    'invalid' — диапазон за пределами файла. Несколько диапазонов
+    не поддерживаются, для них отдаётся весь файл, как допускает RFC 9110.
+    """
+    header = request.headers.get('Range')
+    if not header or request.method != 'GET':
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return 'invalid'
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            return 'invalid'
+        start, end = max(size - suffix, 0), size - 1
+    return start, end
+
+
+def _set_cache_headers(response, etag, cache_control):
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
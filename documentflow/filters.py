@@ -1,6 +1,8 @@
 # 🆕 Фильтры
 import django_filters
+from rest_framework.filters import SearchFilter
 from .models import Department, DocumentRouteTemplate
+from .services.search import search_documents
 
 class DepartmentFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
@@ -16,3 +18,17 @@ class RouteFilter(django_filters.FilterSet):
     class Meta:
         model = DocumentRouteTemplate
         fields = ['document_type', 'is_active']
+
+
+class DocumentSearchFilter(SearchFilter):
+    """
+    Параметр search через полнотекстовый индекс документов вместо
+    ILIKE по каждому полю: слова ищутся в названии, номерах, описании
+    и тексте DOCX-вложений.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_documents(queryset, ' '.join(terms))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.inbox import BULK_BATCH_SIZE
+from documentflow.services.route_state import backfill_route_state
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает current_cycle, current_step и pending_count документов по строкам согласований'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество документов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        updated = backfill_route_state(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Готово, обновлено документов: {updated}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.history_report import build_pending_reports
+
+
+class Command(BaseCommand):
+    help = (
+        'Формирует отчёты об истории документов, оставшиеся в очереди '
+        '(например, после перезапуска сервера во время формирования)'
+    )
+
+    def handle(self, *args, **options):
+        built = build_pending_reports(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Сформировано отчётов: {built}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.file_previews import BULK_BATCH_SIZE, build_pending_previews
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит превью файлов документов, оставшихся в очереди: миниатюры '
+        'изображений и начало текста DOCX (например, для файлов, загруженных раньше)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество файлов в одном пакете'
+        )
+
+    def handle(self, *args, **options):
+        built = build_pending_previews(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Построено превью: {built}'))
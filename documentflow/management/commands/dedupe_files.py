@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.blobs import BULK_BATCH_SIZE, DEFAULT_WORKERS, migrate_legacy_files, sweep_blobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос файлов документов и версий в хранилище по содержимому с '
+        'устранением дубликатов; с --sweep удаляет файлы, на которые не осталось ссылок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Количество процессов для подсчёта хэшей'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество записей в одном пакете'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать файлы и дубликаты, ничего не перенося'
+        )
+        parser.add_argument(
+            '--sweep',
+            action='store_true',
+            help='Удалить файлы хранилища без ссылок и брошенные временные файлы'
+        )
+
+    def handle(self, *args, **options):
+        result = migrate_legacy_files(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов перенесено: {result["files"]}, дубликатов: {result["duplicates"]} '
+            f'({result["bytes_saved"]} байт), не найдено на диске: {result["missing"]}'
+        ))
+        if options['sweep'] and not options['dry_run']:
+            removed = sweep_blobs(batch_size=options['batch_size'], stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f'Удалено файлов без ссылок: {removed}'))
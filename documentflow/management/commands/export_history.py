@@ -0,0 +1,85 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documentflow.services.history_export import EXPORT_CHUNK_SIZE, export_documents, iter_history_zip
+
+
+class Command(BaseCommand):
+    help = 'Выгружает отчёты об истории документов по фильтру в ZIP-архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Путь к создаваемому ZIP-архиву'
+        )
+        parser.add_argument(
+            '--author',
+            type=int,
+            help='ID автора документов'
+        )
+        parser.add_argument(
+            '--type',
+            dest='document_type',
+            type=int,
+            help='ID типа документа'
+        )
+        parser.add_argument(
+            '--from',
+            dest='start',
+            help='Документы, созданные не раньше (ГГГГ-ММ-ДД)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='end',
+            help='Документы, созданные не позже (ГГГГ-ММ-ДД)'
+        )
+        archived = parser.add_mutually_exclusive_group()
+        archived.add_argument(
+            '--archived',
+            dest='archived',
+            action='store_const',
+            const=True,
+            help='Только архивные документы'
+        )
+        archived.add_argument(
+            '--not-archived',
+            dest='archived',
+            action='store_const',
+            const=False,
+            help='Только документы вне архива'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help='Количество документов, читаемых из БД за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options['start'])
+        end = self._parse_date(options['end'])
+        if start and end and start > end:
+            raise CommandError('Начало периода позже его конца')
+
+        documents = export_documents(
+            author=options['author'],
+            date_from=start,
+            date_to=end,
+            document_type=options['document_type'],
+            archived=options['archived'],
+        )
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in iter_history_zip(documents, chunk_size=options['batch_size'], stdout=self.stdout):
+                output.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Архив записан: {options["output"]} ({size} байт)'))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Некорректная дата: {value}')
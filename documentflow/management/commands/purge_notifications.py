@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.retention import BULK_BATCH_SIZE, expired_notifications, purge_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        'Очистка старых уведомлений: прочитанные удаляются, давние непрочитанные '
+        'переносятся в архив. Работает короткими пакетами, удобно вызывать из cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--read-days',
+            type=int,
+            default=None,
+            help='Через сколько дней удалять прочитанные уведомления (по умолчанию из настроек, 0 — не удалять)'
+        )
+        parser.add_argument(
+            '--unread-days',
+            type=int,
+            default=None,
+            help='Через сколько дней переносить непрочитанные в архив (по умолчанию из настроек, 0 — не переносить)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество уведомлений в одном пакете'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Остановиться после указанного числа пакетов, остаток обработает следующий запуск'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза между пакетами, секунд'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать уведомления под очистку'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            to_delete, to_archive = expired_notifications(options['read_days'], options['unread_days'])
+            self.stdout.write(
+                f'К удалению: {to_delete.count()}, к переносу в архив: {to_archive.count()}'
+            )
+            return
+
+        result = purge_notifications(
+            read_days=options['read_days'],
+            unread_days=options['unread_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено уведомлений: {result["deleted"]}, перенесено в архив: {result["archived"]}'
+        ))
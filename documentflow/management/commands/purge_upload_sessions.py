@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documentflow.services.chunked_uploads import BULK_BATCH_SIZE, purge_upload_sessions
+
+
+class Command(BaseCommand):
+    help = 'Удаление брошенных загрузок файлов частями вместе с недогруженными файлами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=None,
+            help='Через сколько часов без активности удалять загрузку (по умолчанию из настроек)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество загрузок в одном пакете'
+        )
+
+    def handle(self, *args, **options):
+        ttl = timezone.timedelta(hours=options['hours']) if options['hours'] else None
+        removed = purge_upload_sessions(ttl=ttl, batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {removed}'))
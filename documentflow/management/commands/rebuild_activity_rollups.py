@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documentflow.services.rollups import RECOMPUTE_CHUNK_DAYS, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки активности сотрудников за период (по умолчанию за всё время)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='start',
+            help='Первый день периода (ГГГГ-ММ-ДД)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='end',
+            help='Последний день периода (ГГГГ-ММ-ДД)'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=RECOMPUTE_CHUNK_DAYS,
+            help='Количество дней, пересчитываемых в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options['start'])
+        end = self._parse_date(options['end'])
+        if start and end and start > end:
+            raise CommandError('Начало периода позже его конца')
+
+        written = rebuild_rollups(start, end, chunk_days=options['chunk_days'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Сводки пересчитаны, строк активности: {written}'))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Некорректная дата: {value}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.inbox import BULK_BATCH_SIZE, rebuild_inbox
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу входящих (InboxEntry) по строкам согласований'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество документов в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        processed = rebuild_inbox(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Таблица входящих перестроена, документов: {processed}'))
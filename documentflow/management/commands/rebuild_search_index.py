@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.search import BULK_BATCH_SIZE, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Полная перестройка полнотекстового индекса документов (название, номер, описание, текст вложений)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество документов в одном пакете'
+        )
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано документов: {indexed}'))
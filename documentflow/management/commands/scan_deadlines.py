@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from documentflow.services.deadlines import BULK_BATCH_SIZE, DEADLINE_NOTICE_DAYS, scan_deadlines
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уведомления о приближающемся сроке по документам, ожидающим действия. '
+        'Запуск повторяемый, удобно вызывать из cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEADLINE_NOTICE_DAYS,
+            help='За сколько дней до срока отправлять уведомление'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help='Количество строк входящих в одном пакете'
+        )
+        parser.add_argument(
+            '--after-id',
+            type=int,
+            default=0,
+            help='Продолжить прерванный проход после указанного id строки входящих'
+        )
+
+    def handle(self, *args, **options):
+        created = scan_deadlines(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            after_id=options['after_id'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Создано уведомлений о сроках: {created}'))
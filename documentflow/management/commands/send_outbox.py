@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from documentflow.services.outbox import OUTBOX_BATCH_SIZE, send_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди исходящих через одно соединение с почтовым сервером. '
+        'Разовый запуск удобно вызывать из cron, с --loop команда работает постоянно'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help='Количество писем в одном пакете'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Остановиться после указанного числа пакетов'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а проверять очередь с интервалом --interval'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза между проверками очереди в режиме --loop, секунд'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = send_outbox(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+                stdout=self.stdout,
+            )
+            if result['sent'] or result['failed'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Отправлено писем: {result["sent"]}, ошибок: {result["failed"]}'
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
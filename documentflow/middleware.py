@@ -1,12 +1,36 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
 from django.shortcuts import redirect
 
 
 class LoginRequiredMiddleware:
+    # Поддерживает оба режима: под ASGI асинхронные представления (потоковые
+    # уведомления) не занимают рабочий поток на всё время соединения
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self._check(request)
+        if response is not None:
+            return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await sync_to_async(self._check)(request)
+        if response is not None:
+            return response
+        return await self.get_response(request)
+
+    def _check(self, request):
+        """Редирект для запроса или None, если запрос пропускается дальше."""
         path = request.path
 
         if request.user.is_authenticated:
@@ -19,13 +43,11 @@ class LoginRequiredMiddleware:
                 }
                 if path not in allowed_when_change:
                     if settings.STATIC_URL and path.startswith(settings.STATIC_URL):
-                        return self.get_response(request)
-                    if settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
-                        return self.get_response(request)
+                        return None
                     if path.startswith('/api/'):
-                        return self.get_response(request)
+                        return None
                     return redirect('/password-change/')
-            return self.get_response(request)
+            return None
 
         allowed_paths = {
             settings.LOGIN_URL or '/',
@@ -38,17 +60,15 @@ class LoginRequiredMiddleware:
         }
 
         if path in allowed_paths:
-            return self.get_response(request)
+            return None
 
         if path.startswith('/reset/'):
-            return self.get_response(request)
+            return None
         if path.startswith('/password-reset/'):
-            return self.get_response(request)
+            return None
         if settings.STATIC_URL and path.startswith(settings.STATIC_URL):
-            return self.get_response(request)
-        if settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
-            return self.get_response(request)
+            return None
         if path.startswith('/api/'):
-            return self.get_response(request)
+            return None
 
         return redirect(settings.LOGIN_URL or '/')
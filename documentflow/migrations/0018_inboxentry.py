@@ -0,0 +1,102 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_inbox(apps, schema_editor):
+    # Копия правил services.inbox.build_inbox_entries на исторических моделях
+    Document = apps.get_model('documentflow', 'Document')
+    Approval = apps.get_model('documentflow', 'Approval')
+    InboxEntry = apps.get_model('documentflow', 'InboxEntry')
+
+    last_id = 0
+    while True:
+        documents = list(Document.objects.filter(id__gt=last_id).order_by('id')[:500])
+        if not documents:
+            break
+        last_id = documents[-1].id
+
+        approvals = {}
+        for approval in Approval.objects.filter(document__in=documents).values(
+            'id', 'document_id', 'approver_id', 'step', 'cycle', 'decision', 'decided_at', 'created_at'
+        ):
+            approvals.setdefault(approval['document_id'], []).append(approval)
+
+        entries = []
+        for document in documents:
+            rows = approvals.get(document.id)
+            if not rows:
+                continue
+            doc_cycle = max(a['cycle'] for a in rows)
+            pending_steps = [a['step'] for a in rows if a['cycle'] == doc_cycle and a['decision'] == 'pending']
+            current_step = min(pending_steps) if pending_steps else None
+
+            by_user = {}
+            for approval in rows:
+                by_user.setdefault(approval['approver_id'], []).append(approval)
+            for user_id, user_rows in by_user.items():
+                user_cycle = max(a['cycle'] for a in user_rows)
+                cycle_rows = [a for a in user_rows if a['cycle'] == user_cycle]
+                pending = [a for a in cycle_rows if a['decision'] == 'pending']
+                decided = [a for a in cycle_rows if a['decision'] != 'pending']
+                if pending:
+                    last = max(pending, key=lambda a: (a['created_at'], a['id']))
+                else:
+                    last = max(decided, key=lambda a: (
+                        a['decided_at'] is not None, a['decided_at'] or a['created_at'], a['created_at'], a['id']
+                    ))
+                is_current = user_cycle == doc_cycle
+                is_actionable = is_current and any(
+                    document.approval_order != 'sequential' or a['step'] == current_step
+                    for a in pending
+                )
+                entries.append(InboxEntry(
+                    user_id=user_id,
+                    document_id=document.id,
+                    cycle=user_cycle,
+                    is_actionable=is_actionable,
+                    is_visible=is_actionable or (is_current and bool(decided)),
+                    last_decision=last['decision'],
+                    priority=document.priority,
+                    deadline=document.deadline,
+                    is_archived=document.is_archived,
+                    created_at=document.created_at,
+                ))
+        InboxEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0017_alter_replacement_reason_alter_user_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cycle', models.PositiveIntegerField(default=1, verbose_name='Раунд согласования')),
+                ('is_actionable', models.BooleanField(default=False, verbose_name='Требует действия')),
+                ('is_visible', models.BooleanField(default=False, verbose_name='Показывать во входящих')),
+                ('last_decision', models.CharField(choices=[('pending', 'Ожидает решения'), ('approved', 'Согласовано'), ('rejected', 'Отклонено'), ('returned', 'Возвращено на доработку'), ('acknowledged', 'Ознакомлен'), ('executed', 'Исполнен')], default='pending', max_length=20, verbose_name='Последнее решение')),
+                ('priority', models.CharField(default='normal', max_length=20, verbose_name='Приоритет')),
+                ('deadline', models.DateField(blank=True, null=True, verbose_name='Срок исполнения')),
+                ('is_archived', models.BooleanField(default=False, verbose_name='В архиве')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания документа')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='documentflow.document', verbose_name='Документ')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Входящий документ',
+                'verbose_name_plural': 'Входящие документы',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'is_archived', 'is_visible', 'created_at'], name='documentflo_user_id_a0d879_idx'), models.Index(fields=['user', 'is_archived', 'is_actionable'], name='documentflo_user_id_47854d_idx')],
+                'unique_together': {('user', 'document')},
+            },
+        ),
+        migrations.RunPython(fill_inbox, migrations.RunPython.noop),
+    ]
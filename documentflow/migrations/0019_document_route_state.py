@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:06
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+def backfill_route_state(apps, schema_editor):
+    Document = apps.get_model('documentflow', 'Document')
+    Approval = apps.get_model('documentflow', 'Approval')
+
+    max_cycles = dict(
+        Approval.objects
+        .values('document_id')
+        .annotate(max_cycle=Max('cycle'))
+        .values_list('document_id', 'max_cycle')
+    )
+    for document_id, cycle in max_cycles.items():
+        state = Approval.objects.filter(document_id=document_id, cycle=cycle).aggregate(
+            current_step=Min('step', filter=Q(decision='pending')),
+            pending_count=Count('id', filter=Q(decision='pending')),
+        )
+        Document.objects.filter(pk=document_id).update(current_cycle=cycle, **state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0018_inboxentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='current_cycle',
+            field=models.PositiveIntegerField(default=0, verbose_name='Текущий раунд согласования'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='current_step',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Текущий шаг согласования'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Ожидает решений'),
+        ),
+        migrations.RunPython(backfill_route_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0019_document_route_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=7, verbose_name='Период (ГГГГ-ММ)')),
+                ('scope', models.CharField(blank=True, default='', max_length=10, verbose_name='Код типа документа')),
+                ('last_number', models.PositiveIntegerField(default=0, verbose_name='Последний выданный номер')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Счётчик регистрационных номеров',
+                'verbose_name_plural': 'Счётчики регистрационных номеров',
+                'unique_together': {('period', 'scope')},
+            },
+        ),
+    ]
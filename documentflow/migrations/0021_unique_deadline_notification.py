@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:09
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_deadline_notifications(apps, schema_editor):
+    Notification = apps.get_model('documentflow', 'Notification')
+    duplicates = (
+        Notification.objects
+        .filter(notification_type='deadline', document__isnull=False)
+        .values('user_id', 'document_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        (
+            Notification.objects
+            .filter(notification_type='deadline', user_id=row['user_id'], document_id=row['document_id'])
+            .exclude(id=row['first_id'])
+            .delete()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0020_registrationcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_deadline_notifications, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('notification_type', 'deadline')), fields=('user', 'document'), name='unique_deadline_notification'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:13
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    # Те же правила, что в services.rollups.refresh_rollups, за весь период
+    Approval = apps.get_model('documentflow', 'Approval')
+    DailyActivity = apps.get_model('documentflow', 'DailyActivity')
+    DailyDecisionStat = apps.get_model('documentflow', 'DailyDecisionStat')
+    processed_decisions = {'approved', 'rejected', 'acknowledged', 'executed'}
+
+    rows = (
+        Approval.objects
+        .filter(decided_at__isnull=False)
+        .annotate(
+            day=TruncDate('decided_at'),
+            duration=ExpressionWrapper(F('decided_at') - F('created_at'), output_field=DurationField()),
+        )
+        .values('approver_id', 'day', 'document__document_type_id', 'document__priority', 'decision')
+        .annotate(count=Count('id'), processing_time=Sum('duration'))
+        .order_by()
+    )
+    totals = {}
+    decision_stats = []
+    for row in rows.iterator():
+        key = (row['approver_id'], row['day'])
+        total = totals.get(key)
+        if total is None:
+            total = totals[key] = DailyActivity(
+                user_id=row['approver_id'], day=row['day'], processing_time=datetime.timedelta()
+            )
+        total.decided_count += row['count']
+        total.processing_time += row['processing_time'] or datetime.timedelta()
+        if row['decision'] in processed_decisions:
+            total.processed_count += row['count']
+        decision_stats.append(DailyDecisionStat(
+            user_id=row['approver_id'],
+            day=row['day'],
+            document_type_id=row['document__document_type_id'],
+            priority=row['document__priority'] or 'normal',
+            decision=row['decision'],
+            count=row['count'],
+        ))
+    DailyActivity.objects.bulk_create(totals.values(), batch_size=500)
+    DailyDecisionStat.objects.bulk_create(decision_stats, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0021_unique_deadline_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDecisionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('priority', models.CharField(default='normal', max_length=20, verbose_name='Приоритет')),
+                ('decision', models.CharField(choices=[('pending', 'Ожидает решения'), ('approved', 'Согласовано'), ('rejected', 'Отклонено'), ('returned', 'Возвращено на доработку'), ('acknowledged', 'Ознакомлен'), ('executed', 'Исполнен')], max_length=20, verbose_name='Решение')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('document_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='documentflow.documenttype', verbose_name='Тип документа')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_decision_stats', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Дневная статистика решений',
+                'verbose_name_plural': 'Дневная статистика решений',
+                'ordering': ['-day'],
+                'unique_together': {('user', 'day', 'document_type', 'priority', 'decision')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('decided_count', models.PositiveIntegerField(default=0, verbose_name='Принято решений')),
+                ('processed_count', models.PositiveIntegerField(default=0, verbose_name='Обработано документов')),
+                ('processing_time', models.DurationField(default=datetime.timedelta, verbose_name='Суммарное время обработки')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Дневная активность',
+                'verbose_name_plural': 'Дневная активность',
+                'ordering': ['-day'],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('documentflow', 'User')
+    Notification = apps.get_model('documentflow', 'Notification')
+    NotificationCounter = apps.get_model('documentflow', 'NotificationCounter')
+
+    unread = dict(
+        Notification.objects
+        .filter(is_read=False)
+        .order_by()
+        .values('user_id')
+        .annotate(count=Count('id'))
+        .values_list('user_id', 'count')
+    )
+    NotificationCounter.objects.bulk_create(
+        [
+            NotificationCounter(user_id=user_id, unread_count=unread.get(user_id, 0))
+            for user_id in User.objects.values_list('id', flat=True)
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0022_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+                ('unread_count', models.PositiveIntegerField(default=0, verbose_name='Непрочитанных уведомлений')),
+            ],
+            options={
+                'verbose_name': 'Счётчик уведомлений',
+                'verbose_name_plural': 'Счётчики уведомлений',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
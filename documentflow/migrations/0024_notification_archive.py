@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0023_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(verbose_name='ID уведомления')),
+                ('notification_type', models.CharField(choices=[('new_document', 'Новый документ'), ('deadline', 'Срок исполнения'), ('approval', 'Согласование'), ('assignment', 'Назначение'), ('status_change', 'Изменение статуса'), ('comment', 'Комментарий'), ('system', 'Системное')], default='system', max_length=20, verbose_name='Тип уведомления')),
+                ('title', models.CharField(max_length=255, verbose_name='Заголовок')),
+                ('text', models.TextField(verbose_name='Текст уведомления')),
+                ('link', models.CharField(blank=True, max_length=255, verbose_name='Ссылка')),
+                ('is_read', models.BooleanField(default=False, verbose_name='Прочитано')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата прочтения')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+                ('document', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_notifications', to='documentflow.document', verbose_name='Связанный документ')),
+                ('sender', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sent_archived_notifications', to=settings.AUTH_USER_MODEL, verbose_name='Отправитель')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+            ],
+            options={
+                'verbose_name': 'Архивное уведомление',
+                'verbose_name_plural': 'Архивные уведомления',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='documentflo_created_d96002_idx'), models.Index(fields=['user', 'created_at'], name='documentflo_user_id_713d42_idx'), models.Index(fields=['notification_type', 'document'], name='documentflo_notific_e7d16f_idx')],
+            },
+        ),
+    ]
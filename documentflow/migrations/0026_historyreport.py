@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0025_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Отпечаток содержимого')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Формируется'), ('ready', 'Готов'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('file', models.FileField(blank=True, upload_to='reports/history/', verbose_name='Файл отчёта')),
+                ('file_name', models.CharField(blank=True, max_length=255, verbose_name='Имя файла')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Тип содержимого')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало формирования')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата готовности')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history_reports', to='documentflow.document', verbose_name='Документ')),
+            ],
+            options={
+                'verbose_name': 'Отчёт об истории документа',
+                'verbose_name_plural': 'Отчёты об истории документов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='historyreport',
+            constraint=models.UniqueConstraint(fields=('document', 'fingerprint'), name='unique_history_report'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0026_historyreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfile',
+            name='mime_type',
+            field=models.CharField(blank=True, max_length=100, verbose_name='MIME-тип по содержимому'),
+        ),
+        migrations.AddField(
+            model_name='documentfile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256 содержимого'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:37
+
+from django.db import migrations, models
+import documentflow.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0027_documentfile_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Имя в хранилище')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 содержимого')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Размер')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл хранилища',
+                'verbose_name_plural': 'Файлы хранилища',
+            },
+        ),
+        migrations.AlterField(
+            model_name='documentfile',
+            name='file',
+            field=models.FileField(storage=documentflow.storage.content_storage, upload_to='documents/%Y/%m/%d/', verbose_name='Файл'),
+        ),
+        migrations.AlterField(
+            model_name='documentversion',
+            name='file',
+            field=models.FileField(storage=documentflow.storage.content_storage, upload_to='documents/versions/', verbose_name='Файл версии'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0028_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер файла')),
+                ('received', models.BigIntegerField(default=0, verbose_name='Получено байт')),
+                ('file_type', models.CharField(blank=True, max_length=50, verbose_name='Тип файла')),
+                ('expected_sha256', models.CharField(blank=True, max_length=64, verbose_name='Ожидаемый SHA-256')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 содержимого')),
+                ('mime_type', models.CharField(blank=True, max_length=100, verbose_name='MIME-тип по содержимому')),
+                ('stored_name', models.CharField(max_length=100, verbose_name='Имя в хранилище')),
+                ('status', models.CharField(choices=[('open', 'Загружается'), ('complete', 'Загружен')], default='open', max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка файла частями',
+                'verbose_name_plural': 'Загрузки файлов частями',
+                'indexes': [models.Index(fields=['updated_at'], name='documentflo_updated_83cbed_idx')],
+            },
+        ),
+    ]
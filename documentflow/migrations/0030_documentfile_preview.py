@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0029_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfile',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('ready', 'Готово'), ('failed', 'Ошибка'), ('none', 'Не поддерживается')], db_index=True, default='pending', max_length=10, verbose_name='Статус превью'),
+        ),
+        migrations.AddField(
+            model_name='documentfile',
+            name='preview_text',
+            field=models.TextField(blank=True, verbose_name='Начало текста'),
+        ),
+        migrations.AddField(
+            model_name='documentfile',
+            name='thumbnail',
+            field=models.CharField(blank=True, max_length=120, verbose_name='Миниатюра в хранилище'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:49
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import DatabaseError, migrations, models
+import django.db.models.deletion
+
+
+FTS_TABLE = 'documentflow_search_fts'
+BATCH_SIZE = 500
+
+
+def create_search_backend(apps, schema_editor):
+    """GIN-индекс в PostgreSQL, виртуальная таблица FTS5 в SQLite."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS documentflow_search_vector_gin '
+            'ON documentflow_documentsearchentry USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                "USING fts5(content, attachments_text, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except DatabaseError:
+            # SQLite без FTS5: поиск пойдёт перебором строк индекса
+            pass
+
+
+def drop_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS documentflow_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fill_search_index(apps, schema_editor):
+    """
+    Индекс по тексту документов. Текст DOCX-вложений добавит
+    build_previews: готовые текстовые превью ставятся в очередь заново.
+    """
+    Document = apps.get_model('documentflow', 'Document')
+    DocumentFile = apps.get_model('documentflow', 'DocumentFile')
+    DocumentSearchEntry = apps.get_model('documentflow', 'DocumentSearchEntry')
+    connection = schema_editor.connection
+    fts = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+    last_id = 0
+    while True:
+        rows = list(
+            Document.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'title', 'registration_number', 'external_number', 'description')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        entries = [
+            DocumentSearchEntry(document_id=document_id, content='\n'.join(part for part in parts if part))
+            for document_id, *parts in rows
+        ]
+        DocumentSearchEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        if fts:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, content, attachments_text) VALUES (%s, %s, %s)',
+                    [(entry.document_id, entry.content, '') for entry in entries],
+                )
+
+    if connection.vendor == 'postgresql':
+        config = getattr(settings, 'SEARCH_CONFIG', 'russian')
+        schema_editor.execute(
+            'UPDATE documentflow_documentsearchentry '
+            "SET search_vector = setweight(to_tsvector(%s::regconfig, content), 'A')",
+            [config],
+        )
+
+    DocumentFile.objects.filter(preview_status='ready', thumbnail='').update(preview_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0030_documentfile_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSearchEntry',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='documentflow.document', verbose_name='Документ')),
+                ('content', models.TextField(blank=True, verbose_name='Текст документа')),
+                ('attachments_text', models.TextField(blank=True, verbose_name='Текст вложений')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True, verbose_name='Поисковый вектор')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс документа',
+                'verbose_name_plural': 'Поисковый индекс документов',
+            },
+        ),
+        migrations.AddField(
+            model_name='documentfile',
+            name='extracted_text',
+            field=models.TextField(blank=True, verbose_name='Текст файла для поиска'),
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
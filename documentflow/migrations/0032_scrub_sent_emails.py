@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:20
+
+from django.db import migrations
+
+
+def scrub_sent_emails(apps, schema_editor):
+    EmailOutbox = apps.get_model('documentflow', 'EmailOutbox')
+    EmailOutbox.objects.filter(status='sent').exclude(body='', html_body='').update(body='', html_body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0031_document_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(scrub_sent_emails, migrations.RunPython.noop),
+    ]
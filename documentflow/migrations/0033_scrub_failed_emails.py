@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations
+
+
+def scrub_failed_emails(apps, schema_editor):
+    EmailOutbox = apps.get_model('documentflow', 'EmailOutbox')
+    EmailOutbox.objects.filter(status='failed').exclude(body='', html_body='').update(body='', html_body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documentflow', '0032_scrub_sent_emails'),
+    ]
+
+    operations = [
+        migrations.RunPython(scrub_failed_emails, migrations.RunPython.noop),
+    ]
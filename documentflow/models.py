@@ -1,10 +1,16 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from django.db.models.signals import post_delete
+from django.utils.functional import cached_property
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
+from documentflow.storage import content_storage
+from documentflow.uploads import file_type_for
 
 
 
@@ -222,9 +228,10 @@ class User(AbstractUser):
             initials += self.first_name[0]
         return initials.upper() if initials else self.username[0].upper()
 
-    @property
+    @cached_property
     def unread_notifications(self):
-        return self.notifications.filter(is_read=False).count()
+        from documentflow.services.unread import unread_count
+        return unread_count(self.id)
 
     def save(self, *args, **kwargs):
         previous_status = None
@@ -237,42 +244,8 @@ class User(AbstractUser):
         super().save(*args, **kwargs)
 
         if previous_status != EmployeeStatus.DISMISSED and self.status == EmployeeStatus.DISMISSED:
-            replacement_user = None
-            today = timezone.localdate()
-            replacement = (
-                Replacement.objects
-                .filter(
-                    absent_employee=self,
-                    is_active=True,
-                    start_date__lte=today,
-                    end_date__gte=today,
-                    replacement_employee__is_active=True,
-                    replacement_employee__status=EmployeeStatus.WORKING
-                )
-                .order_by('-start_date')
-                .first()
-            )
-            if replacement:
-                replacement_user = replacement.replacement_employee
-            elif (
-                self.department
-                and self.department.head
-                and self.department.head.is_active
-                and self.department.head.status == EmployeeStatus.WORKING
-            ):
-                replacement_user = self.department.head
-            else:
-                replacement_user = (
-                    User.objects
-                    .filter(
-                        department=self.department,
-                        is_active=True,
-                        status=EmployeeStatus.WORKING
-                    )
-                    .exclude(id=self.id)
-                    .order_by('last_name', 'first_name')
-                    .first()
-                )
+            from documentflow.services.approvers import resolve_approver
+            replacement_user = resolve_approver(self)
 
             if replacement_user:
                 DocumentRouteStep.objects.filter(user=self).update(user=replacement_user)
@@ -473,6 +446,19 @@ class Document(models.Model):
         null=True,
         verbose_name="Дата отклонения"
     )
+    current_cycle = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Текущий раунд согласования"
+    )
+    current_step = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Текущий шаг согласования"
+    )
+    pending_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Ожидает решений"
+    )
 
     class Meta:
         verbose_name = "Документ"
@@ -516,6 +502,13 @@ class Document(models.Model):
 
 # ====== Файлы документа ======
 class DocumentFile(models.Model):
+    PREVIEW_STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('ready', 'Готово'),
+        ('failed', 'Ошибка'),
+        ('none', 'Не поддерживается'),
+    ]
+
     document = models.ForeignKey(
         Document, 
         on_delete=models.CASCADE, 
@@ -524,6 +517,7 @@ class DocumentFile(models.Model):
     )
     file = models.FileField(
         upload_to='documents/%Y/%m/%d/', 
+        storage=content_storage,
         verbose_name="Файл"
     )
     file_name = models.CharField(
@@ -540,6 +534,17 @@ class DocumentFile(models.Model):
         verbose_name="Тип файла",
         blank=True
     )
+    mime_type = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="MIME-тип по содержимому"
+    )
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name="SHA-256 содержимого"
+    )
     uploaded_at = models.DateTimeField(
         auto_now_add=True, 
         verbose_name="Дата загрузки"
@@ -556,6 +561,26 @@ class DocumentFile(models.Model):
         blank=True,
         verbose_name="Описание файла"
     )
+    preview_status = models.CharField(
+        max_length=10,
+        choices=PREVIEW_STATUS_CHOICES,
+        default='pending',
+        db_index=True,
+        verbose_name="Статус превью"
+    )
+    thumbnail = models.CharField(
+        max_length=120,
+        blank=True,
+        verbose_name="Миниатюра в хранилище"
+    )
+    preview_text = models.TextField(
+        blank=True,
+        verbose_name="Начало текста"
+    )
+    extracted_text = models.TextField(
+        blank=True,
+        verbose_name="Текст файла для поиска"
+    )
 
     class Meta:
         verbose_name = "Файл документа"
@@ -571,26 +596,16 @@ class DocumentFile(models.Model):
             if not self.file_name:
                 self.file_name = self.file.name
             
-            # Определяем размер файла
-            try:
-                self.file_size = self.file.size
-            except (AttributeError, OSError):
-                pass
-            
+            # Определяем размер файла (у потоковой загрузки он уже известен)
+            if not self.file_size:
+                try:
+                    self.file_size = self.file.size
+                except (AttributeError, OSError):
+                    pass
+
             # Определяем тип файла
             if not self.file_type:
-                import os
-                ext = os.path.splitext(self.file.name)[1].lower()
-                if ext in ['.pdf']:
-                    self.file_type = 'PDF'
-                elif ext in ['.doc', '.docx']:
-                    self.file_type = 'Word'
-                elif ext in ['.xls', '.xlsx']:
-                    self.file_type = 'Excel'
-                elif ext in ['.jpg', '.jpeg', '.png', '.gif']:
-                    self.file_type = 'Image'
-                else:
-                    self.file_type = 'Other'
+                self.file_type = file_type_for(self.file.name)
         
         super().save(*args, **kwargs)
 
@@ -672,6 +687,179 @@ class Approval(models.Model):
         return today > self.deadline and self.decision == 'pending'
 
 
+# ====== Входящие сотрудника ======
+class InboxEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries',
+        verbose_name="Сотрудник"
+    )
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries',
+        verbose_name="Документ"
+    )
+    cycle = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Раунд согласования"
+    )
+    is_actionable = models.BooleanField(
+        default=False,
+        verbose_name="Требует действия"
+    )
+    is_visible = models.BooleanField(
+        default=False,
+        verbose_name="Показывать во входящих"
+    )
+    last_decision = models.CharField(
+        max_length=20,
+        choices=Approval.DECISION_CHOICES,
+        default='pending',
+        verbose_name="Последнее решение"
+    )
+    priority = models.CharField(
+        max_length=20,
+        default='normal',
+        verbose_name="Приоритет"
+    )
+    deadline = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Срок исполнения"
+    )
+    is_archived = models.BooleanField(
+        default=False,
+        verbose_name="В архиве"
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания документа"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата обновления"
+    )
+
+    class Meta:
+        verbose_name = "Входящий документ"
+        verbose_name_plural = "Входящие документы"
+        ordering = ['-created_at']
+        unique_together = ['user', 'document']
+        indexes = [
+            models.Index(fields=['user', 'is_archived', 'is_visible', 'created_at']),
+            models.Index(fields=['user', 'is_archived', 'is_actionable']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} — {self.document_id} ({self.get_last_decision_display()})"
+
+
+# ====== Счётчики регистрационных номеров ======
+class RegistrationCounter(models.Model):
+    period = models.CharField(
+        max_length=7,
+        verbose_name="Период (ГГГГ-ММ)"
+    )
+    scope = models.CharField(
+        max_length=10,
+        blank=True,
+        default='',
+        verbose_name="Код типа документа"
+    )
+    last_number = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Последний выданный номер"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата обновления"
+    )
+
+    class Meta:
+        verbose_name = "Счётчик регистрационных номеров"
+        verbose_name_plural = "Счётчики регистрационных номеров"
+        unique_together = ['period', 'scope']
+
+    def __str__(self):
+        scope = f"{self.scope}-" if self.scope else ''
+        return f"{scope}{self.period}: {self.last_number}"
+
+
+# ====== Дневные сводки активности ======
+class DailyActivity(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_activity',
+        verbose_name="Сотрудник"
+    )
+    day = models.DateField(
+        verbose_name="День"
+    )
+    decided_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Принято решений"
+    )
+    processed_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Обработано документов"
+    )
+    processing_time = models.DurationField(
+        default=timezone.timedelta,
+        verbose_name="Суммарное время обработки"
+    )
+
+    class Meta:
+        verbose_name = "Дневная активность"
+        verbose_name_plural = "Дневная активность"
+        ordering = ['-day']
+        unique_together = ['user', 'day']
+
+    def __str__(self):
+        return f"{self.user} — {self.day}: {self.decided_count}"
+
+
+class DailyDecisionStat(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_decision_stats',
+        verbose_name="Сотрудник"
+    )
+    day = models.DateField(
+        verbose_name="День"
+    )
+    document_type = models.ForeignKey(
+        DocumentType,
+        on_delete=models.CASCADE,
+        verbose_name="Тип документа"
+    )
+    priority = models.CharField(
+        max_length=20,
+        default='normal',
+        verbose_name="Приоритет"
+    )
+    decision = models.CharField(
+        max_length=20,
+        choices=Approval.DECISION_CHOICES,
+        verbose_name="Решение"
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество"
+    )
+
+    class Meta:
+        verbose_name = "Дневная статистика решений"
+        verbose_name_plural = "Дневная статистика решений"
+        ordering = ['-day']
+        unique_together = ['user', 'day', 'document_type', 'priority', 'decision']
+
+    def __str__(self):
+        return f"{self.user} — {self.day}: {self.get_decision_display()} ({self.count})"
+
+
 # ====== Уведомления ======
 class Notification(models.Model):
     TYPE_CHOICES = [
@@ -746,16 +934,128 @@ class Notification(models.Model):
             models.Index(fields=['user', 'is_read']),
             models.Index(fields=['created_at']),
         ]
+        constraints = [
+            # Одно уведомление о сроке на сотрудника и документ
+            models.UniqueConstraint(
+                fields=['user', 'document'],
+                condition=models.Q(notification_type='deadline'),
+                name='unique_deadline_notification',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user}: {self.title}"
     
     def mark_as_read(self):
         if not self.is_read:
+            from documentflow.services.unread import mark_read
+            mark_read(self.user_id, [self.pk])
             self.is_read = True
-            from django.utils import timezone
             self.read_at = timezone.now()
-            self.save()
+
+
+class NotificationCounter(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter',
+        verbose_name="Сотрудник"
+    )
+    unread_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Непрочитанных уведомлений"
+    )
+
+    class Meta:
+        verbose_name = "Счётчик уведомлений"
+        verbose_name_plural = "Счётчики уведомлений"
+
+    def __str__(self):
+        return f"{self.user}: {self.unread_count}"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Архив старых уведомлений, перенесённых из основной таблицы политикой
+    хранения. Внешние ключи без ограничений в БД, чтобы таблицу можно было
+    секционировать по created_at и переносить строки без блокировок связанных таблиц.
+    """
+    notification_id = models.BigIntegerField(
+        verbose_name="ID уведомления"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='archived_notifications',
+        verbose_name="Получатель"
+    )
+    notification_type = models.CharField(
+        max_length=20,
+        choices=Notification.TYPE_CHOICES,
+        default='system',
+        verbose_name="Тип уведомления"
+    )
+    title = models.CharField(
+        max_length=255,
+        verbose_name="Заголовок"
+    )
+    text = models.TextField(
+        verbose_name="Текст уведомления"
+    )
+    link = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Ссылка"
+    )
+    is_read = models.BooleanField(
+        default=False,
+        verbose_name="Прочитано"
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания"
+    )
+    read_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата прочтения"
+    )
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='archived_notifications',
+        verbose_name="Связанный документ"
+    )
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        related_name='sent_archived_notifications',
+        verbose_name="Отправитель"
+    )
+    archived_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата архивации"
+    )
+
+    class Meta:
+        verbose_name = "Архивное уведомление"
+        verbose_name_plural = "Архивные уведомления"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['notification_type', 'document']),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.title}"
 
 
 class EmailChangeRequest(models.Model):
@@ -781,6 +1081,45 @@ class EmailChangeRequest(models.Model):
         return self.created_at < timezone.now() - timezone.timedelta(minutes=10)
 
 
+class EmailOutbox(models.Model):
+    """Исходящее письмо. Отправляется фоновой командой send_outbox."""
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    body = models.TextField(verbose_name="Текст письма")
+    html_body = models.TextField(blank=True, verbose_name="HTML-версия")
+    from_email = models.CharField(max_length=255, blank=True, verbose_name="Отправитель")
+    to = models.JSONField(default=list, verbose_name="Получатели")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попытки отправки")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name="Взято в отправку")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{', '.join(self.to)}: {self.subject}"
+
+
 # ====== Журнал действий ======
 class ActionLog(models.Model):
     ACTION_CHOICES = [
@@ -1180,6 +1519,7 @@ class DocumentVersion(models.Model):
     )
     file = models.FileField(
         upload_to='documents/versions/',
+        storage=content_storage,
         verbose_name="Файл версии"
     )
     version = models.PositiveIntegerField(
@@ -1207,3 +1547,215 @@ class DocumentVersion(models.Model):
             last_version = DocumentVersion.objects.filter(document=self.document).order_by('-version').first()
             self.version = 1 if not last_version else last_version.version + 1
         super().save(*args, **kwargs)
+
+
+class StoredBlob(models.Model):
+    """
+    Файл в хранилище по содержимому (blobs/ab/cd/<sha256>) и число
+    ссылок на него из файлов и версий документов. Файлы без ссылок
+    удаляет команда dedupe_files --sweep.
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="Имя в хранилище")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256 содержимого")
+    size = models.BigIntegerField(default=0, verbose_name="Размер")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="Число ссылок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class UploadSession(models.Model):
+    """
+    Возобновляемая загрузка большого файла частями. Части дописываются
+    в файл хранилища по смещению, после завершения проверяется SHA-256,
+    и файл прикрепляется к документу без повторного копирования.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Загружается'),
+        ('complete', 'Загружен'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name="Пользователь"
+    )
+    file_name = models.CharField(max_length=255, verbose_name="Имя файла")
+    size = models.BigIntegerField(verbose_name="Размер файла")
+    received = models.BigIntegerField(default=0, verbose_name="Получено байт")
+    file_type = models.CharField(max_length=50, blank=True, verbose_name="Тип файла")
+    expected_sha256 = models.CharField(max_length=64, blank=True, verbose_name="Ожидаемый SHA-256")
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name="SHA-256 содержимого")
+    mime_type = models.CharField(max_length=100, blank=True, verbose_name="MIME-тип по содержимому")
+    stored_name = models.CharField(max_length=100, verbose_name="Имя в хранилище")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open', verbose_name="Статус")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Загрузка файла частями"
+        verbose_name_plural = "Загрузки файлов частями"
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received}/{self.size})"
+
+
+class DocumentSearchEntry(models.Model):
+    """
+    Строка полнотекстового индекса документа: название, номер, описание
+    и текст вложений. В PostgreSQL поиск идёт по search_vector с GIN-индексом,
+    в SQLite — по таблице FTS5 (создаются миграцией для своей СУБД).
+    """
+    document = models.OneToOneField(
+        Document,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+        verbose_name="Документ"
+    )
+    content = models.TextField(blank=True, verbose_name="Текст документа")
+    attachments_text = models.TextField(blank=True, verbose_name="Текст вложений")
+    search_vector = SearchVectorField(null=True, verbose_name="Поисковый вектор")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Поисковый индекс документа"
+        verbose_name_plural = "Поисковый индекс документов"
+
+    def __str__(self):
+        return f"{self.document_id}"
+
+
+class HistoryReport(models.Model):
+    """
+    Сформированный отчёт об истории документа. Отчёт привязан к отпечатку
+    содержимого (документ, согласования, файлы, версии): пока данные не
+    менялись, повторная выгрузка отдаёт готовый файл.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Формируется'),
+        ('ready', 'Готов'),
+        ('failed', 'Ошибка'),
+    ]
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='history_reports',
+        verbose_name="Документ"
+    )
+    fingerprint = models.CharField(max_length=64, verbose_name="Отпечаток содержимого")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Статус"
+    )
+    file = models.FileField(
+        upload_to='reports/history/',
+        blank=True,
+        verbose_name="Файл отчёта"
+    )
+    file_name = models.CharField(max_length=255, blank=True, verbose_name="Имя файла")
+    content_type = models.CharField(max_length=100, blank=True, verbose_name="Тип содержимого")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало формирования")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата готовности")
+
+    class Meta:
+        verbose_name = "Отчёт об истории документа"
+        verbose_name_plural = "Отчёты об истории документов"
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'fingerprint'], name='unique_history_report'),
+        ]
+
+    def __str__(self):
+        return f"{self.document} — {self.get_status_display()}"
+
+
+@receiver(pre_delete, sender=Document)
+def invalidate_dashboard_on_document_delete(sender, instance, **kwargs):
+    from documentflow.services.dashboard_cache import invalidate_dashboard
+    user_ids = list(InboxEntry.objects.filter(document=instance).values_list('user_id', flat=True))
+    invalidate_dashboard(user_ids + [instance.author_id])
+
+
+@receiver(post_save, sender=Notification)
+def notification_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from documentflow.services.notification_bus import publish_notifications
+    from documentflow.services.unread import change_unread
+    if not instance.is_read:
+        change_unread(instance.user_id, 1)
+    publish_notifications([instance])
+
+
+@receiver(pre_save, sender=DocumentFile)
+@receiver(pre_save, sender=DocumentVersion)
+def blob_remember_previous(sender, instance, update_fields=None, **kwargs):
+    # Имя файла до сохранения: при замене файла ссылка переносится на новый
+    instance._previous_file_name = None
+    if instance._state.adding or (update_fields is not None and 'file' not in update_fields):
+        return
+    instance._previous_file_name = sender.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+
+
+@receiver(post_save, sender=DocumentFile)
+@receiver(post_save, sender=DocumentVersion)
+def blob_referenced(sender, instance, created, **kwargs):
+    from documentflow.services.blobs import add_blob_ref, release_blob_ref
+    previous = '' if created else getattr(instance, '_previous_file_name', None)
+    if previous is None:
+        # Поле файла не сохранялось (update_fields без file)
+        return
+    current = instance.file.name if instance.file else ''
+    if current == previous:
+        return
+    with transaction.atomic():
+        if current:
+            add_blob_ref(current)
+        if previous:
+            release_blob_ref(previous)
+
+
+@receiver(post_delete, sender=DocumentFile)
+@receiver(post_delete, sender=DocumentVersion)
+def blob_released(sender, instance, **kwargs):
+    if instance.file:
+        from documentflow.services.blobs import release_blob_ref
+        release_blob_ref(instance.file.name)
+
+
+@receiver(post_save, sender=Document)
+def document_search_reindex(sender, instance, update_fields=None, **kwargs):
+    from documentflow.services.search import INDEXED_FIELDS, schedule_reindex
+    if update_fields is None or INDEXED_FIELDS.intersection(update_fields):
+        schedule_reindex(instance.id)
+
+
+@receiver(post_delete, sender=Document)
+def document_search_remove(sender, instance, **kwargs):
+    from documentflow.services.search import remove_from_index
+    remove_from_index(instance.id)
+
+
+@receiver(post_delete, sender=DocumentFile)
+def document_file_search_reindex(sender, instance, **kwargs):
+    if instance.extracted_text:
+        from documentflow.services.search import schedule_reindex
+        schedule_reindex(instance.document_id)
@@ -0,0 +1,98 @@
+# Построение превью файлов. Модуль не зависит от Django: функции
+# выполняются в отдельных процессах пула и получают только пути к файлам.
+import os
+import uuid
+
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_SUFFIX = '.thumb.jpg'
+THUMBNAIL_QUALITY = 80
+SNIPPET_LENGTH = 600
+MAX_TEXT_LENGTH = 200000
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def preview_kind(file_name, mime_type=''):
+    """'thumbnail' для изображений, 'text' для DOCX, None — превью не строится."""
+    extension = os.path.splitext(file_name)[1].lower()
+    if mime_type.startswith('image/') or (not mime_type and extension in ('.jpg', '.jpeg', '.png', '.gif', '.webp')):
+        return 'thumbnail'
+    if mime_type == DOCX_MIME or (not mime_type and extension == '.docx'):
+        return 'text'
+    return None
+
+
+def thumbnail_name(name):
+    """Миниатюра хранится рядом с оригиналом."""
+    return f'{name}{THUMBNAIL_SUFFIX}'
+
+
+def render_preview(kind, source_path, target_path=None):
+    """Превью файла: {'thumbnail': True} или {'text': ...}."""
+    if kind == 'thumbnail':
+        render_thumbnail(source_path, target_path)
+        return {'thumbnail': True}
+    if kind == 'text':
+        content = docx_text(source_path)
+        return {'text': snippet(content), 'content': content}
+    raise ValueError(f'Неизвестный вид превью: {kind}')
+
+
+def render_thumbnail(source_path, target_path, size=THUMBNAIL_SIZE):
+    """
+    JPEG-миниатюра не больше size с учётом поворота из EXIF. Файл пишется
+    во временный и переименовывается, чтобы не отдать его недописанным.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        temporary = f'{target_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            image.save(temporary, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            os.replace(temporary, target_path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+
+def docx_text(source_path, limit=MAX_TEXT_LENGTH):
+    """Текст DOCX по абзацам, включая таблицы, не длиннее limit символов."""
+    from docx import Document
+
+    document = Document(source_path)
+    parts = []
+    length = 0
+    for text in _docx_paragraphs(document):
+        text = ' '.join(text.split())
+        if not text:
+            continue
+        parts.append(text)
+        length += len(text) + 1
+        if length >= limit:
+            break
+    return '\n'.join(parts)[:limit]
+
+
+def snippet(text, limit=SNIPPET_LENGTH):
+    """Начало текста для карточки документа."""
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + '…'
+
+
+def _docx_paragraphs(document):
+    for paragraph in document.paragraphs:
+        yield paragraph.text
+    for table in document.tables:
+        for row in table.rows:
+            yield ' '.join(cell.text for cell in row.cells)
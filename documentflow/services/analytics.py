@@ -0,0 +1,190 @@
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from documentflow.models import Approval, DailyActivity, DailyDecisionStat, Document
+from documentflow.services.dashboard_cache import dashboard_version, get_cached_summary, set_cached_summary
+from documentflow.services.inbox import inbox_counters
+
+
+PROCESSED_DECISIONS = ['approved', 'rejected', 'acknowledged', 'executed']
+
+PRIORITY_LABELS = {
+    'low': 'Низкий',
+    'normal': 'Обычный',
+    'high': 'Высокий',
+    'urgent': 'Срочный',
+}
+
+# Число SQL-запросов на один вызов
+DASHBOARD_SUMMARY_QUERIES = 3
+PERSONAL_STATS_QUERIES = 8
+
+# Документы автора, которые сейчас находятся на согласовании
+ON_APPROVAL = (
+    Q(is_archived=False)
+    & ~Q(status__is_final=True)
+    & ~Q(status__name__iexact='Черновик')
+    & ~Q(status__name__icontains='доработ')
+    & ~Q(status__name__icontains='возвращ')
+)
+
+
+def weekly_activity(user, today=None, days=7):
+    """
+    Обработанные сотрудником документы по дням за последние days дней
+    (включая сегодня) из дневных сводок. Один запрос.
+    """
+    today = today or timezone.localdate()
+    start = today - timezone.timedelta(days=days - 1)
+    per_day = dict(
+        DailyActivity.objects
+        .filter(user=user, day__gte=start, day__lte=today)
+        .values_list('day', 'processed_count')
+    )
+
+    labels = []
+    counts = []
+    for i in range(days - 1, -1, -1):
+        day = today - timezone.timedelta(days=i)
+        labels.append(day.strftime('%d.%m'))
+        counts.append(per_day.get(day, 0))
+    return {'labels': labels, 'counts': counts}
+
+
+def dashboard_summary(user, today=None):
+    """
+    Счётчики рабочего кабинета: входящие, срочные, просроченные,
+    на согласовании, обработанные сегодня и недельный ряд.
+    Результат кэшируется на сотрудника и сбрасывается при изменении его
+    входящих, документов или решений (invalidate_dashboard).
+    При промахе кэша не более DASHBOARD_SUMMARY_QUERIES запросов.
+    """
+    today = today or timezone.localdate()
+    version = dashboard_version(user.id)
+    summary = get_cached_summary(user.id, today, version)
+    if summary is not None:
+        return dict(summary)
+
+    counters = inbox_counters(user, today)
+    week = weekly_activity(user, today)
+    summary = {
+        'incoming_count': counters['incoming_count'],
+        'incoming_urgent': counters['incoming_urgent'],
+        'overdue_count': counters['overdue_count'],
+        'approval_overdue': counters['overdue_count'],
+        'approval_count': Document.objects.filter(ON_APPROVAL, author=user).count(),
+        'processed_today': week['counts'][-1],
+        'weekly_labels': week['labels'],
+        'weekly_stats': week['counts'],
+    }
+    set_cached_summary(user.id, today, version, summary)
+    return dict(summary)
+
+
+def personal_stats(user, today=None):
+    """
+    Все показатели страницы статистики сотрудника одной структурой.
+    Не более PERSONAL_STATS_QUERIES запросов независимо от объёма данных,
+    активность согласующего читается из дневных сводок (approver_activity).
+    """
+    today = today or timezone.localdate()
+
+    stats = dashboard_summary(user, today)
+
+    # ===== Документы автора =====
+    in_work = Q(is_archived=False, status__is_final=False)
+    finished = Q(actual_deadline__isnull=False, deadline__isnull=False)
+    stats.update(
+        Document.objects.filter(author=user).aggregate(
+            total_docs=Count('id'),
+            outgoing_count=Count('id', filter=Q(is_archived=False)),
+            archived_count=Count('id', filter=Q(is_archived=True)),
+            in_work_docs=Count('id', filter=in_work),
+            completed_docs=Count('id', filter=Q(status__is_final=True)),
+            overdue_docs=Count('id', filter=in_work & Q(deadline__lt=today)),
+            on_registration=Count('id', filter=Q(status__name__icontains='регистра')),
+            on_approval=Count('id', filter=Q(status__name__icontains='согласован')),
+            on_signature=Count('id', filter=Q(status__name__icontains='подпис')),
+            on_revision=Count('id', filter=Q(status__name__icontains='доработ')),
+            rejected_docs=Count('id', filter=Q(status__name__icontains='отклон')),
+            on_time=Count('id', filter=finished & Q(actual_deadline__lte=F('deadline'))),
+            late_docs=Count('id', filter=finished & Q(actual_deadline__gt=F('deadline'))),
+        )
+    )
+
+    status_agg = (
+        Document.objects
+        .filter(author=user)
+        .values('status__name')
+        .annotate(count=Count('id'))
+        .order_by('-count')
+    )
+    stats['status_labels'] = [s['status__name'] or '—' for s in status_agg]
+    stats['status_counts'] = [s['count'] for s in status_agg]
+
+    stats.update(
+        Approval.objects.filter(document__author=user).aggregate(
+            returns_count=Count('id', filter=Q(decision='returned')),
+            reapprovals_count=Count('id', filter=Q(cycle__gt=1)),
+        )
+    )
+
+    stats.update(approver_activity(user, today))
+    return stats
+
+
+def approver_activity(user, today=None):
+    """
+    Решения сотрудника за 30 дней (по видам, типам документов и приоритетам,
+    среднее время обработки) и помесячный ряд за полгода.
+    Читает дневные сводки: два запроса, не более нескольких сотен строк.
+    """
+    today = today or timezone.localdate()
+    last_30 = today - timezone.timedelta(days=30)
+    last_180 = today - timezone.timedelta(days=180)
+
+    decided_30 = 0
+    time_30 = timezone.timedelta()
+    months = {}
+    for day, decided_count, processing_time in (
+        DailyActivity.objects
+        .filter(user=user, day__gte=last_180, day__lte=today)
+        .order_by('day')
+        .values_list('day', 'decided_count', 'processing_time')
+    ):
+        month = day.strftime('%m.%Y')
+        months[month] = months.get(month, 0) + decided_count
+        if day >= last_30:
+            decided_30 += decided_count
+            time_30 += processing_time
+
+    decision_counts = {}
+    type_counts = {}
+    priority_counts = {}
+    for decision, type_name, priority, count in (
+        DailyDecisionStat.objects
+        .filter(user=user, day__gte=last_30, day__lte=today)
+        .values_list('decision', 'document_type__name', 'priority', 'count')
+    ):
+        type_name = type_name or '—'
+        priority = PRIORITY_LABELS.get(priority or 'normal', 'Обычный')
+        decision_counts[decision] = decision_counts.get(decision, 0) + count
+        type_counts[type_name] = type_counts.get(type_name, 0) + count
+        priority_counts[priority] = priority_counts.get(priority, 0) + count
+    type_counts = sorted(type_counts.items(), key=lambda item: -item[1])
+    priority_counts = sorted(priority_counts.items(), key=lambda item: -item[1])
+
+    avg_hours = None
+    if decided_30 and time_30:
+        avg_hours = round(time_30.total_seconds() / decided_30 / 3600, 1)
+
+    return {
+        'decision_counts': decision_counts,
+        'avg_hours': avg_hours,
+        'type_labels': [name for name, _ in type_counts],
+        'type_counts': [count for _, count in type_counts],
+        'priority_labels': [name for name, _ in priority_counts],
+        'priority_counts': [count for _, count in priority_counts],
+        'month_labels': list(months),
+        'month_counts': list(months.values()),
+    }
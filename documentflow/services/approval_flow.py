@@ -1,148 +1,159 @@
+from django.db import transaction
+
 from documentflow.models import (
     DocumentRouteTemplate,
-    DocumentRouteStep,
     Approval,
     User,
-    Replacement,
-    EmployeeStatus,
 )
-from django.utils import timezone
-
-
-def _resolve_approver(user):
-    if user.status in [
-        EmployeeStatus.VACATION,
-        EmployeeStatus.SICK,
-        EmployeeStatus.BUSINESS_TRIP,
-        EmployeeStatus.MATERNITY,
-        EmployeeStatus.IDLE,
-        EmployeeStatus.OTHER,
-        EmployeeStatus.DISMISSED,
-    ]:
-        today = timezone.localdate()
-        replacement = (
-            Replacement.objects
-            .filter(
-                absent_employee=user,
-                is_active=True,
-                start_date__lte=today,
-                end_date__gte=today,
-                replacement_employee__is_active=True,
-                replacement_employee__status=EmployeeStatus.WORKING
-            )
-            .order_by('-start_date')
-            .first()
-        )
-        if replacement:
-            return replacement.replacement_employee
-        if user.department and user.department.head:
-            head = user.department.head
-            if head.is_active and head.status == EmployeeStatus.WORKING and head.id != user.id:
-                return head
-        fallback = (
-            User.objects
-            .filter(
-                department=user.department,
-                is_active=True,
-                status=EmployeeStatus.WORKING
-            )
-            .exclude(id=user.id)
-            .order_by('last_name', 'first_name')
-            .first()
-        )
-        if fallback:
-            return fallback
-        return None
-    return user
+from documentflow.services.approvers import resolve_approver_map
+from documentflow.services.notifications import collect_notifications, notify
+from documentflow.services.route_state import sync_route_state
+
+
+BULK_BATCH_SIZE = 500
 
 
-def start_document_route(document, route_steps=None):
+def start_document_route(document, cycle=1, template=None, manual_route=None, approval_order=None, sender=None):
     """
-    Запуск маршрута согласования для документа
+    Запуск маршрута согласования для документа.
+
+    Все строки (согласующий, шаг, раунд) рассчитываются в памяти, очищаются
+    от дублей с учётом unique_together и записываются пакетами в одной
+    транзакции вместе с уведомлениями первого шага (одна вставка).
+    Возвращает список созданных согласований.
     """
+    approval_order = approval_order or document.approval_order or 'sequential'
+
     if document.delivery_mode == 'auto':
-        _start_auto_route(document)
+        if template is None:
+            template = (
+                DocumentRouteTemplate.objects
+                .filter(document_type=document.document_type, is_active=True)
+                .first()
+            )
+        if template is None:
+            return []
+        route_steps = _auto_route_steps(template)
+        exclude = document.author
     else:
-        _start_manual_route(document, route_steps or [])
-
-
-def _start_auto_route(document):
-    route = (
-        DocumentRouteTemplate.objects
-        .filter(
-            document_type=document.document_type,
-            is_active=True
+        if manual_route is None:
+            manual_route = document.manual_route or []
+        route_steps = _manual_route_steps(manual_route)
+        exclude = None
+
+    rows = _build_rows(route_steps, approval_order, exclude)
+
+    with transaction.atomic():
+        existing = set(
+            Approval.objects
+            .filter(document=document, cycle=cycle)
+            .values_list('approver_id', 'step')
         )
-        .prefetch_related('steps__user', 'steps__department')
-        .first()
+        approvals = [
+            Approval(
+                document=document,
+                approver=approver,
+                step=step,
+                cycle=cycle,
+                decision='pending',
+                is_required=True,
+            )
+            for (approver_id, step), approver in rows.items()
+            if (approver_id, step) not in existing
+        ]
+        Approval.objects.bulk_create(approvals, batch_size=BULK_BATCH_SIZE)
+
+        if approval_order == 'sequential' and approvals:
+            first_step = min(a.step for a in approvals)
+            recipients = [a for a in approvals if a.step == first_step]
+        else:
+            recipients = approvals
+        with collect_notifications():
+            for approval in recipients:
+                notify_new_document(document, approval.approver_id, sender)
+        sync_route_state(document)
+
+    return approvals
+
+
+def _auto_route_steps(template):
+    steps = list(template.steps.select_related('user').order_by('step_number'))
+    members = _department_members(
+        {step.department_id for step in steps if not step.user_id and step.department_id}
     )
 
-    if not route:
-        return
+    route_steps = []
+    for step in steps:
+        if step.user:
+            users = [step.user]
+        elif step.department_id:
+            users = members.get(step.department_id, [])
+        else:
+            users = []
+        route_steps.append((step.step_number, users))
+    return route_steps
+
+
+def _manual_route_steps(manual_route):
+    user_ids = {_item_id(item) for item in manual_route if item.get('type') == 'user'}
+    department_ids = {_item_id(item) for item in manual_route if item.get('type') == 'department'}
+    user_ids.discard(None)
+    department_ids.discard(None)
+
+    users = User.objects.filter(is_active=True).in_bulk(user_ids) if user_ids else {}
+    members = _department_members(department_ids)
+
+    route_steps = []
+    for step_number, item in enumerate(manual_route, start=1):
+        item_id = _item_id(item)
+        if item.get('type') == 'user':
+            route_steps.append((step_number, [users[item_id]] if item_id in users else []))
+        elif item.get('type') == 'department':
+            route_steps.append((step_number, members.get(item_id, [])))
+    return route_steps
+
+
+def _build_rows(route_steps, approval_order, exclude=None):
+    resolved = resolve_approver_map(
+        user for _, users in route_steps for user in users
+    )
 
-    steps = route.steps.order_by('step_number')
+    rows = {}
+    for step_number, users in route_steps:
+        step = step_number if approval_order == 'sequential' else 1
+        for user in users:
+            approver = resolved.get(user.id)
+            if approver is None:
+                continue
+            if exclude is not None and approver.id == exclude.id:
+                continue
+            rows.setdefault((approver.id, step), approver)
+    return rows
 
-    for step in steps:
-        _create_approvals_for_step(document, step)
 
+def _department_members(department_ids):
+    members = {}
+    if not department_ids:
+        return members
+    for user in User.objects.filter(department_id__in=department_ids, is_active=True):
+        members.setdefault(user.department_id, []).append(user)
+    return members
 
-def _start_manual_route(document, route_steps):
-    step_number = 1
 
-    for item in route_steps:
-        if item['type'] == 'user':
-            approver = _resolve_approver(User.objects.get(id=item['id']))
-            if not approver:
-                step_number += 1
-                continue
-            Approval.objects.create(
-                document=document,
-                approver=approver,
-                step=step_number,
-                cycle=1
-            )
+def _item_id(item):
+    try:
+        return int(item.get('id'))
+    except (TypeError, ValueError):
+        return None
 
-        elif item['type'] == 'department':
-            users = User.objects.filter(
-                department_id=item['id'],
-                is_active=True
-            )
-            resolved_users = [_resolve_approver(u) for u in users]
-            resolved_users = list({u.id: u for u in resolved_users}.values())
-            for user in resolved_users:
-                Approval.objects.create(
-                    document=document,
-                    approver=user,
-                    step=step_number,
-                    cycle=1
-                )
-
-        step_number += 1
-
-
-def _create_approvals_for_step(document, step):
-    if step.user:
-        approver = _resolve_approver(step.user)
-        if not approver:
-            return
-        Approval.objects.create(
-            document=document,
-            approver=approver,
-            step=step.step_number,
-            cycle=1
-        )
 
-    elif step.department:
-        users = User.objects.filter(
-            department=step.department,
-            is_active=True
-        )
-        resolved_users = [_resolve_approver(u) for u in users]
-        resolved_users = list({u.id: u for u in resolved_users}.values())
-        for user in resolved_users:
-            Approval.objects.create(
-                document=document,
-                approver=user,
-                step=step.step_number,
-                cycle=1
-            )
+def notify_new_document(document, user, sender=None):
+    return notify(
+        user,
+        'new_document',
+        title='Новый документ',
+        text=f'{document.registration_number} — {document.title}',
+        link=f'/documents/incoming/?open={document.id}',
+        document=document,
+        sender=sender
+    )
@@ -0,0 +1,141 @@
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from documentflow.models import (
+    Department,
+    EmployeeStatus,
+    Replacement,
+    User,
+)
+
+
+ABSENT_STATUSES = (
+    EmployeeStatus.VACATION,
+    EmployeeStatus.SICK,
+    EmployeeStatus.BUSINESS_TRIP,
+    EmployeeStatus.MATERNITY,
+    EmployeeStatus.IDLE,
+    EmployeeStatus.OTHER,
+    EmployeeStatus.DISMISSED,
+)
+
+
+def resolve_approver_map(users, today=None):
+    """
+    Подбор согласующих для набора сотрудников.
+
+    Возвращает словарь {id сотрудника: согласующий или None}. Отсутствующего
+    сотрудника заменяет активная замена, затем руководитель отдела, затем
+    первый по алфавиту работающий сотрудник отдела. Независимо от размера
+    набора выполняется не более трёх запросов.
+    """
+    users = {u.id: u for u in users if u is not None}
+    result = {}
+    absent = {}
+    for user_id, user in users.items():
+        if user.status in ABSENT_STATUSES:
+            absent[user_id] = user
+        else:
+            result[user_id] = user
+
+    if not absent:
+        return result
+
+    today = today or timezone.localdate()
+    replacements = (
+        Replacement.objects
+        .filter(
+            absent_employee_id__in=list(absent),
+            is_active=True,
+            start_date__lte=today,
+            end_date__gte=today,
+            replacement_employee__is_active=True,
+            replacement_employee__status=EmployeeStatus.WORKING
+        )
+        .select_related('replacement_employee')
+        .order_by('absent_employee_id', '-start_date')
+    )
+    for replacement in replacements:
+        result.setdefault(replacement.absent_employee_id, replacement.replacement_employee)
+
+    remaining = [u for user_id, u in absent.items() if user_id not in result]
+    if not remaining:
+        return result
+
+    department_ids = {u.department_id for u in remaining}
+    heads = {
+        department.id: department.head
+        for department in (
+            Department.objects
+            .filter(id__in=department_ids, head__isnull=False)
+            .select_related('head')
+        )
+    }
+    unresolved = []
+    for user in remaining:
+        head = heads.get(user.department_id)
+        if head and head.is_active and head.status == EmployeeStatus.WORKING and head.id != user.id:
+            result[user.id] = head
+        else:
+            unresolved.append(user)
+
+    if not unresolved:
+        return result
+
+    # Двух первых по алфавиту сотрудников отдела достаточно: один из них
+    # может оказаться самим отсутствующим.
+    # department_id__in не находит NULL, сотрудников без отдела ищем отдельно
+    department_ids = {u.department_id for u in unresolved}
+    same_department = Q(department_id__in=department_ids - {None})
+    if None in department_ids:
+        same_department |= Q(department__isnull=True)
+    candidates = {}
+    fallback_qs = (
+        User.objects
+        .filter(same_department, is_active=True, status=EmployeeStatus.WORKING)
+        .annotate(
+            department_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('department_id')],
+                order_by=[F('last_name').asc(), F('first_name').asc(), F('id').asc()],
+            )
+        )
+        .filter(department_rank__lte=2)
+        .order_by('department_id', 'department_rank')
+    )
+    for candidate in fallback_qs:
+        candidates.setdefault(candidate.department_id, []).append(candidate)
+
+    for user in unresolved:
+        result[user.id] = next(
+            (c for c in candidates.get(user.department_id, []) if c.id != user.id),
+            None
+        )
+    return result
+
+
+def resolve_approvers(users, exclude=None, today=None):
+    """
+    Список согласующих для набора сотрудников без повторов и пустых значений.
+    Порядок соответствует исходному набору; exclude — сотрудник, которого
+    нужно исключить из результата (например, автор документа).
+    """
+    users = [u for u in users if u is not None]
+    mapping = resolve_approver_map(users, today=today)
+    resolved = {}
+    for user in users:
+        approver = mapping.get(user.id)
+        if approver is None:
+            continue
+        if exclude is not None and approver.id == exclude.id:
+            continue
+        resolved.setdefault(approver.id, approver)
+    return list(resolved.values())
+
+
+def resolve_approver(user, today=None):
+    """Согласующий для одного сотрудника (сам сотрудник или его замена)."""
+    if user is None:
+        return None
+    return resolve_approver_map([user], today=today).get(user.id)
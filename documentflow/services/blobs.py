@@ -0,0 +1,254 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from documentflow.models import DocumentFile, DocumentVersion, StoredBlob
+from documentflow.previews import THUMBNAIL_SUFFIX, thumbnail_name
+from documentflow.storage import BLOB_PREFIX, STAGING_DIR, blob_extension, blob_name, hash_path
+
+
+BULK_BATCH_SIZE = 500
+DEFAULT_WORKERS = 4
+# Файл без ссылок удаляется не сразу: его могла только что переиспользовать загрузка
+SWEEP_GRACE = timezone.timedelta(hours=1)
+
+
+def file_storage():
+    return DocumentFile._meta.get_field('file').storage
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/') and not name.startswith(f'{STAGING_DIR}/')
+
+
+def reserve_blob(name, sha256, size):
+    """
+    Создаёт или блокирует строку файла хранилища до конца транзакции перед
+    переносом содержимого на место. Если строку в это время удалял
+    sweep_blobs, UPDATE дождётся его фиксации и строка создаётся заново.
+    """
+    while True:
+        blob, created = StoredBlob.objects.get_or_create(name=name, defaults={'sha256': sha256, 'size': size})
+        if created or StoredBlob.objects.filter(pk=blob.pk).update(updated_at=timezone.now()):
+            return blob
+
+
+def add_blob_ref(name):
+    """Учитывает новую ссылку на файл хранилища; старые имена не учитываются."""
+    if not is_blob(name):
+        return
+    while True:
+        blob, _ = StoredBlob.objects.get_or_create(name=name, defaults=_blob_defaults(name))
+        if StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, updated_at=timezone.now()):
+            return
+
+
+def release_blob_ref(name):
+    """Снимает ссылку. Сам файл удаляет sweep_blobs, когда ссылок не осталось."""
+    if not is_blob(name):
+        return
+    StoredBlob.objects.filter(name=name, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1, updated_at=timezone.now()
+    )
+
+
+def recount_blob_refs(names):
+    """Пересчитывает ссылки на указанные файлы по таблицам файлов и версий."""
+    names = [name for name in set(names) if is_blob(name)]
+    for start in range(0, len(names), BULK_BATCH_SIZE):
+        chunk = names[start:start + BULK_BATCH_SIZE]
+        counts = dict.fromkeys(chunk, 0)
+        for model in (DocumentFile, DocumentVersion):
+            for row in model.objects.filter(file__in=chunk).values('file').annotate(refs=Count('id')):
+                counts[row['file']] += row['refs']
+        existing = set(StoredBlob.objects.filter(name__in=chunk).values_list('name', flat=True))
+        StoredBlob.objects.bulk_create(
+            [StoredBlob(name=name, **_blob_defaults(name)) for name in chunk if name not in existing],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        now = timezone.now()
+        for name, refs in counts.items():
+            StoredBlob.objects.filter(name=name).update(ref_count=refs, updated_at=now)
+
+
+def sweep_blobs(grace=SWEEP_GRACE, batch_size=BULK_BATCH_SIZE, stdout=None):
+    """
+    Удаляет файлы хранилища без ссылок, не менявшиеся дольше grace,
+    и брошенные временные файлы загрузок. Возвращает число удалённых файлов.
+
+    Строки удаляемых файлов заблокированы до фиксации: commit_staged
+    блокирует ту же строку перед тем, как положиться на файл, поэтому
+    файл, на который как раз записывается ссылка, не удаляется.
+    Файлы без строки StoredBlob (например, после отката транзакции
+    загрузки) сначала учитываются, а удаляются следующим проходом.
+    """
+    storage = file_storage()
+    cutoff = timezone.now() - grace
+    removed = 0
+    registered = register_orphan_blobs(cutoff, batch_size)
+    if stdout is not None and registered:
+        stdout.write(f'Учтено файлов без записи StoredBlob: {registered}')
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            blobs = list(
+                StoredBlob.objects.select_for_update(skip_locked=True)
+                .filter(id__gt=last_id, ref_count=0, updated_at__lt=cutoff)
+                .order_by('id')[:batch_size]
+            )
+            if not blobs:
+                break
+            last_id = blobs[-1].id
+            # Совпавшее содержимое обновляет время файла при загрузке (commit_staged)
+            expired = [blob for blob in blobs if not _touched_since(storage, blob.name, cutoff)]
+            for blob in expired:
+                storage.delete(blob.name)
+                storage.delete(thumbnail_name(blob.name))
+            StoredBlob.objects.filter(id__in=[blob.id for blob in expired]).delete()
+            removed += len(expired)
+        if stdout is not None:
+            stdout.write(f'Обработано до id={last_id}: удалено файлов {removed}')
+
+    try:
+        _, staged = storage.listdir(STAGING_DIR)
+    except FileNotFoundError:
+        staged = []
+    for name in staged:
+        if not _touched_since(storage, f'{STAGING_DIR}/{name}', cutoff):
+            storage.delete(f'{STAGING_DIR}/{name}')
+            removed += 1
+    return removed
+
+
+def register_orphan_blobs(cutoff, batch_size=BULK_BATCH_SIZE):
+    """
+    Находит в хранилище файлы без строки StoredBlob, не менявшиеся с cutoff,
+    и заводит им строки с числом ссылок по таблицам файлов и версий.
+    Возвращает число учтённых файлов.
+    """
+    storage = file_storage()
+    registered = 0
+    chunk = []
+    for name in _iter_blob_names(storage):
+        chunk.append(name)
+        if len(chunk) >= batch_size:
+            registered += _register_orphans(storage, chunk, cutoff)
+            chunk = []
+    if chunk:
+        registered += _register_orphans(storage, chunk, cutoff)
+    return registered
+
+
+def _register_orphans(storage, names, cutoff):
+    known = set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+    orphans = [name for name in names if name not in known and not _touched_since(storage, name, cutoff)]
+    recount_blob_refs(orphans)
+    return len(orphans)
+
+
+def _iter_blob_names(storage):
+    """Имена вида blobs/ab/cd/<sha256><расширение>, без миниатюр и временных файлов."""
+    try:
+        first_level, _ = storage.listdir(BLOB_PREFIX)
+    except FileNotFoundError:
+        return
+    for first in sorted(first_level):
+        if len(first) != 2:
+            continue
+        second_level, _ = storage.listdir(f'{BLOB_PREFIX}/{first}')
+        for second in sorted(second_level):
+            _, files = storage.listdir(f'{BLOB_PREFIX}/{first}/{second}')
+            for file_name in sorted(files):
+                if not file_name.endswith(THUMBNAIL_SUFFIX):
+                    yield f'{BLOB_PREFIX}/{first}/{second}/{file_name}'
+
+
+def migrate_legacy_files(workers=DEFAULT_WORKERS, batch_size=BULK_BATCH_SIZE, dry_run=False, stdout=None):
+    """
+    Переносит файлы со старыми именами (documents/...) в хранилище по
+    содержимому. Хэши пакета считаются параллельно в workers процессах,
+    файл в новое место переносится жёсткой ссылкой (копией, если ссылки
+    не поддерживаются), затем строки файлов и версий переключаются на
+    новое имя, а старый файл удаляется после фиксации транзакции.
+    Повторный запуск продолжает с необработанных файлов.
+    """
+    storage = file_storage()
+    result = {'files': 0, 'duplicates': 0, 'missing': 0, 'bytes_saved': 0}
+    seen, processed = set(), set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for model in (DocumentFile, DocumentVersion):
+            last_id = 0
+            while True:
+                rows = list(
+                    model.objects.filter(id__gt=last_id)
+                    .exclude(file='')
+                    .exclude(file__startswith=f'{BLOB_PREFIX}/')
+                    .order_by('id')
+                    .values_list('id', 'file')[:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                # Версия обычно ссылается на тот же файл, что и запись о файле
+                names = sorted({name for _, name in rows} - processed)
+                processed.update(names)
+                digests = executor.map(hash_path, [storage.path(name) for name in names])
+                for name, (sha256, size) in zip(names, digests):
+                    if sha256 is None:
+                        result['missing'] += 1
+                        continue
+                    target = blob_name(sha256, blob_extension(name))
+                    if target in seen or storage.exists(target):
+                        result['duplicates'] += 1
+                        result['bytes_saved'] += size
+                    seen.add(target)
+                    if not dry_run:
+                        _move_to_blob(storage, name, target, sha256)
+                    result['files'] += 1
+                if stdout is not None:
+                    stdout.write(
+                        f'{model._meta.verbose_name_plural}: обработано до id={last_id}, '
+                        f'файлов {result["files"]}, повторов {result["duplicates"]}'
+                    )
+    return result
+
+
+def _move_to_blob(storage, name, target, sha256):
+    source_path = storage.path(name)
+    target_path = storage.path(target)
+    if not os.path.exists(target_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        try:
+            os.link(source_path, target_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(source_path, target_path)
+    with transaction.atomic():
+        DocumentFile.objects.filter(file=name).update(file=target)
+        DocumentFile.objects.filter(file=target, sha256='').update(sha256=sha256)
+        DocumentVersion.objects.filter(file=name).update(file=target)
+        recount_blob_refs([target])
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def _blob_defaults(name):
+    storage = file_storage()
+    sha256 = os.path.splitext(os.path.basename(name))[0]
+    try:
+        size = storage.size(name)
+    except OSError:
+        size = 0
+    return {'sha256': sha256, 'size': size}
+
+
+def _touched_since(storage, name, cutoff):
+    try:
+        return os.path.getmtime(storage.path(name)) >= cutoff.timestamp()
+    except FileNotFoundError:
+        return False
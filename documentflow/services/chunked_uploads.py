@@ -0,0 +1,304 @@
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from documentflow.models import DocumentFile, UploadSession
+from documentflow.storage import BLOB_PREFIX, HASH_CHUNK_SIZE, hash_path
+from documentflow.uploads import (
+    StreamedUpload, file_type_for, file_type_for_mime, sniff_mime, size_limit_error, upload_limit
+)
+
+
+BULK_BATCH_SIZE = 500
+SESSION_DIR = f'{BLOB_PREFIX}/uploads'
+READ_SIZE = 64 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_SESSION_TTL_HOURS = 24
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """Ошибка приёма части файла; status — HTTP-статус ответа."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def file_storage():
+    return DocumentFile._meta.get_field('file').storage
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', DEFAULT_MAX_CHUNK_SIZE)
+
+
+def session_ttl():
+    return timezone.timedelta(hours=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', DEFAULT_SESSION_TTL_HOURS))
+
+
+def start_upload(user, file_name, size, sha256=''):
+    """
+    Открывает сессию загрузки: проверяет лимит по объявленному размеру
+    и создаёт пустой файл, в который будут дописываться части.
+    """
+    storage = file_storage()
+    if not hasattr(storage, 'commit_staged'):
+        raise UploadError('Хранилище файлов не поддерживает загрузку частями', status=501)
+    sha256 = (sha256 or '').lower()
+    if sha256 and not SHA256_RE.match(sha256):
+        raise UploadError('Некорректная контрольная сумма SHA-256')
+    if size < 0:
+        raise UploadError('Некорректный размер файла')
+    file_type = file_type_for(file_name)
+    limit = upload_limit(file_type)
+    if size > limit:
+        raise UploadError(size_limit_error(file_name, limit), status=413)
+
+    session = UploadSession(
+        user=user,
+        file_name=os.path.basename(file_name)[:255],
+        size=size,
+        file_type=file_type,
+        expected_sha256=sha256,
+    )
+    session.stored_name = f'{SESSION_DIR}/{session.id.hex}'
+    path = storage.path(session.stored_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'xb').close()
+    session.save()
+    return session
+
+
+def parse_content_range(header, size):
+    """(начало, конец включительно) из заголовка Content-Range: bytes 0-1023/4096."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Нужен заголовок Content-Range: bytes <начало>-<конец>/<размер>')
+    start, end, total = (int(value) for value in match.groups())
+    if total != size or start > end or end >= size:
+        raise UploadError('Диапазон не соответствует размеру файла', status=416)
+    return start, end
+
+
+def write_chunk(session_id, user, start, end, stream):
+    """
+    Дописывает часть [start, end] из потока запроса в файл сессии.
+
+    Части принимаются строго по порядку: начало должно совпадать с уже
+    полученным объёмом, иначе клиент получает 409 и текущее смещение.
+    Часть сначала целиком принимается во временный файл без блокировок:
+    медленный клиент не держит соединение с БД и строку сессии. Затем
+    строка блокируется только на проверку смещения, дописывание с диска
+    и сдвиг смещения. Оборванная на середине часть отбрасывается.
+    """
+    length = end - start + 1
+    if length > max_chunk_size():
+        raise UploadError('Часть файла больше допустимого размера', status=413)
+    storage = file_storage()
+    _check_offset(UploadSession.objects.filter(pk=session_id, user=user).first(), start)
+
+    staged = storage.path(storage.staging_name())
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    try:
+        written = 0
+        with open(staged, 'wb') as destination:
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                destination.write(data)
+                written += len(data)
+        if written != length:
+            raise UploadError('Часть файла получена не полностью')
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().filter(pk=session_id, user=user).first()
+            # Пока часть принималась, смещение мог сдвинуть параллельный запрос
+            _check_offset(session, start)
+            with open(staged, 'rb') as source, open(storage.path(session.stored_name), 'r+b') as destination:
+                destination.seek(start)
+                for data in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                    destination.write(data)
+                destination.truncate(start + length)
+            session.received = start + length
+            session.save(update_fields=['received', 'updated_at'])
+    finally:
+        try:
+            os.remove(staged)
+        except FileNotFoundError:
+            pass
+    return session
+
+
+def finish_upload(session_id, user):
+    """
+    Завершает загрузку: проверяет полноту, SHA-256 и тип содержимого.
+    При несовпадении контрольной суммы загрузка начинается заново.
+    """
+    session = _finish_upload(session_id, user)
+    if session is None:
+        raise UploadError('Контрольная сумма не совпала, загрузите файл заново', status=422)
+    return session
+
+
+@transaction.atomic
+def _finish_upload(session_id, user):
+    storage = file_storage()
+    session = UploadSession.objects.select_for_update().filter(pk=session_id, user=user).first()
+    if session is None:
+        raise UploadError('Загрузка не найдена', status=404)
+    if session.status == 'complete':
+        return session
+    if session.received != session.size:
+        raise UploadError(f'Получено {session.received} из {session.size} байт', status=409)
+
+    path = storage.path(session.stored_name)
+    sha256, size = hash_path(path)
+    if size != session.size:
+        raise UploadError('Файл загрузки повреждён, начните загрузку заново', status=409)
+    if session.expected_sha256 and sha256 != session.expected_sha256:
+        # Повреждённый файл отбрасывается, сессия открыта для повторной загрузки
+        _restart(session, path)
+        return None
+
+    with open(path, 'rb') as source:
+        mime_type = sniff_mime(source.read(HASH_CHUNK_SIZE), session.file_name)
+    limit = min(upload_limit(session.file_type), upload_limit(file_type_for_mime(mime_type)))
+    if session.size > limit:
+        raise UploadError(size_limit_error(session.file_name, limit), status=413)
+
+    session.sha256 = sha256
+    session.mime_type = mime_type
+    session.status = 'complete'
+    session.save(update_fields=['sha256', 'mime_type', 'status', 'updated_at'])
+    return session
+
+
+def requested_uploads(data):
+    """Идентификаторы завершённых загрузок из поля uploads запроса."""
+    if hasattr(data, 'getlist'):
+        values = data.getlist('uploads')
+    else:
+        values = data.get('uploads') or []
+    if isinstance(values, str):
+        values = [values]
+    ids = []
+    for value in values:
+        try:
+            ids.append(str(uuid.UUID(str(value))))
+        except ValueError:
+            # Такой загрузки заведомо нет, upload_session_errors сообщит об этом
+            ids.append(str(value))
+    return ids
+
+
+def upload_session_errors(user, session_ids):
+    """Ошибки для загрузок, которые нельзя прикрепить к документу."""
+    if not session_ids:
+        return []
+    ready = {
+        str(pk) for pk in UploadSession.objects.filter(
+            pk__in=_valid_ids(session_ids), user=user, status='complete'
+        ).values_list('pk', flat=True)
+    }
+    return [f'Загрузка {pk} не найдена или не завершена' for pk in session_ids if pk not in ready]
+
+
+def claim_uploads(user, session_ids):
+    """
+    Забирает завершённые загрузки для прикрепления в текущей транзакции:
+    сессии удаляются, их файлы возвращаются как StreamedUpload и
+    переносятся на место в attach_files без копирования.
+    """
+    if not session_ids:
+        return []
+    storage = file_storage()
+    sessions = list(
+        UploadSession.objects.select_for_update()
+        .filter(pk__in=_valid_ids(session_ids), user=user, status='complete')
+        .order_by('created_at')
+    )
+    UploadSession.objects.filter(pk__in=[session.pk for session in sessions]).delete()
+    return [
+        StreamedUpload(
+            storage,
+            session.stored_name,
+            session.file_name,
+            session.size,
+            session.mime_type,
+            session.sha256,
+            session.file_type,
+        )
+        for session in sessions
+    ]
+
+
+def purge_upload_sessions(ttl=None, batch_size=BULK_BATCH_SIZE, stdout=None):
+    """Удаляет загрузки без активности дольше ttl вместе с их файлами."""
+    storage = file_storage()
+    cutoff = timezone.now() - (ttl or session_ttl())
+    removed = 0
+    while True:
+        with transaction.atomic():
+            sessions = list(
+                UploadSession.objects.select_for_update(skip_locked=True)
+                .filter(updated_at__lt=cutoff)
+                .order_by('updated_at')[:batch_size]
+            )
+            if not sessions:
+                break
+            UploadSession.objects.filter(pk__in=[session.pk for session in sessions]).delete()
+            names = [session.stored_name for session in sessions]
+            transaction.on_commit(lambda names=names: [storage.delete(name) for name in names])
+        removed += len(sessions)
+        if stdout is not None:
+            stdout.write(f'Удалено загрузок: {removed}')
+    return removed
+
+
+def upload_payload(session):
+    data = {
+        'id': str(session.id),
+        'file_name': session.file_name,
+        'size': session.size,
+        'offset': session.received,
+        'status': session.status,
+        'upload_url': f'/api/uploads/{session.id}/',
+        'complete_url': f'/api/uploads/{session.id}/complete/',
+    }
+    if session.status == 'complete':
+        data['sha256'] = session.sha256
+    return data
+
+
+def _valid_ids(session_ids):
+    valid = []
+    for value in session_ids:
+        try:
+            valid.append(uuid.UUID(value))
+        except ValueError:
+            pass
+    return valid
+
+
+def _restart(session, path):
+    with open(path, 'r+b') as destination:
+        destination.truncate(0)
+    session.received = 0
+    session.save(update_fields=['received', 'updated_at'])
+
+
+def _check_offset(session, start):
+    if session is None:
+        raise UploadError('Загрузка не найдена', status=404)
+    if session.status != 'open':
+        raise UploadError('Загрузка уже завершена', status=409)
+    if start != session.received:
+        raise UploadError(f'Ожидается часть со смещения {session.received}', status=409)
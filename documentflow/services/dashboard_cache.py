@@ -0,0 +1,60 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+DEFAULT_TIMEOUT = 300
+
+# Кэш счётчиков рассчитан на общий бэкенд (Redis, Memcached): с locmem
+# у каждого процесса своя копия, и сброс не доходит до остальных воркеров.
+
+
+def dashboard_version_key(user_id):
+    return f'documentflow:dashboard:version:{user_id}'
+
+
+def dashboard_cache_key(user_id, version):
+    return f'documentflow:dashboard:{user_id}:{version}'
+
+
+def dashboard_version(user_id):
+    """
+    Текущая версия счётчиков сотрудника. Читается до расчёта: если сброс
+    произойдёт во время расчёта, результат запишется под старой версией
+    и больше не будет прочитан.
+    """
+    key = dashboard_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_cached_summary(user_id, today, version):
+    """Счётчики кабинета из кэша, если они посчитаны за этот же день."""
+    cached = cache.get(dashboard_cache_key(user_id, version))
+    if cached is None or cached.get('day') != today.isoformat():
+        return None
+    return cached['summary']
+
+
+def set_cached_summary(user_id, today, version, summary):
+    cache.set(
+        dashboard_cache_key(user_id, version),
+        {'day': today.isoformat(), 'summary': summary},
+        getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+    )
+
+
+def invalidate_dashboard(user_ids):
+    """
+    Сбрасывает кэш счётчиков указанных сотрудников после фиксации
+    транзакции: версия меняется, и значения, посчитанные до фиксации
+    (в том числе записанные параллельным запросом позже), не читаются.
+    """
+    keys = [dashboard_version_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.utils import timezone
+
+from documentflow.models import ArchivedNotification, InboxEntry, Notification
+from documentflow.services.notifications import build_notification, write_notifications
+
+
+BULK_BATCH_SIZE = 500
+DEADLINE_NOTICE_DAYS = 3
+
+
+def scan_deadlines(days=DEADLINE_NOTICE_DAYS, today=None, batch_size=BULK_BATCH_SIZE, after_id=0, stdout=None):
+    """
+    Создаёт недостающие уведомления о сроке для документов, ожидающих
+    действия сотрудника, со сроком не позднее today + days.
+
+    Строки входящих обходятся пакетами по возрастанию id, поэтому
+    прерванный проход можно продолжить с after_id. Повторный запуск
+    ничего не дублирует: уже отправленные уведомления (включая архивные)
+    отсекаются запросами на пакет и уникальным ограничением
+    unique_deadline_notification.
+    Возвращает число действительно вставленных уведомлений.
+    """
+    today = today or timezone.localdate()
+    due = today + timezone.timedelta(days=days)
+    entries = (
+        InboxEntry.objects
+        .filter(is_actionable=True, is_archived=False, deadline__isnull=False, deadline__lte=due)
+        .select_related('document')
+        .only('id', 'user_id', 'document__id', 'document__registration_number', 'document__deadline')
+        .order_by('id')
+    )
+
+    last_id = after_id
+    created = 0
+    while True:
+        with transaction.atomic():
+            # Строки пакета блокируются: параллельный проход дождётся фиксации
+            # и увидит уже созданные уведомления
+            batch = list(entries.select_for_update(of=('self',)).filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            # Уведомления, перенесённые политикой хранения в архив, тоже считаются отправленными
+            notified = set()
+            for model in (Notification, ArchivedNotification):
+                notified.update(_deadline_pairs(model, batch))
+            pending = [entry for entry in batch if (entry.user_id, entry.document_id) not in notified]
+            if pending:
+                # Запись сразу, в транзакции пакета: параллельный проход после
+                # снятия блокировки уже видит эти уведомления
+                write_notifications([_deadline_notification(entry) for entry in pending])
+                # Вставка идёт с ignore_conflicts, поэтому считаем строки, которые
+                # действительно появились, а не отправленные на запись
+                wanted = {(entry.user_id, entry.document_id) for entry in pending}
+                created += len(wanted & set(_deadline_pairs(Notification, pending)))
+
+        if stdout is not None:
+            stdout.write(f'Обработано до id={last_id}: создано уведомлений {created}')
+    return created
+
+
+def _deadline_pairs(model, entries):
+    """Пары (сотрудник, документ), по которым уже есть уведомление о сроке."""
+    return (
+        model.objects
+        .filter(
+            notification_type='deadline',
+            document_id__in={entry.document_id for entry in entries},
+            user_id__in={entry.user_id for entry in entries},
+        )
+        .values_list('user_id', 'document_id')
+    )
+
+
+def _deadline_notification(entry):
+    doc = entry.document
+    return build_notification(
+        entry.user_id,
+        'deadline',
+        title='Срок исполнения',
+        text=f'{doc.registration_number} — срок до {doc.deadline.strftime("%d.%m.%Y")}',
+        link=f'/documents/incoming/?open={doc.id}',
+        document=doc
+    )
@@ -0,0 +1,69 @@
+import hashlib
+
+from django.db import transaction
+
+from documentflow.models import DocumentFile, DocumentVersion
+from documentflow.services.file_previews import start_previews
+from documentflow.storage import blob_extension
+from documentflow.uploads import StreamedUpload, sniff_mime
+
+
+def attach_files(document, files, user):
+    """
+    Прикрепляет загруженные файлы к документу новой версией каждый.
+    Файлы потоковой загрузки уже лежат в хранилище и не копируются,
+    для остальных хэш и MIME-тип считаются по содержимому.
+    """
+    attached = []
+    for upload in files:
+        if isinstance(upload, StreamedUpload):
+            stored_name = upload.stored_name
+            if hasattr(upload.storage, 'commit_staged'):
+                # Хэш уже посчитан при приёме: файл переносится на место без перечитывания
+                upload.close()
+                stored_name = upload.storage.commit_staged(
+                    upload.stored_name, upload.sha256, blob_extension(upload.name)
+                )
+                upload.stored_name = stored_name
+                upload.attached = True
+            doc_file = DocumentFile.objects.create(
+                document=document,
+                file=stored_name,
+                file_name=upload.name,
+                file_size=upload.size,
+                file_type=upload.file_type,
+                mime_type=upload.content_type,
+                sha256=upload.sha256,
+                uploaded_by=user,
+            )
+            if not upload.attached:
+                # При откате транзакции файл останется непривязанным и будет удалён
+                transaction.on_commit(lambda upload=upload: setattr(upload, 'attached', True))
+        else:
+            mime_type, sha256 = _digest(upload)
+            doc_file = DocumentFile.objects.create(
+                document=document,
+                file=upload,
+                mime_type=mime_type,
+                sha256=sha256,
+                uploaded_by=user,
+            )
+        DocumentVersion.objects.create(
+            document=document,
+            file=doc_file.file,
+            created_by=user,
+        )
+        attached.append(doc_file)
+    start_previews(attached)
+    return attached
+
+
+def _digest(upload):
+    digest = hashlib.sha256()
+    mime_type = ''
+    for chunk in upload.chunks():
+        if not mime_type:
+            mime_type = sniff_mime(chunk, upload.name)
+        digest.update(chunk)
+    upload.seek(0)
+    return mime_type, digest.hexdigest()
@@ -0,0 +1,77 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from django.template import engines
+from django.utils.html import strip_tags
+
+from documentflow.services.outbox import enqueue_email, enqueue_emails
+
+
+# Письма системы: имя -> (тема, HTML-шаблон)
+EMAIL_TEMPLATES = {
+    'email_change_code': ('Подтверждение смены email', 'emails/email_change_code.html'),
+    'account_access': ('Доступ в DocumentFlow', 'emails/account_access.html'),
+}
+
+RenderedEmail = namedtuple('RenderedEmail', ['subject', 'html', 'text'])
+CompiledEmail = namedtuple('CompiledEmail', ['subject', 'html', 'text'])
+
+
+@lru_cache(maxsize=None)
+def compiled_email(name):
+    """
+    Скомпилированные шаблоны письма. Загружаются один раз на процесс:
+    HTML-шаблон и текстовая версия, полученная из его исходника удалением
+    разметки (а не из каждого отрендеренного письма).
+    """
+    subject, template_name = EMAIL_TEMPLATES[name]
+    engine = engines['django']
+    html = engine.get_template(template_name)
+    text_source = _plain_text(strip_tags(html.template.source))
+    text = engine.from_string('{% autoescape off %}' + text_source + '{% endautoescape %}')
+    return CompiledEmail(subject, html, text)
+
+
+def render_email(name, context):
+    """Тема, HTML и текст письма по имени из EMAIL_TEMPLATES."""
+    compiled = compiled_email(name)
+    return RenderedEmail(compiled.subject, compiled.html.render(context), compiled.text.render(context))
+
+
+def render_emails(name, contexts):
+    """Пакетный рендер одного письма для многих получателей."""
+    compiled = compiled_email(name)
+    return [
+        RenderedEmail(compiled.subject, compiled.html.render(context), compiled.text.render(context))
+        for context in contexts
+    ]
+
+
+def send_template_email(to, name, context):
+    """Рендерит письмо и ставит его в очередь исходящих."""
+    rendered = render_email(name, context)
+    return enqueue_email(to, rendered.subject, rendered.html, body=rendered.text)
+
+
+def send_template_emails(name, recipients):
+    """
+    Массовая рассылка: recipients — пары (адрес, контекст).
+    Все письма рендерятся по одним скомпилированным шаблонам
+    и ставятся в очередь одной вставкой.
+    """
+    recipients = list(recipients)
+    rendered = render_emails(name, [context for _, context in recipients])
+    return enqueue_emails([
+        (to, email.subject, email.html, email.text)
+        for (to, _), email in zip(recipients, rendered)
+    ])
+
+
+def _plain_text(source):
+    # Отступы вёрстки убираются, от пустых строк остаётся по одной
+    lines = []
+    for line in source.splitlines():
+        line = line.strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip() + '\n'
@@ -0,0 +1,65 @@
+import os
+import zipfile
+
+from django.utils import timezone
+
+from documentflow.zipstream import ZipStream, write_file, zip_entry
+
+
+def bundle_entries(document, include_versions=False):
+    """
+    Файлы документа для архива: (имя в архиве, файл, дата).
+    Версии кладутся в папку versions/ с номером версии в имени.
+    """
+    files = list(document.files.order_by('uploaded_at', 'id'))
+    names_by_file = {doc_file.file.name: _safe_name(doc_file.file_name or doc_file.file.name) for doc_file in files}
+    used = set()
+    entries = []
+    for doc_file in files:
+        if doc_file.file:
+            name = _unique_name(f'files/{_safe_name(doc_file.file_name or doc_file.file.name)}', used)
+            entries.append((name, doc_file.file, doc_file.uploaded_at))
+    if include_versions:
+        for version in document.versions.order_by('version', 'id'):
+            if version.file:
+                base = names_by_file.get(version.file.name) or _safe_name(version.file.name)
+                name = _unique_name(f'versions/v{version.version}_{base}', used)
+                entries.append((name, version.file, version.created_at))
+    return entries
+
+
+def iter_files_zip(entries):
+    """
+    Генератор ZIP-архива из файлов документа. Каждый файл читается
+    порциями и сразу уходит клиенту, так что память не зависит от
+    размера архива. Отсутствующие на диске файлы пропускаются.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, field_file, created_at in entries:
+            storage = field_file.storage
+            try:
+                size = storage.size(field_file.name)
+                source = storage.open(field_file.name, 'rb')
+            except OSError:
+                continue
+            entry = zip_entry(name, timezone.localtime(created_at).timetuple()[:6], size=size)
+            with source:
+                yield from write_file(stream, archive, entry, source)
+            yield stream.pop()
+    yield stream.pop()
+
+
+def _safe_name(name):
+    name = os.path.basename(name.replace('\\', '/')).strip()
+    return name or 'file'
+
+
+def _unique_name(name, used):
+    base, extension = os.path.splitext(name)
+    candidate, number = name, 1
+    while candidate.lower() in used:
+        number += 1
+        candidate = f'{base} ({number}){extension}'
+    used.add(candidate.lower())
+    return candidate
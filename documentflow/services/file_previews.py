@@ -0,0 +1,151 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from documentflow.models import DocumentFile
+from documentflow.previews import preview_kind, render_preview, thumbnail_name
+from documentflow.services.search import reindex_document
+
+
+BULK_BATCH_SIZE = 500
+DEFAULT_WORKERS = 2
+
+
+def start_previews(doc_files):
+    """
+    Ставит построение превью загруженных файлов в фоновую очередь после
+    фиксации транзакции. Файлы без поддерживаемого превью помечаются сразу.
+    """
+    queued = []
+    for doc_file in doc_files:
+        if preview_kind(doc_file.file_name, doc_file.mime_type) is None:
+            DocumentFile.objects.filter(id=doc_file.id).update(preview_status='none')
+            doc_file.preview_status = 'none'
+        else:
+            queued.append(doc_file.id)
+    if queued:
+        transaction.on_commit(lambda: [_executor().submit(_build_in_background, file_id) for file_id in queued])
+
+
+def build_preview(file_id):
+    """Строит превью одного файла в пуле процессов и сохраняет результат."""
+    doc_file = DocumentFile.objects.filter(id=file_id, preview_status='pending').first()
+    if doc_file is None or _reuse_ready(doc_file):
+        return
+    job = _preview_job(doc_file)
+    if job is None:
+        return
+    future = _process_pool().submit(render_preview, *job)
+    _store_result(doc_file, job, future)
+
+
+def build_pending_previews(batch_size=BULK_BATCH_SIZE, stdout=None):
+    """
+    Строит превью для файлов в очереди, например загруженных до
+    появления превью или оставшихся после перезапуска сервера.
+    Файлы пакета обрабатываются параллельно всеми процессами пула.
+    """
+    built = 0
+    last_id = 0
+    while True:
+        doc_files = list(
+            DocumentFile.objects.filter(id__gt=last_id, preview_status='pending')
+            .order_by('id')[:batch_size]
+        )
+        if not doc_files:
+            break
+        last_id = doc_files[-1].id
+        futures = {}
+        for doc_file in doc_files:
+            if _reuse_ready(doc_file):
+                continue
+            job = _preview_job(doc_file)
+            if job is not None:
+                futures[_process_pool().submit(render_preview, *job)] = (doc_file, job)
+        for future in as_completed(futures):
+            doc_file, job = futures[future]
+            _store_result(doc_file, job, future)
+            built += 1
+        if stdout is not None:
+            stdout.write(f'Обработано до id={last_id}: построено превью {built}')
+    return built
+
+
+def _preview_job(doc_file):
+    kind = preview_kind(doc_file.file_name, doc_file.mime_type)
+    if kind is None or not doc_file.file:
+        DocumentFile.objects.filter(id=doc_file.id).update(preview_status='none')
+        return None
+    storage = doc_file.file.storage
+    target = thumbnail_name(doc_file.file.name) if kind == 'thumbnail' else None
+    return kind, storage.path(doc_file.file.name), storage.path(target) if target else None
+
+
+def _store_result(doc_file, job, future):
+    kind = job[0]
+    try:
+        result = future.result()
+    except Exception:
+        DocumentFile.objects.filter(id=doc_file.id).update(preview_status='failed')
+        return
+    values = {'preview_status': 'ready'}
+    if kind == 'thumbnail':
+        values['thumbnail'] = thumbnail_name(doc_file.file.name)
+    else:
+        values['preview_text'] = result['text']
+        values['extracted_text'] = result['content']
+    # Превью общее для всех записей с тем же содержимым
+    same_content = _same_content(doc_file)
+    same_content.update(**values)
+    if kind == 'text':
+        for document_id in set(same_content.values_list('document_id', flat=True)):
+            reindex_document(document_id)
+
+
+def _reuse_ready(doc_file):
+    """Берёт готовое превью у файла с тем же содержимым, если оно есть."""
+    ready = _same_content(doc_file).filter(preview_status='ready').exclude(id=doc_file.id).first()
+    if ready is None:
+        return False
+    DocumentFile.objects.filter(id=doc_file.id).update(
+        preview_status='ready',
+        thumbnail=ready.thumbnail,
+        preview_text=ready.preview_text,
+        extracted_text=ready.extracted_text,
+    )
+    if ready.extracted_text:
+        reindex_document(doc_file.document_id)
+    return True
+
+
+def _same_content(doc_file):
+    if doc_file.sha256:
+        return DocumentFile.objects.filter(sha256=doc_file.sha256, file=doc_file.file.name)
+    return DocumentFile.objects.filter(id=doc_file.id)
+
+
+@lru_cache(maxsize=None)
+def _executor():
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'PREVIEW_WORKERS', DEFAULT_WORKERS),
+        thread_name_prefix='file-preview',
+    )
+
+
+@lru_cache(maxsize=None)
+def _process_pool():
+    # spawn: рабочие процессы не наследуют потоки и соединения веб-процесса
+    return ProcessPoolExecutor(
+        max_workers=getattr(settings, 'PREVIEW_WORKERS', DEFAULT_WORKERS),
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def _build_in_background(file_id):
+    try:
+        build_preview(file_id)
+    finally:
+        connections.close_all()
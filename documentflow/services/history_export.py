@@ -0,0 +1,80 @@
+import zipfile
+
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from documentflow.models import HistoryReport
+from documentflow.services.history_report import (
+    history_documents, history_fingerprint, load_history, render_history
+)
+from documentflow.zipstream import ZipStream, write_file, zip_entry
+
+
+EXPORT_CHUNK_SIZE = 50
+
+
+def export_documents(author=None, date_from=None, date_to=None, document_type=None, archived=None):
+    """Документы для выгрузки историй по фильтру; None — без ограничения."""
+    queryset = history_documents(prefetch=True)
+    if author is not None:
+        queryset = queryset.filter(author_id=getattr(author, 'pk', author))
+    if date_from is not None:
+        queryset = queryset.filter(created_at__date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(created_at__date__lte=date_to)
+    if document_type is not None:
+        queryset = queryset.filter(document_type_id=getattr(document_type, 'pk', document_type))
+    if archived is not None:
+        queryset = queryset.filter(is_archived=archived)
+    return queryset
+
+
+def iter_history_zip(queryset, chunk_size=EXPORT_CHUNK_SIZE, stdout=None):
+    """
+    Генератор ZIP-архива с отчётами об истории документов.
+
+    Документы читаются пакетами по id с подгрузкой связей, отчёты
+    формируются и пишутся в архив по одному, после каждого файла готовые
+    байты отдаются наружу — память не растёт с числом документов.
+    Уже сформированные отчёты по неизменившимся документам берутся из файлов.
+    """
+    stream = ZipStream()
+    last_id = 0
+    written = 0
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        while True:
+            documents = list(queryset.filter(id__gt=last_id).order_by('id')[:chunk_size])
+            if not documents:
+                break
+            last_id = documents[-1].id
+            ready = {
+                (report.document_id, report.fingerprint): report
+                for report in HistoryReport.objects.filter(
+                    document_id__in=[document.id for document in documents], status='ready'
+                )
+            }
+
+            for document in documents:
+                rows = load_history(document)
+                report = ready.get((document.id, history_fingerprint(rows)))
+                if report is not None and report.file:
+                    entry = _entry(document, report.file_name.rsplit('.', 1)[-1])
+                    with report.file.open('rb') as source:
+                        yield from write_file(stream, archive, entry, source)
+                else:
+                    content, extension, _ = render_history(rows)
+                    archive.writestr(_entry(document, extension), content)
+                    del content
+                written += 1
+                yield stream.pop()
+
+            if stdout is not None:
+                stdout.write(f'Обработано до id={last_id}: документов в архиве {written}')
+    yield stream.pop()
+
+
+def _entry(document, extension):
+    return zip_entry(
+        get_valid_filename(f'{document.id}_history_{document.registration_number}.{extension}'),
+        date_time=timezone.localtime().timetuple()[:6],
+    )
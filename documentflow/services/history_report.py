@@ -0,0 +1,325 @@
+import hashlib
+import io
+import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from documentflow.models import Approval, Document, DocumentFile, DocumentVersion, HistoryReport
+
+
+# Меняется вместе с оформлением отчёта, чтобы старые файлы не отдавались
+REPORT_LAYOUT_VERSION = 1
+DEFAULT_WORKERS = 2
+# Отчёт в статусе «Формируется» дольше этого времени считается брошенным
+STALE_AFTER = timezone.timedelta(minutes=10)
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+TEXT_CONTENT_TYPE = 'text/plain; charset=utf-8'
+
+HistoryRows = namedtuple('HistoryRows', ['registration_number', 'title', 'info', 'approvals', 'files', 'versions'])
+
+
+def history_documents(prefetch=False):
+    """
+    Документы со связями, которые нужны отчёту (один запрос на документ).
+    С prefetch согласования, файлы и версии подгружаются сразу для всей
+    выборки — тремя запросами на пакет документов.
+    """
+    queryset = Document.objects.select_related('document_type', 'author', 'status')
+    if prefetch:
+        queryset = queryset.prefetch_related(
+            *[Prefetch(name, queryset=related) for name, related in _history_related().items()]
+        )
+    return queryset
+
+
+def load_history(document):
+    """
+    Строки отчёта об истории документа. Документ должен быть получен через
+    history_documents(); согласования, файлы и версии читаются тремя
+    запросами независимо от их количества (или берутся из prefetch).
+    """
+    prefetched = getattr(document, '_prefetched_objects_cache', {})
+    approvals, files, versions = (
+        prefetched[name] if name in prefetched else related.filter(document=document)
+        for name, related in _history_related().items()
+    )
+
+    return HistoryRows(
+        registration_number=document.registration_number,
+        title=document.title,
+        info=[
+            ("Регистрационный номер", document.registration_number),
+            ("Тема документа", document.title),
+            ("Тип документа", document.document_type.name),
+            ("Статус", document.status.name),
+            ("Тип обработки", document.get_action_type_display()),
+            ("Приоритет", document.get_priority_display()),
+            ("Автор", document.author.full_name),
+            ("Создан", document.created_at.strftime('%d.%m.%Y %H:%M')),
+            ("Срок", _date(document.deadline)),
+            ("Фактический срок", _date(document.actual_deadline)),
+            ("Входящий номер", document.external_number or '—'),
+            ("Входящая дата", _date(document.external_date)),
+            ("Корреспондент", document.correspondent or '—'),
+            ("Описание", document.description or '—'),
+        ],
+        approvals=[
+            (
+                str(approval.cycle),
+                str(approval.step),
+                approval.approver.full_name,
+                approval.get_decision_display(),
+                _datetime(approval.decided_at),
+                approval.comment or '—',
+            )
+            for approval in approvals
+        ],
+        files=[
+            (
+                f.file_name or f.file.name,
+                f.file_type or '—',
+                str(f.file_size or 0),
+                _datetime(f.uploaded_at),
+                f.uploaded_by.full_name if f.uploaded_by else '—',
+            )
+            for f in files
+        ],
+        versions=[
+            (
+                str(v.version),
+                v.file.name,
+                _datetime(v.created_at),
+                v.created_by.full_name if v.created_by else '—',
+            )
+            for v in versions
+        ],
+    )
+
+
+def history_fingerprint(rows):
+    """Отпечаток содержимого отчёта: меняется вместе с любой его строкой."""
+    payload = json.dumps([REPORT_LAYOUT_VERSION, rows], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def report_for(document):
+    """
+    Отчёт, соответствующий текущему содержимому документа, и его строки.
+    Запись создаётся в статусе «В очереди», если такого отчёта ещё нет.
+    """
+    rows = load_history(document)
+    report, _ = HistoryReport.objects.get_or_create(document=document, fingerprint=history_fingerprint(rows))
+    return report, rows
+
+
+def start_report(document):
+    """
+    Ставит формирование отчёта в фоновую очередь, если готового отчёта
+    для текущего содержимого нет. Ошибочный отчёт формируется заново.
+    """
+    report, rows = report_for(document)
+    if report.status == 'failed':
+        HistoryReport.objects.filter(id=report.id, status='failed').update(status='pending', error='')
+        report.status = 'pending'
+    if report.status == 'pending':
+        transaction.on_commit(lambda: _executor().submit(_build_in_background, report.id, rows))
+    return report
+
+
+def build_report(report_id, rows=None):
+    """
+    Формирует файл отчёта. Если отчёт уже взят другим обработчиком,
+    возвращается как есть. Без rows строки читаются заново; если
+    содержимое документа успело измениться, отчёт удаляется — его заменит
+    новый при следующем запросе.
+    """
+    now = timezone.now()
+    claimed = (
+        HistoryReport.objects
+        .filter(id=report_id)
+        .filter(Q(status='pending') | Q(status='running', started_at__lt=now - STALE_AFTER))
+        .update(status='running', started_at=now)
+    )
+    report = HistoryReport.objects.filter(id=report_id).first()
+    if report is None or not claimed:
+        return report
+
+    try:
+        if rows is None:
+            rows = load_history(history_documents().get(id=report.document_id))
+            if history_fingerprint(rows) != report.fingerprint:
+                report.delete()
+                return None
+        content, extension, content_type = render_history(rows)
+        report.file.save(f'history_{report.fingerprint[:32]}.{extension}', ContentFile(content), save=False)
+        report.file_name = f'history_{rows.registration_number}.{extension}'
+        report.content_type = content_type
+        report.status = 'ready'
+        report.finished_at = timezone.now()
+        report.save(update_fields=['file', 'file_name', 'content_type', 'status', 'finished_at'])
+    except Exception as exc:
+        report.status = 'failed'
+        report.error = str(exc)[:1000]
+        report.save(update_fields=['status', 'error'])
+        return report
+
+    _drop_outdated(report)
+    return report
+
+
+def build_pending_reports(stdout=None):
+    """Формирует отчёты, оставшиеся в очереди (например, после перезапуска процесса)."""
+    stale = timezone.now() - STALE_AFTER
+    ids = list(
+        HistoryReport.objects
+        .filter(Q(status='pending') | Q(status='running', started_at__lt=stale))
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    built = 0
+    for report_id in ids:
+        report = build_report(report_id)
+        if report is not None and report.status == 'ready':
+            built += 1
+        if stdout is not None:
+            stdout.write(f'Отчёт {report_id}: {report.get_status_display() if report else "устарел"}')
+    return built
+
+
+def render_history(rows):
+    """Содержимое отчёта: DOCX, а без python-docx — текстовый файл."""
+    try:
+        from docx import Document as DocxDocument
+    except ImportError:
+        return _render_text(rows).encode('utf-8'), 'txt', TEXT_CONTENT_TYPE
+    return _render_docx(DocxDocument, rows), 'docx', DOCX_CONTENT_TYPE
+
+
+def _render_text(rows):
+    lines = [f"{label}: {value}" for label, value in rows.info]
+    lines += ["", "История согласования:"]
+    for cycle, step, approver, decision, decided_at, comment in rows.approvals:
+        lines.append(f"- Раунд {cycle}, шаг {step}: {approver} — {decision} ({decided_at})")
+        lines.append(f"  Комментарий: {comment}")
+    lines += ["", "Файлы документа:"]
+    lines += [
+        f"- {name} | {file_type} | {size} байт | {uploaded_at} | Загрузил: {uploaded_by}"
+        for name, file_type, size, uploaded_at, uploaded_by in rows.files
+    ] or ["- —"]
+    lines += ["", "Версии документа:"]
+    lines += [
+        f"- Версия {version}: {name} | {created_at} | Создал: {created_by}"
+        for version, name, created_at, created_by in rows.versions
+    ] or ["- —"]
+    return "\n".join(lines)
+
+
+def _render_docx(DocxDocument, rows):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    docx = DocxDocument()
+    normal_style = docx.styles['Normal']
+    normal_style.font.name = 'Times New Roman'
+    normal_style.font.size = Pt(12)
+
+    title = docx.add_paragraph()
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    title_run = title.add_run("ОТЧЕТ О ДОКУМЕНТЕ")
+    title_run.bold = True
+    title_run.font.size = Pt(16)
+
+    subtitle = docx.add_paragraph()
+    subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    subtitle_run = subtitle.add_run(f"{rows.registration_number} — {rows.title}")
+    subtitle_run.font.size = Pt(12)
+
+    meta = docx.add_paragraph()
+    meta.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    meta.add_run(f"Сформировано: {timezone.now().strftime('%d.%m.%Y %H:%M')}")
+
+    docx.add_paragraph("")
+
+    docx.add_heading("Основные сведения", level=2)
+    _add_table(docx, None, rows.info)
+
+    docx.add_paragraph("")
+    docx.add_heading("История согласования", level=2)
+    _add_table(docx, ["Раунд", "Шаг", "Согласующий", "Решение", "Дата", "Комментарий"], rows.approvals)
+
+    docx.add_heading("Файлы документа", level=2)
+    _add_table(docx, ["Имя", "Тип", "Размер", "Дата загрузки", "Загрузил"], rows.files)
+
+    docx.add_heading("Версии документа", level=2)
+    _add_table(docx, ["Версия", "Файл", "Дата", "Создал"], rows.versions)
+
+    buffer = io.BytesIO()
+    docx.save(buffer)
+    return buffer.getvalue()
+
+
+def _add_table(docx, header, rows):
+    if not rows:
+        docx.add_paragraph("—")
+        return
+    table = docx.add_table(rows=1 if header else 0, cols=len(header or rows[0]))
+    table.style = 'Table Grid'
+    if header:
+        for cell, text in zip(table.rows[0].cells, header):
+            cell.text = text
+    for values in rows:
+        for cell, text in zip(table.add_row().cells, values):
+            cell.text = text
+
+
+def _history_related():
+    return {
+        'approvals': Approval.objects.select_related('approver').order_by('cycle', 'step', 'created_at'),
+        'files': DocumentFile.objects.select_related('uploaded_by').order_by('uploaded_at'),
+        'versions': DocumentVersion.objects.select_related('created_by').order_by('version'),
+    }
+
+
+def _drop_outdated(report):
+    # Отчёты по прежнему содержимому документа больше не понадобятся
+    outdated = (
+        HistoryReport.objects
+        .filter(document_id=report.document_id)
+        .exclude(id=report.id)
+        .filter(status__in=['ready', 'failed'])
+    )
+    for old in outdated:
+        if old.file:
+            old.file.delete(save=False)
+        old.delete()
+
+
+@lru_cache(maxsize=None)
+def _executor():
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'HISTORY_REPORT_WORKERS', DEFAULT_WORKERS),
+        thread_name_prefix='history-report',
+    )
+
+
+def _build_in_background(report_id, rows):
+    try:
+        build_report(report_id, rows)
+    finally:
+        connections.close_all()
+
+
+def _date(value):
+    return value.strftime('%d.%m.%Y') if value else '—'
+
+
+def _datetime(value):
+    return value.strftime('%d.%m.%Y %H:%M') if value else '—'
@@ -0,0 +1,154 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from documentflow.models import Approval, Document, InboxEntry
+from documentflow.services.dashboard_cache import invalidate_dashboard
+
+
+BULK_BATCH_SIZE = 500
+
+APPROVAL_FIELDS = ('id', 'document_id', 'approver_id', 'step', 'cycle', 'decision', 'decided_at', 'created_at')
+ENTRY_FIELDS = (
+    'cycle', 'is_actionable', 'is_visible', 'last_decision',
+    'priority', 'deadline', 'is_archived', 'created_at',
+)
+
+
+def sync_document_inbox(document, approvals=None):
+    """
+    Пересчёт строк входящих по одному документу.
+    Вызывается после каждого изменения согласований или полей документа,
+    записываются только изменившиеся строки.
+    """
+    if approvals is None:
+        approvals = list(Approval.objects.filter(document=document).values(*APPROVAL_FIELDS))
+    desired = {entry.user_id: entry for entry in build_inbox_entries(document, approvals)}
+
+    with transaction.atomic():
+        existing = {entry.user_id: entry for entry in InboxEntry.objects.filter(document=document)}
+
+        to_create = [entry for user_id, entry in desired.items() if user_id not in existing]
+        to_update = []
+        for user_id, entry in desired.items():
+            current = existing.get(user_id)
+            if current is None:
+                continue
+            if any(getattr(current, f) != getattr(entry, f) for f in ENTRY_FIELDS):
+                for f in ENTRY_FIELDS:
+                    setattr(current, f, getattr(entry, f))
+                current.updated_at = timezone.now()
+                to_update.append(current)
+        stale_ids = [entry.id for user_id, entry in existing.items() if user_id not in desired]
+
+        if stale_ids:
+            InboxEntry.objects.filter(id__in=stale_ids).delete()
+        if to_create:
+            InboxEntry.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        if to_update:
+            InboxEntry.objects.bulk_update(to_update, ENTRY_FIELDS + ('updated_at',), batch_size=BULK_BATCH_SIZE)
+
+        invalidate_dashboard(
+            [entry.user_id for entry in to_create]
+            + [entry.user_id for entry in to_update]
+            + [user_id for user_id in existing if user_id not in desired]
+        )
+
+
+def build_inbox_entries(document, approvals):
+    """
+    Строки входящих для документа по списку его согласований (словари
+    с полями APPROVAL_FIELDS). Для каждого согласующего берётся его
+    последний раунд; документ виден во входящих, если сотрудник участвует
+    в текущем раунде и либо сейчас его шаг, либо решение уже принято.
+    """
+    if not approvals:
+        return []
+
+    doc_cycle = max(a['cycle'] for a in approvals)
+    pending_steps = [a['step'] for a in approvals if a['cycle'] == doc_cycle and a['decision'] == 'pending']
+    current_step = min(pending_steps) if pending_steps else None
+
+    by_user = {}
+    for approval in approvals:
+        by_user.setdefault(approval['approver_id'], []).append(approval)
+
+    entries = []
+    for user_id, rows in by_user.items():
+        user_cycle = max(a['cycle'] for a in rows)
+        cycle_rows = [a for a in rows if a['cycle'] == user_cycle]
+        pending = [a for a in cycle_rows if a['decision'] == 'pending']
+        decided = [a for a in cycle_rows if a['decision'] != 'pending']
+
+        if pending:
+            last = max(pending, key=lambda a: (a['created_at'], a['id']))
+        else:
+            last = max(decided, key=lambda a: (a['decided_at'] is not None, a['decided_at'] or a['created_at'], a['created_at'], a['id']))
+
+        is_current = user_cycle == doc_cycle
+        is_actionable = is_current and any(
+            document.approval_order != 'sequential' or a['step'] == current_step
+            for a in pending
+        )
+        entries.append(InboxEntry(
+            user_id=user_id,
+            document_id=document.id,
+            cycle=user_cycle,
+            is_actionable=is_actionable,
+            is_visible=is_actionable or (is_current and bool(decided)),
+            last_decision=last['decision'],
+            priority=document.priority,
+            deadline=document.deadline,
+            is_archived=document.is_archived,
+            created_at=document.created_at,
+        ))
+    return entries
+
+
+def rebuild_inbox(batch_size=BULK_BATCH_SIZE, stdout=None):
+    """Полная перестройка таблицы входящих по строкам Approval."""
+    last_id = 0
+    processed = 0
+    while True:
+        documents = list(Document.objects.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not documents:
+            break
+        last_id = documents[-1].id
+
+        approvals = {}
+        for approval in Approval.objects.filter(document__in=documents).values(*APPROVAL_FIELDS):
+            approvals.setdefault(approval['document_id'], []).append(approval)
+
+        entries = []
+        for document in documents:
+            entries.extend(build_inbox_entries(document, approvals.get(document.id, [])))
+
+        with transaction.atomic():
+            stale = InboxEntry.objects.filter(document__in=documents)
+            invalidate_dashboard(list(stale.values_list('user_id', flat=True)) + [entry.user_id for entry in entries])
+            stale.delete()
+            InboxEntry.objects.bulk_create(entries, batch_size=BULK_BATCH_SIZE)
+
+        processed += len(documents)
+        if stdout is not None:
+            stdout.write(f'Обработано документов: {processed}')
+    return processed
+
+
+def inbox_entries(user):
+    """Видимые строки входящих сотрудника (без архива)."""
+    return InboxEntry.objects.filter(user=user, is_archived=False, is_visible=True)
+
+
+def actionable_entries(user):
+    """Строки входящих, по которым сейчас ожидается действие сотрудника."""
+    return InboxEntry.objects.filter(user=user, is_archived=False, is_actionable=True)
+
+
+def inbox_counters(user, today):
+    """Счётчики входящих, требующих действия, одним запросом."""
+    return actionable_entries(user).aggregate(
+        incoming_count=Count('id'),
+        incoming_urgent=Count('id', filter=Q(priority='urgent')),
+        overdue_count=Count('id', filter=Q(deadline__lt=today)),
+    )
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from documentflow.models import Notification
+
+
+DEFAULT_BROKER = 'documentflow.services.notification_bus.InProcessBroker'
+SUBSCRIPTION_QUEUE_SIZE = 100
+BACKLOG_LIMIT = 50
+DEFAULT_RESYNC = 30
+
+
+def notification_payload(notification):
+    """Представление уведомления для API и потоковой доставки."""
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'text': notification.text,
+        'link': notification.link,
+        'created_at': notification.created_at.isoformat(),
+        'is_read': notification.is_read,
+        'type': notification.notification_type,
+    }
+
+
+class Subscription:
+    def __init__(self, broker, user_id, loop):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def offer(self, payload):
+        # Переполненная очередь означает отставшего клиента: он догонит по since_id
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def drain(self):
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InProcessBroker:
+    """
+    Рассылка уведомлений подписчикам внутри одного процесса.
+    Публикация потокобезопасна: синхронные представления вызывают publish
+    из рабочих потоков, подписчики живут в цикле событий ASGI.
+    Для нескольких процессов заменяется общим брокером через
+    настройку NOTIFICATION_BROKER (тот же интерфейс publish/subscribe).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+            except RuntimeError:
+                # Цикл событий уже закрыт, подписка будет снята при выходе из потока
+                pass
+
+
+def streaming_supported(request):
+    """
+    Поток и долгое ожидание имеют смысл только под ASGI. Под WSGI
+    StreamingHttpResponse дочитывает асинхронный генератор до конца,
+    а долгий опрос держит рабочий поток, поэтому клиент опрашивает сервер.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'NOTIFICATION_BROKER', DEFAULT_BROKER))()
+
+
+def publish_notifications(notifications):
+    """
+    Передаёт созданные уведомления подписчикам после фиксации транзакции.
+    Уведомления без id (bulk_create без возврата ключей) не публикуются,
+    клиенты получат их при очередной сверке по since_id.
+    """
+    notifications = [n for n in notifications if n.pk]
+    if not notifications:
+        return
+
+    def publish():
+        broker = get_broker()
+        for notification in notifications:
+            broker.publish(notification.user_id, notification_payload(notification))
+
+    transaction.on_commit(publish)
+
+
+def resync_interval():
+    """
+    Как часто поток сверяется с БД. Покрывает уведомления, созданные в других
+    процессах при внутрипроцессном брокере (например, командами из cron).
+    """
+    return getattr(settings, 'NOTIFICATION_STREAM_RESYNC', DEFAULT_RESYNC)
+
+
+def notifications_since(user_id, since_id, limit=BACKLOG_LIMIT):
+    """
+    Уведомления сотрудника с id больше since_id по возрастанию id.
+    Всегда из БД: уведомления создают и другие процессы, а запрос по
+    сотруднику и id дешёвый.
+    """
+    notifications = list(
+        Notification.objects
+        .filter(user_id=user_id, id__gt=since_id)
+        .order_by('id')[:limit]
+    )
+    return [notification_payload(n) for n in notifications]
+
+
+def latest_notification_id(user_id):
+    return (
+        Notification.objects
+        .filter(user_id=user_id)
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    ) or 0
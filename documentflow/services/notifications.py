@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+
+from documentflow.models import Notification
+from documentflow.services.notification_bus import publish_notifications
+from documentflow.services.unread import recount_unread
+
+
+BULK_BATCH_SIZE = 500
+
+# Типы с уникальным ограничением в БД: вставляются с пропуском конфликтов
+UNIQUE_TYPES = {'deadline'}
+
+_current_batch = ContextVar('notification_batch', default=None)
+
+
+class NotificationBatch:
+    """
+    Уведомления, накопленные за запрос или транзакцию. Схлопываются только
+    точные повторы (тот же сотрудник, тип, документ, отправитель и текст):
+    разные смены статуса одного документа остаются отдельными уведомлениями.
+    """
+
+    def __init__(self):
+        self._items = {}
+
+    def add(self, notification):
+        self._items.setdefault(_coalesce_key(notification), notification)
+
+    def __len__(self):
+        return len(self._items)
+
+    def flush(self):
+        notifications = list(self._items.values())
+        self._items.clear()
+        with transaction.atomic():
+            return write_notifications(notifications)
+
+
+@contextmanager
+def collect_notifications():
+    """
+    Собирает уведомления, созданные через notify(), и записывает их одной
+    пакетной вставкой после фиксации транзакции, в которой закрылся самый
+    внешний блок (вне транзакции — сразу). При исключении или откате
+    накопленное отбрасывается. Работает и как декоратор.
+    """
+    batch = _current_batch.get()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = NotificationBatch()
+    token = _current_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _current_batch.reset(token)
+    if len(batch):
+        transaction.on_commit(batch.flush)
+
+
+def notify(user, notification_type, title, text='', link='', document=None, sender=None):
+    """
+    Уведомление сотруднику. Внутри collect_notifications() попадает в общий
+    пакет, иначе записывается сразу.
+    """
+    notification = build_notification(user, notification_type, title, text, link, document, sender)
+    batch = _current_batch.get()
+    if batch is None:
+        write_notifications([notification])
+    else:
+        batch.add(notification)
+    return notification
+
+
+def build_notification(user, notification_type, title, text='', link='', document=None, sender=None):
+    """Несохранённое уведомление для write_notifications()."""
+    return Notification(
+        user_id=getattr(user, 'pk', user),
+        notification_type=notification_type,
+        title=title,
+        text=text,
+        link=link,
+        document_id=getattr(document, 'pk', document),
+        sender_id=getattr(sender, 'pk', sender),
+    )
+
+
+def write_notifications(notifications):
+    """
+    Пакетная запись уведомлений: одна вставка на тип ограничения,
+    пересчёт счётчиков непрочитанных и публикация подписчикам.
+    """
+    if not notifications:
+        return []
+
+    regular = [n for n in notifications if n.notification_type not in UNIQUE_TYPES]
+    unique = [n for n in notifications if n.notification_type in UNIQUE_TYPES]
+    if regular:
+        Notification.objects.bulk_create(regular, batch_size=BULK_BATCH_SIZE)
+    if unique:
+        # Без возврата id: такие уведомления клиенты получают при сверке по since_id
+        Notification.objects.bulk_create(unique, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    recount_unread({n.user_id for n in notifications})
+    publish_notifications(regular)
+    return notifications
+
+
+def _coalesce_key(notification):
+    return (
+        notification.user_id,
+        notification.notification_type,
+        notification.document_id,
+        notification.sender_id,
+        notification.title,
+        notification.text,
+        notification.link,
+    )
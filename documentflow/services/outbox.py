@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from documentflow.models import EmailOutbox
+
+
+BULK_BATCH_SIZE = 500
+OUTBOX_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60
+MAX_RETRY_DELAY = 3600
+# Письмо, взятое в отправку и не отмеченное за это время, считается брошенным
+CLAIM_TIMEOUT = timezone.timedelta(minutes=10)
+
+
+def enqueue_email(to, subject, html_message='', body=None, from_email=None):
+    """
+    Ставит письмо в очередь и сразу возвращает запись EmailOutbox.
+    Текстовая версия по умолчанию получается из HTML.
+    """
+    if isinstance(to, str):
+        to = [to]
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body if body is not None else strip_tags(html_message),
+        html_body=html_message,
+        from_email=from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', '') or '',
+        to=list(to),
+    )
+
+
+def enqueue_emails(messages):
+    """
+    Ставит в очередь много писем одной вставкой.
+    messages — кортежи (адрес или список адресов, тема, HTML, текст).
+    """
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', '') or ''
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(
+            subject=subject,
+            body=body,
+            html_body=html_message,
+            from_email=from_email,
+            to=[to] if isinstance(to, str) else list(to),
+        )
+        for to, subject, html_message, body in messages
+    ], batch_size=BULK_BATCH_SIZE)
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, now=None):
+    """
+    Забирает в отправку очередной пакет писем. Строки, занятые другим
+    обработчиком, пропускаются, поэтому команду можно запускать параллельно.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__lte=now)
+                | Q(status='sending', claimed_at__lt=now - CLAIM_TIMEOUT)
+            )
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        EmailOutbox.objects.filter(id__in=ids).update(status='sending', claimed_at=now)
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by('id'))
+
+
+def send_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None, connection=None, stdout=None):
+    """
+    Отправляет накопившиеся письма пакетами через одно соединение
+    с почтовым сервером. Неудачная отправка повторяется с растущей
+    задержкой, после EMAIL_OUTBOX_MAX_ATTEMPTS попыток письмо помечается
+    ошибочным. Текст отправленных и ошибочных писем стирается.
+    Возвращает {'sent': ..., 'failed': ...}.
+    """
+    connection = connection or get_connection()
+    result = {'sent': 0, 'failed': 0}
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            items = claim_batch(batch_size)
+            if not items:
+                break
+            batches += 1
+
+            sent_ids = []
+            for item in items:
+                try:
+                    connection.open()
+                    if not connection.send_messages([_build_message(item, connection)]):
+                        raise ValueError('Нет получателей')
+                except Exception as exc:
+                    # Соединение после ошибки могло оборваться: следующее письмо откроет новое
+                    _close_quietly(connection)
+                    _schedule_retry(item, exc)
+                    result['failed'] += 1
+                else:
+                    sent_ids.append(item.id)
+            # В письмах бывают пароли и коды подтверждения: после отправки текст не храним
+            EmailOutbox.objects.filter(id__in=sent_ids).update(
+                status='sent', sent_at=timezone.now(), last_error='', body='', html_body=''
+            )
+            result['sent'] += len(sent_ids)
+
+            if stdout is not None:
+                stdout.write(f'Пакет {batches}: отправлено {result["sent"]}, ошибок {result["failed"]}')
+    finally:
+        _close_quietly(connection)
+    return result
+
+
+def retry_delay(attempts):
+    """Задержка перед следующей попыткой: удваивается с каждой неудачей."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return timezone.timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+
+
+def _schedule_retry(item, exc):
+    item.attempts += 1
+    item.last_error = str(exc)[:1000]
+    if item.attempts >= getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+        # Попытки исчерпаны: как и у отправленных, текст с паролем или кодом не храним
+        item.status = 'failed'
+        item.body = ''
+        item.html_body = ''
+    else:
+        item.status = 'pending'
+        item.next_attempt_at = timezone.now() + retry_delay(item.attempts)
+    item.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'body', 'html_body'])
+
+
+def _build_message(item, connection):
+    message = EmailMultiAlternatives(
+        subject=item.subject,
+        body=item.body,
+        from_email=item.from_email or None,
+        to=item.to,
+        connection=connection,
+    )
+    if item.html_body:
+        message.attach_alternative(item.html_body, "text/html")
+    return message
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
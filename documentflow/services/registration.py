@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from documentflow.models import Document, RegistrationCounter
+
+
+def next_registration_number(document_type=None, today=None):
+    """
+    Регистрационный номер для нового документа вида ГГГГ-ММ-NNNN
+    (или КОД-ГГГГ-ММ-NNNN при REGISTRATION_NUMBER_PER_TYPE).
+
+    Счётчик периода блокируется до конца внешней транзакции, поэтому
+    параллельные создания документов не получают одинаковых номеров, а
+    стоимость выдачи не зависит от числа документов за месяц. Вызывается
+    в той же транзакции, что и создание документа: при откате номер
+    возвращается в счётчик и нумерация остаётся без пропусков.
+    """
+    today = today or timezone.localdate()
+    period = f"{today.year:04d}-{today.month:02d}"
+    scope = _counter_scope(document_type)
+    prefix = f"{scope}-{period}-" if scope else f"{period}-"
+
+    with transaction.atomic():
+        counter, _ = (
+            RegistrationCounter.objects
+            .select_for_update()
+            .get_or_create(
+                period=period,
+                scope=scope,
+                defaults={'last_number': lambda: _last_issued_number(prefix)},
+            )
+        )
+        counter.last_number += 1
+        counter.save(update_fields=['last_number', 'updated_at'])
+
+    return f"{prefix}{counter.last_number:04d}"
+
+
+def _counter_scope(document_type):
+    if document_type is None or not getattr(settings, 'REGISTRATION_NUMBER_PER_TYPE', False):
+        return ''
+    return (document_type.code or '').strip()
+
+
+def _last_issued_number(prefix):
+    """
+    Наибольший номер, уже выданный за период до появления счётчика.
+    Выполняется один раз при создании строки счётчика.
+    """
+    last = 0
+    numbers = Document.objects.filter(registration_number__startswith=prefix).values_list('registration_number', flat=True)
+    for number in numbers.iterator():
+        tail = number[len(prefix):]
+        if tail.isdigit():
+            last = max(last, int(tail))
+    return last
@@ -0,0 +1,107 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from documentflow.models import ArchivedNotification, Notification
+from documentflow.services.unread import recount_unread
+
+
+BULK_BATCH_SIZE = 500
+DEFAULT_READ_RETENTION_DAYS = 90
+DEFAULT_UNREAD_ARCHIVE_DAYS = 180
+
+# Типы, которые при очистке переносятся в архив, а не удаляются:
+# по ним проверяется, отправлялось ли уведомление раньше (scan_deadlines)
+ARCHIVE_ONLY_TYPES = {'deadline'}
+
+ARCHIVED_FIELDS = (
+    'id', 'user_id', 'notification_type', 'title', 'text', 'link',
+    'is_read', 'created_at', 'read_at', 'document_id', 'sender_id',
+)
+
+
+def retention_policy(read_days=None, unread_days=None):
+    """
+    Сроки хранения в днях: прочитанные удаляются через read_days,
+    непрочитанные переносятся в архив через unread_days. 0 отключает правило.
+    Не заданные явно значения берутся из настроек.
+    """
+    if read_days is None:
+        read_days = getattr(settings, 'NOTIFICATION_READ_RETENTION_DAYS', DEFAULT_READ_RETENTION_DAYS)
+    if unread_days is None:
+        unread_days = getattr(settings, 'NOTIFICATION_UNREAD_ARCHIVE_DAYS', DEFAULT_UNREAD_ARCHIVE_DAYS)
+    return read_days, unread_days
+
+
+def expired_notifications(read_days=None, unread_days=None, now=None):
+    """Наборы уведомлений под очистку: (на удаление, в архив)."""
+    read_days, unread_days = retention_policy(read_days, unread_days)
+    now = now or timezone.now()
+    to_delete = to_archive = Notification.objects.none()
+    if read_days:
+        read = Notification.objects.filter(is_read=True, created_at__lt=now - timezone.timedelta(days=read_days))
+        to_delete = read.exclude(notification_type__in=ARCHIVE_ONLY_TYPES)
+        to_archive = read.filter(notification_type__in=ARCHIVE_ONLY_TYPES)
+    if unread_days:
+        unread = Notification.objects.filter(
+            is_read=False, created_at__lt=now - timezone.timedelta(days=unread_days)
+        )
+        to_archive = to_archive | unread
+    return to_delete, to_archive
+
+
+def purge_notifications(read_days=None, unread_days=None, batch_size=BULK_BATCH_SIZE,
+                        max_batches=None, pause=0, now=None, stdout=None):
+    """
+    Применяет политику хранения уведомлений.
+
+    Строки обрабатываются пакетами не больше batch_size в порядке
+    created_at, каждый пакет — в отдельной короткой транзакции, поэтому
+    таблица не блокируется надолго, а прерванный запуск просто продолжается
+    следующим. max_batches ограничивает работу за один запуск, pause даёт
+    базе передышку между пакетами.
+    Возвращает {'deleted': ..., 'archived': ...}.
+    """
+    now = now or timezone.now()
+    to_delete, to_archive = expired_notifications(read_days, unread_days, now)
+    result = {'deleted': 0, 'archived': 0}
+    batches = 0
+
+    for key, queryset, handler in (
+        ('deleted', to_delete, _delete_batch),
+        ('archived', to_archive, _archive_batch),
+    ):
+        while max_batches is None or batches < max_batches:
+            ids = list(queryset.order_by('created_at', 'id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            result[key] += handler(ids)
+            batches += 1
+            if stdout is not None:
+                stdout.write(
+                    f'Пакет {batches}: удалено {result["deleted"]}, перенесено в архив {result["archived"]}'
+                )
+            if pause:
+                time.sleep(pause)
+    return result
+
+
+def _delete_batch(ids):
+    # Удаляются только прочитанные, счётчики непрочитанных не меняются
+    deleted, _ = Notification.objects.filter(id__in=ids, is_read=True).delete()
+    return deleted
+
+
+@transaction.atomic
+def _archive_batch(ids):
+    rows = list(Notification.objects.select_for_update().filter(id__in=ids).values(*ARCHIVED_FIELDS))
+    archived_ids = [row['id'] for row in rows]
+    ArchivedNotification.objects.bulk_create(
+        [ArchivedNotification(notification_id=row.pop('id'), **row) for row in rows],
+        batch_size=BULK_BATCH_SIZE
+    )
+    Notification.objects.filter(id__in=archived_ids).delete()
+    recount_unread({row['user_id'] for row in rows if not row['is_read']})
+    return len(rows)
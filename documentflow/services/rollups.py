@@ -0,0 +1,155 @@
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from documentflow.models import Approval, DailyActivity, DailyDecisionStat
+from documentflow.services.analytics import PROCESSED_DECISIONS
+from documentflow.services.dashboard_cache import invalidate_dashboard
+
+
+BULK_BATCH_SIZE = 500
+RECOMPUTE_CHUNK_DAYS = 31
+ZERO_DURATION = timezone.timedelta()
+
+
+def record_decision(approval, previous=None, closed_ids=()):
+    """
+    Добавляет решение в дневные сводки приращениями (F), без пересчёта дня:
+    параллельные решения одного сотрудника за день не мешают друг другу.
+    Решение и время берутся из сохранённых строк: самого согласования и
+    closed_ids — ожидающих согласований, закрытых вместе с ним (при
+    отклонении и возврате). previous — (решение, время решения) до
+    изменения, если уже принятое решение пересматривается: его вклад
+    вычитается из сводок того дня, в который оно было учтено.
+    """
+    closed = list(
+        Approval.objects
+        .filter(id__in={approval.pk, *closed_ids}, decided_at__isnull=False)
+        .values('approver_id', 'created_at', 'decided_at', 'decision',
+                'document__document_type_id', 'document__priority')
+    )
+    with transaction.atomic():
+        for row in closed:
+            _add_to_rollups(row, 1)
+        if previous is not None and previous[0] != 'pending' and previous[1]:
+            decision, decided_at = previous
+            document = approval.document
+            _add_to_rollups({
+                'approver_id': approval.approver_id,
+                'created_at': approval.created_at,
+                'decided_at': decided_at,
+                'decision': decision,
+                'document__document_type_id': document.document_type_id,
+                'document__priority': document.priority,
+            }, -1)
+        invalidate_dashboard({row['approver_id'] for row in closed} | {approval.approver_id})
+
+
+def _add_to_rollups(row, sign):
+    # День сводки — по времени решения, с которым оно было учтено
+    day = timezone.localdate(row['decided_at'])
+    duration = (row['decided_at'] - row['created_at']) * sign
+    processed = sign if row['decision'] in PROCESSED_DECISIONS else 0
+
+    activity, _ = DailyActivity.objects.get_or_create(user_id=row['approver_id'], day=day)
+    DailyActivity.objects.filter(pk=activity.pk).update(
+        decided_count=Greatest(F('decided_count') + sign, 0),
+        processed_count=Greatest(F('processed_count') + processed, 0),
+        processing_time=Greatest(F('processing_time') + duration, Value(ZERO_DURATION)),
+    )
+    stat, _ = DailyDecisionStat.objects.get_or_create(
+        user_id=row['approver_id'],
+        day=day,
+        document_type_id=row['document__document_type_id'],
+        priority=row['document__priority'] or 'normal',
+        decision=row['decision'],
+    )
+    DailyDecisionStat.objects.filter(pk=stat.pk).update(count=Greatest(F('count') + sign, 0))
+
+
+def refresh_rollups(start, end, user_ids=None):
+    """
+    Пересчёт сводок за дни start..end (включительно) по строкам Approval.
+    Если user_ids не задан, пересчитываются все сотрудники.
+    Возвращает число записанных строк DailyActivity.
+    """
+    approvals = Approval.objects.filter(
+        decided_at__isnull=False,
+        decided_at__date__gte=start,
+        decided_at__date__lte=end,
+    )
+    activity = DailyActivity.objects.filter(day__gte=start, day__lte=end)
+    stats = DailyDecisionStat.objects.filter(day__gte=start, day__lte=end)
+    if user_ids is not None:
+        approvals = approvals.filter(approver_id__in=user_ids)
+        activity = activity.filter(user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+
+    rows = (
+        approvals
+        .annotate(
+            day=TruncDate('decided_at'),
+            duration=ExpressionWrapper(F('decided_at') - F('created_at'), output_field=DurationField()),
+        )
+        .values('approver_id', 'day', 'document__document_type_id', 'document__priority', 'decision')
+        .annotate(count=Count('id'), processing_time=Sum('duration'))
+        .order_by()
+    )
+
+    totals = {}
+    decision_stats = []
+    for row in rows:
+        key = (row['approver_id'], row['day'])
+        total = totals.get(key)
+        if total is None:
+            total = totals[key] = DailyActivity(user_id=row['approver_id'], day=row['day'])
+        total.decided_count += row['count']
+        total.processing_time += row['processing_time'] or timezone.timedelta()
+        if row['decision'] in PROCESSED_DECISIONS:
+            total.processed_count += row['count']
+
+        decision_stats.append(DailyDecisionStat(
+            user_id=row['approver_id'],
+            day=row['day'],
+            document_type_id=row['document__document_type_id'],
+            priority=row['document__priority'] or 'normal',
+            decision=row['decision'],
+            count=row['count'],
+        ))
+
+    with transaction.atomic():
+        if user_ids is None:
+            invalidate_dashboard(list(activity.values_list('user_id', flat=True)) + [uid for uid, _ in totals])
+        else:
+            invalidate_dashboard(user_ids)
+        activity.delete()
+        stats.delete()
+        DailyActivity.objects.bulk_create(totals.values(), batch_size=BULK_BATCH_SIZE)
+        DailyDecisionStat.objects.bulk_create(decision_stats, batch_size=BULK_BATCH_SIZE)
+    return len(totals)
+
+
+def rebuild_rollups(start=None, end=None, chunk_days=RECOMPUTE_CHUNK_DAYS, stdout=None):
+    """
+    Пересчёт сводок за произвольный период отрезками по chunk_days дней.
+    Без границ берётся весь период, за который есть решения.
+    """
+    if start is None or end is None:
+        bounds = Approval.objects.filter(decided_at__isnull=False).order_by('decided_at')
+        first = bounds.values_list('decided_at', flat=True).first()
+        last = bounds.values_list('decided_at', flat=True).last()
+        if first is None:
+            return 0
+        start = start or timezone.localdate(first)
+        end = end or timezone.localdate(last)
+
+    written = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timezone.timedelta(days=chunk_days - 1), end)
+        written += refresh_rollups(chunk_start, chunk_end)
+        if stdout is not None:
+            stdout.write(f'{chunk_start:%d.%m.%Y} — {chunk_end:%d.%m.%Y}: строк активности {written}')
+        chunk_start = chunk_end + timezone.timedelta(days=1)
+    return written
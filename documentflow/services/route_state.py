@@ -0,0 +1,81 @@
+from django.db import transaction
+
+from documentflow.models import Approval, Document
+from documentflow.services.dashboard_cache import invalidate_dashboard
+from documentflow.services.inbox import APPROVAL_FIELDS, BULK_BATCH_SIZE, sync_document_inbox
+
+
+STATE_FIELDS = ('current_cycle', 'current_step', 'pending_count')
+
+
+def compute_route_state(approvals):
+    """
+    Текущий раунд, текущий шаг и число ожидающих решений в текущем раунде
+    по списку согласований документа (словари с полями cycle/step/decision).
+    """
+    if not approvals:
+        return {'current_cycle': 0, 'current_step': None, 'pending_count': 0}
+
+    cycle = max(a['cycle'] for a in approvals)
+    pending_steps = [a['step'] for a in approvals if a['cycle'] == cycle and a['decision'] == 'pending']
+    return {
+        'current_cycle': cycle,
+        'current_step': min(pending_steps) if pending_steps else None,
+        'pending_count': len(pending_steps),
+    }
+
+
+def sync_route_state(document):
+    """
+    Вызывается после каждого перехода согласования. Блокирует строку
+    документа, пересчитывает current_cycle/current_step/pending_count и
+    строки входящих в одной транзакции.
+    """
+    with transaction.atomic():
+        list(Document.objects.select_for_update().filter(pk=document.pk).values_list('pk', flat=True))
+        approvals = list(Approval.objects.filter(document=document).values(*APPROVAL_FIELDS))
+
+        state = compute_route_state(approvals)
+        if any(getattr(document, f) != state[f] for f in STATE_FIELDS):
+            Document.objects.filter(pk=document.pk).update(**state)
+        for f in STATE_FIELDS:
+            setattr(document, f, state[f])
+
+        sync_document_inbox(document, approvals)
+        # Число документов автора на согласовании зависит от статуса документа
+        invalidate_dashboard([document.author_id])
+
+
+def backfill_route_state(batch_size=BULK_BATCH_SIZE, stdout=None):
+    """Пересчёт current_cycle/current_step/pending_count для всех документов."""
+    last_id = 0
+    updated = 0
+    while True:
+        documents = list(
+            Document.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', *STATE_FIELDS)[:batch_size]
+        )
+        if not documents:
+            break
+        last_id = documents[-1].id
+
+        approvals = {}
+        for approval in Approval.objects.filter(document__in=documents).values('document_id', 'cycle', 'step', 'decision'):
+            approvals.setdefault(approval['document_id'], []).append(approval)
+
+        changed = []
+        for document in documents:
+            state = compute_route_state(approvals.get(document.id, []))
+            if any(getattr(document, f) != state[f] for f in STATE_FIELDS):
+                for f in STATE_FIELDS:
+                    setattr(document, f, state[f])
+                changed.append(document)
+
+        if changed:
+            Document.objects.bulk_update(changed, STATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+        updated += len(changed)
+        if stdout is not None:
+            stdout.write(f'Документов до id={last_id}: обновлено {updated}')
+    return updated
@@ -0,0 +1,161 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from documentflow.models import Document, DocumentFile, DocumentSearchEntry
+
+
+BULK_BATCH_SIZE = 500
+DEFAULT_SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'documentflow_search_fts'
+
+# Поля документа, изменение которых требует переиндексации
+INDEXED_FIELDS = frozenset({'title', 'registration_number', 'external_number', 'description'})
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_config():
+    return getattr(settings, 'SEARCH_CONFIG', DEFAULT_SEARCH_CONFIG)
+
+
+def search_backend():
+    """'postgres' — tsvector и GIN, 'fts5' — таблица FTS5 в SQLite, иначе 'scan'."""
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return 'fts5'
+    return 'scan'
+
+
+def search_documents(queryset, query):
+    """
+    Фильтрует документы по поисковой строке через индекс: слова ищутся
+    в названии, номерах, описании и тексте вложений, каждое слово — как
+    префикс. Регистрационный номер дополнительно сравнивается по началу
+    строки: парсер tsvector и FTS5 разбивают «2026-10» на отдельные токены.
+    """
+    query = ' '.join(query.split())
+    if not query:
+        return queryset
+    by_number = Q(registration_number__startswith=query)
+    backend = search_backend()
+    if backend == 'postgres':
+        expression = _tsquery_expression(query)
+        if not expression:
+            return queryset.filter(by_number)
+        matched = Q(search_entry__search_vector=SearchQuery(expression, config=search_config(), search_type='raw'))
+    elif backend == 'fts5':
+        expression = _fts_expression(query)
+        if not expression:
+            return queryset.filter(by_number)
+        matched = Q(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+        ))
+    else:
+        matched = Q()
+        for word in WORD_RE.findall(query):
+            matched &= Q(search_entry__content__icontains=word) | Q(search_entry__attachments_text__icontains=word)
+    return queryset.filter(matched | by_number)
+
+
+def schedule_reindex(document_id):
+    """Переиндексация документа после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: reindex_document(document_id))
+
+
+def reindex_document(document_id):
+    reindex_documents([document_id])
+
+
+def reindex_documents(document_ids):
+    """
+    Пересобирает строки индекса для документов: текст документа и
+    извлечённый ранее текст вложений одним запросом на таблицу.
+    """
+    documents = list(
+        Document.objects.filter(id__in=document_ids)
+        .values_list('id', 'title', 'registration_number', 'external_number', 'description')
+    )
+    if not documents:
+        return
+    ids = [row[0] for row in documents]
+    attachments = {}
+    for document_id, text in (
+        DocumentFile.objects.filter(document_id__in=ids).exclude(extracted_text='')
+        .order_by('id').values_list('document_id', 'extracted_text')
+    ):
+        attachments.setdefault(document_id, []).append(text)
+
+    entries = [
+        DocumentSearchEntry(
+            document_id=document_id,
+            content='\n'.join(part for part in parts if part),
+            attachments_text='\n'.join(attachments.get(document_id, [])),
+        )
+        for document_id, *parts in documents
+    ]
+    with transaction.atomic():
+        DocumentSearchEntry.objects.bulk_create(
+            entries,
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['document'],
+            update_fields=['content', 'attachments_text', 'updated_at'],
+        )
+        backend = search_backend()
+        if backend == 'postgres':
+            config = search_config()
+            DocumentSearchEntry.objects.filter(document_id__in=ids).update(
+                search_vector=(
+                    SearchVector('content', weight='A', config=config)
+                    + SearchVector('attachments_text', weight='C', config=config)
+                )
+            )
+        elif backend == 'fts5':
+            with connection.cursor() as cursor:
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, content, attachments_text) VALUES (%s, %s, %s)',
+                    [(entry.document_id, entry.content, entry.attachments_text) for entry in entries],
+                )
+
+
+def remove_from_index(document_id):
+    """Строку DocumentSearchEntry удаляет каскад, таблицу FTS5 чистим сами."""
+    if search_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [document_id])
+
+
+def rebuild_search_index(batch_size=BULK_BATCH_SIZE, stdout=None):
+    """Полная перестройка индекса пакетами документов по id."""
+    indexed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Document.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        reindex_documents(ids)
+        indexed += len(ids)
+        if stdout is not None:
+            stdout.write(f'Обработано до id={last_id}: проиндексировано документов {indexed}')
+    return indexed
+
+
+def _fts_expression(query):
+    """Слова запроса как префиксы, все обязательны: "дог"* AND "постав"*."""
+    return ' AND '.join(f'"{word}"*' for word in WORD_RE.findall(query.lower()))
+
+
+def _tsquery_expression(query):
+    """То же для to_tsquery: дог:* & постав:*. В словах только буквы и цифры, операторов нет."""
+    return ' & '.join(f'{word}:*' for word in WORD_RE.findall(query.lower()))
@@ -0,0 +1,69 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from documentflow.models import Notification, NotificationCounter
+
+
+def unread_count(user_id):
+    """Число непрочитанных уведомлений сотрудника из счётчика (без COUNT по уведомлениям)."""
+    value = (
+        NotificationCounter.objects
+        .filter(user_id=user_id)
+        .values_list('unread_count', flat=True)
+        .first()
+    )
+    if value is None:
+        recount_unread([user_id])
+        value = NotificationCounter.objects.get(user_id=user_id).unread_count
+    return value
+
+
+def change_unread(user_id, delta):
+    """Атомарное изменение счётчика одним UPDATE в транзакции записи уведомлений."""
+    updated = (
+        NotificationCounter.objects
+        .filter(user_id=user_id)
+        .update(unread_count=Greatest(F('unread_count') + delta, 0))
+    )
+    if not updated:
+        recount_unread([user_id])
+
+
+def recount_unread(user_ids):
+    """
+    Точный пересчёт счётчиков по таблице уведомлений одним UPDATE.
+    Используется после пакетной вставки и для сотрудников без строки счётчика.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+    unread = (
+        Notification.objects
+        .filter(user_id=OuterRef('user_id'), is_read=False)
+        .order_by()
+        .values('user_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    NotificationCounter.objects.filter(user_id__in=user_ids).update(
+        unread_count=Coalesce(Subquery(unread), 0)
+    )
+
+
+def mark_read(user_id, notification_ids=None):
+    """
+    Отмечает уведомления сотрудника прочитанными (все, если ids не заданы)
+    и уменьшает счётчик ровно на число реально изменённых строк.
+    """
+    notifications = Notification.objects.filter(user_id=user_id, is_read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(id__in=notification_ids)
+    changed = notifications.update(is_read=True, read_at=timezone.now())
+    if changed:
+        change_unread(user_id, -changed)
+    return changed
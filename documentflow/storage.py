@@ -0,0 +1,91 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_PREFIX = 'blobs'
+STAGING_DIR = f'{BLOB_PREFIX}/tmp'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_name(sha256, extension=''):
+    """Путь содержимого в хранилище: blobs/ab/cd/<sha256><расширение>."""
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def blob_extension(name):
+    return os.path.splitext(name)[1].lower()[:10]
+
+
+def hash_path(path):
+    """SHA-256 и размер файла на диске; (None, None), если файла нет."""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+    except FileNotFoundError:
+        return None, None
+    return digest.hexdigest(), size
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, где имя файла — хэш его содержимого.
+    Одинаковое содержимое хранится один раз, сколько бы документов
+    и версий на него ни ссылалось; учёт ссылок ведёт StoredBlob.
+    Старые имена (documents/...) по-прежнему открываются как обычно.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save
+        return name
+
+    def _save(self, name, content):
+        staged = self.staging_name()
+        digest = hashlib.sha256()
+        path = self.path(staged)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as destination:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                destination.write(chunk)
+        return self.commit_staged(staged, digest.hexdigest(), blob_extension(name))
+
+    def staging_name(self):
+        """Временное имя для записи файла, хэш которого ещё неизвестен."""
+        return f'{STAGING_DIR}/{uuid.uuid4().hex}'
+
+    def commit_staged(self, staged, sha256, extension=''):
+        """
+        Переносит записанный файл на место по хэшу переименованием, без
+        копирования. Если такое содержимое уже есть, временный файл удаляется.
+        До переноса строка StoredBlob создаётся или блокируется (reserve_blob),
+        чтобы sweep_blobs не удалил файл, пока на него записывается ссылка.
+        """
+        from documentflow.services.blobs import reserve_blob
+
+        name = blob_name(sha256, extension)
+        path = self.path(name)
+        reserve_blob(name, sha256, os.path.getsize(self.path(staged)))
+        if os.path.exists(path):
+            self.delete(staged)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.path(staged), path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        # Отметка времени защищает файл от удаления как неиспользуемого,
+        # в том числе если транзакция откатится и строка StoredBlob пропадёт
+        os.utime(path)
+        return name
+
+
+def content_storage():
+    return ContentAddressedStorage()
@@ -1,3 +1,631 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from documentflow.models import (
+    Approval, ArchivedNotification, Department, Document, DocumentFile, DocumentRouteStep, DocumentRouteTemplate,
+    DocumentStatus, DailyActivity, DocumentType, DocumentVersion, EmailOutbox, InboxEntry, Notification,
+    NotificationCounter, RegistrationCounter, Role, StoredBlob, User
+)
+from documentflow.services.analytics import (
+    DASHBOARD_SUMMARY_QUERIES, PERSONAL_STATS_QUERIES, dashboard_summary, personal_stats
+)
+from documentflow.services.blobs import sweep_blobs
+from documentflow.services.chunked_uploads import UploadError, finish_upload, start_upload, write_chunk
+from documentflow.services.deadlines import scan_deadlines
+from documentflow.services.inbox import rebuild_inbox
+from documentflow.services.notifications import collect_notifications, notify
+from documentflow.services.outbox import enqueue_email, send_outbox
+from documentflow.services.retention import purge_notifications
+from documentflow.services.rollups import rebuild_rollups, record_decision
+
+
+DOCUMENTS = 120
+
+
+class RouteFixture:
+    """Автор, три согласующих из двух отделов и маршрут по типу документа."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Сотрудник')
+        cls.office = Department.objects.create(name='Канцелярия')
+        cls.legal = Department.objects.create(name='Юридический отдел')
+        cls.author = cls._user('author', cls.office, role)
+        cls.first = cls._user('first', cls.office, role)
+        cls.second = cls._user('second', cls.legal, role)
+        cls.third = cls._user('third', cls.legal, role)
+        cls.document_type = DocumentType.objects.create(name='Приказ', code='PR')
+        for name in ['На согласовании', 'Черновик', 'Согласовано', 'Отклонено']:
+            DocumentStatus.objects.create(name=name, is_final=name == 'Согласовано')
+        cls.template = DocumentRouteTemplate.objects.create(
+            name='Приказы', document_type=cls.document_type, approval_order='sequential'
+        )
+        DocumentRouteStep.objects.create(template=cls.template, step_number=1, user=cls.first)
+        DocumentRouteStep.objects.create(template=cls.template, step_number=2, user=cls.second)
+
+    @staticmethod
+    def _user(username, department, role):
+        return User.objects.create_user(
+            username, f'{username}@example.com', 'Passw0rd!',
+            role=role, department=department, last_name=username.title(), first_name='И', position='Инженер',
+        )
+
+    def _create(self, **data):
+        self.client.force_login(self.author)
+        payload = {
+            'title': 'Документ',
+            'document_type': self.document_type.id,
+            'deadline': (timezone.localdate() + timezone.timedelta(days=10)).isoformat(),
+            'delivery_mode': 'auto',
+            **data,
+        }
+        response = self.client.post('/api/documents/', payload)
+        self.assertEqual(response.status_code, 201, response.content)
+        return Document.objects.latest('id')
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов списков и счётчиков не зависит от объёма данных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Сотрудник')
+        department = Department.objects.create(name='Канцелярия')
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'Passw0rd!',
+            role=role, department=department, last_name='Автор', first_name='А', position='Инженер',
+        )
+        cls.approver = User.objects.create_user(
+            'approver', 'approver@example.com', 'Passw0rd!',
+            role=role, department=department, last_name='Согласующий', first_name='Б', position='Инженер',
+        )
+        document_type = DocumentType.objects.create(name='Приказ', code='PR')
+        status = DocumentStatus.objects.create(name='На согласовании')
+        deadline = timezone.localdate() + timezone.timedelta(days=10)
+        documents = [
+            Document.objects.create(
+                registration_number=f'PR-{i:04d}',
+                title=f'Документ {i}',
+                document_type=document_type,
+                status=status,
+                author=cls.author,
+                responsible=cls.author,
+                deadline=deadline,
+            )
+            for i in range(DOCUMENTS)
+        ]
+        Approval.objects.bulk_create([
+            Approval(document=document, approver=cls.approver, step=1, cycle=1, decision=decision)
+            for document in documents
+            for decision in (['approved'] if document.id % 2 else ['pending'])
+        ])
+        rebuild_inbox()
+
+    def setUp(self):
+        cache.clear()
+
+    def _list_queries(self, user, url, page_size):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), page_size)
+        return len(context)
+
+    def test_incoming_queries_do_not_depend_on_page_size(self):
+        url = '/api/documents/incoming/'
+        self.assertEqual(
+            self._list_queries(self.approver, url, 10),
+            self._list_queries(self.approver, url, 100),
+        )
+
+    def test_my_documents_queries_do_not_depend_on_page_size(self):
+        url = '/api/documents/my/'
+        self.assertEqual(
+            self._list_queries(self.author, url, 10),
+            self._list_queries(self.author, url, 100),
+        )
+
+    def test_dashboard_summary_budget(self):
+        with self.assertNumQueries(DASHBOARD_SUMMARY_QUERIES):
+            dashboard_summary(self.approver)
+        with self.assertNumQueries(0):
+            dashboard_summary(self.approver)
+
+    def test_personal_stats_budget(self):
+        with self.assertNumQueries(PERSONAL_STATS_QUERIES):
+            personal_stats(self.approver)
+
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='documentflow-tests-')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BlobRefTests(TestCase):
+    """Число ссылок StoredBlob следует за файлами и версиями документов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Сотрудник')
+        department = Department.objects.create(name='Канцелярия')
+        author = User.objects.create_user('author', 'author@example.com', 'Passw0rd!', role=role, department=department)
+        cls.document = Document.objects.create(
+            registration_number='PR-0001',
+            title='Документ',
+            document_type=DocumentType.objects.create(name='Приказ', code='PR'),
+            status=DocumentStatus.objects.create(name='На согласовании'),
+            author=author,
+            responsible=author,
+            deadline=timezone.localdate(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def _attach(self, content, name='a.pdf'):
+        document_file = DocumentFile(document=self.document)
+        document_file.file.save(name, ContentFile(content), save=False)
+        document_file.save()
+        return document_file
+
+    def _refs(self, name):
+        return StoredBlob.objects.get(name=name).ref_count
+
+    def test_create_and_delete(self):
+        first = self._attach(b'one')
+        second = self._attach(b'one')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(self._refs(first.file.name), 2)
+        DocumentVersion.objects.create(document=self.document, file=first.file.name, version=1)
+        self.assertEqual(self._refs(first.file.name), 3)
+        first.delete()
+        self.assertEqual(self._refs(second.file.name), 2)
+
+    def test_replace_moves_reference(self):
+        document_file = self._attach(b'old')
+        old_name = document_file.file.name
+        document_file.file.save('b.pdf', ContentFile(b'new'), save=False)
+        document_file.save()
+        self.assertEqual(self._refs(old_name), 0)
+        self.assertEqual(self._refs(document_file.file.name), 1)
+        document_file.description = 'без замены файла'
+        document_file.save(update_fields=['description'])
+        document_file.save()
+        self.assertEqual(self._refs(document_file.file.name), 1)
+
+    def test_sweep_keeps_referenced_blobs(self):
+        kept = self._attach(b'kept')
+        dropped = self._attach(b'dropped')
+        dropped_name = dropped.file.name
+        dropped.delete()
+        storage = kept.file.storage
+        sweep_blobs(grace=timezone.timedelta(0))
+        self.assertTrue(os.path.exists(storage.path(kept.file.name)))
+        self.assertFalse(os.path.exists(storage.path(dropped_name)))
+        self.assertFalse(StoredBlob.objects.filter(name=dropped_name).exists())
+
+
+class NotificationDeltaTests(TestCase):
+    """Дельта уведомлений по since_id не теряет старые при отставании клиента."""
+
+    def test_delta_pages_through_backlog(self):
+        role = Role.objects.create(name='Сотрудник')
+        department = Department.objects.create(name='Канцелярия')
+        user = User.objects.create_user('reader', 'reader@example.com', 'Passw0rd!', role=role, department=department)
+        created = [
+            Notification.objects.create(user=user, notification_type='system', title=f'Уведомление {i}').id
+            for i in range(45)
+        ]
+        self.client.force_login(user)
+        received = []
+        cursor = 0
+        while True:
+            response = self.client.get('/api/notifications/', {'since_id': cursor})
+            if response.status_code == 304:
+                break
+            body = response.json()
+            self.assertLessEqual(len(body['results']), 20)
+            received += [item['id'] for item in body['results']]
+            cursor = body['last_id']
+        self.assertEqual(received, created)
+
+
+class RegistrationNumberTests(RouteFixture, TestCase):
+    """Номера выдаются по порядку и без пропусков."""
+
+    def test_numbers_are_consecutive(self):
+        numbers = [self._create().registration_number for _ in range(3)]
+        period = timezone.localdate().strftime('%Y-%m')
+        self.assertEqual(numbers, [f'{period}-0001', f'{period}-0002', f'{period}-0003'])
+
+    def test_failed_create_does_not_burn_a_number(self):
+        first = self._create()
+        with mock.patch('api_doc.serializers.start_document_route', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._create(title='Сорвётся на маршруте')
+        self.assertFalse(Document.objects.filter(title='Сорвётся на маршруте').exists())
+        second = self._create()
+        self.assertEqual(int(second.registration_number[-4:]), int(first.registration_number[-4:]) + 1)
+        self.assertEqual(RegistrationCounter.objects.get().last_number, 2)
+
+
+class CollectNotificationsTests(TestCase):
+    """Пакет уведомлений записывается после фиксации и не теряет разные события."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Сотрудник')
+        department = Department.objects.create(name='Канцелярия')
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'Passw0rd!', role=role, department=department
+        )
+
+    def test_rollback_discards_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    with collect_notifications():
+                        notify(self.user, 'system', 'Будет отменено')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(Notification.objects.exists())
+
+    def test_written_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with collect_notifications():
+                notify(self.user, 'system', 'После фиксации')
+            self.assertFalse(Notification.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_only_identical_notifications_coalesce(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with collect_notifications():
+                notify(self.user, 'status_change', 'Статус', text='На согласовании')
+                notify(self.user, 'status_change', 'Статус', text='Согласовано')
+                notify(self.user, 'status_change', 'Статус', text='Согласовано')
+        self.assertEqual(
+            sorted(Notification.objects.values_list('text', flat=True)),
+            ['На согласовании', 'Согласовано'],
+        )
+
+
+class FailingConnection:
+    """Почтовое соединение, на котором любая отправка падает."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+    EMAIL_OUTBOX_RETRY_DELAY=0,
+)
+class OutboxTests(TestCase):
+    """Повтор неудачной отправки и стирание текста писем с паролями."""
+
+    def test_sent_email_is_scrubbed(self):
+        item = enqueue_email('user@example.com', 'Доступ', '<p>Пароль: Secret1!</p>')
+        self.assertEqual(send_outbox(), {'sent': 1, 'failed': 0})
+        self.assertIn('Secret1!', mail.outbox[0].body)
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.body, item.html_body), ('sent', '', ''))
+
+    def test_retry_then_fail_and_scrub(self):
+        item = enqueue_email('user@example.com', 'Доступ', '<p>Пароль: Secret1!</p>')
+        send_outbox(max_batches=1, connection=FailingConnection())
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), ('pending', 1))
+        self.assertIn('Secret1!', item.html_body)
+
+        send_outbox(max_batches=1, connection=FailingConnection())
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts, item.body, item.html_body), ('failed', 2, '', ''))
+        self.assertIn('SMTP недоступен', item.last_error)
+
+        self.assertEqual(send_outbox(), {'sent': 0, 'failed': 0})
+        self.assertEqual(EmailOutbox.objects.get().status, 'failed')
+
+
+class RollupTests(TestCase):
+    """Приращения сводок совпадают с полным пересчётом и не уходят в минус."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Сотрудник')
+        department = Department.objects.create(name='Канцелярия')
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'Passw0rd!', role=role, department=department
+        )
+        cls.approver = User.objects.create_user(
+            'approver', 'approver@example.com', 'Passw0rd!', role=role, department=department
+        )
+        cls.document = Document.objects.create(
+            registration_number='PR-0001',
+            title='Документ',
+            document_type=DocumentType.objects.create(name='Приказ', code='PR'),
+            status=DocumentStatus.objects.create(name='На согласовании'),
+            author=cls.author,
+            responsible=cls.author,
+            deadline=timezone.localdate(),
+        )
+
+    def _activity(self):
+        return sorted(
+            DailyActivity.objects.filter(user=self.approver)
+            .exclude(decided_count=0, processing_time=timezone.timedelta())
+            .values_list('day', 'decided_count', 'processed_count', 'processing_time')
+        )
+
+    def test_reversal_moves_contribution_between_days(self):
+        now = timezone.now()
+        approval = Approval.objects.create(document=self.document, approver=self.approver, step=1, cycle=1)
+        Approval.objects.filter(pk=approval.pk).update(
+            created_at=now - timezone.timedelta(days=3),
+            decision='approved',
+            decided_at=now - timezone.timedelta(days=2),
+        )
+        approval.refresh_from_db()
+        record_decision(approval)
+
+        previous = (approval.decision, approval.decided_at)
+        approval.decision = 'returned'
+        approval.decided_at = now
+        approval.save()
+        record_decision(approval, previous=previous)
+
+        incremental = self._activity()
+        rebuild_rollups()
+        self.assertEqual(incremental, self._activity())
+        self.assertEqual(len(incremental), 1)
+
+    def test_processing_time_does_not_go_negative(self):
+        now = timezone.now()
+        approval = Approval.objects.create(
+            document=self.document, approver=self.approver, step=1, cycle=1, decision='returned', decided_at=now
+        )
+        Approval.objects.filter(pk=approval.pk).update(created_at=now - timezone.timedelta(days=3))
+        approval.refresh_from_db()
+        # Снимается решение, которого в сводках не было
+        record_decision(approval, previous=('approved', now - timezone.timedelta(days=2)))
+        day = timezone.localdate(now - timezone.timedelta(days=2))
+        activity = DailyActivity.objects.get(user=self.approver, day=day)
+        self.assertEqual(activity.decided_count, 0)
+        self.assertEqual(activity.processing_time, timezone.timedelta())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ChunkedUploadTests(TestCase):
+    """Загрузка частями: порядок частей, докачка и проверка SHA-256."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='Сотрудник')
+        department = Department.objects.create(name='Канцелярия')
+        cls.user = User.objects.create_user(
+            'author', 'author@example.com', 'Passw0rd!', role=role, department=department
+        )
+
+    data = b'%PDF-1.4\n' + bytes(range(256)) * 40
+
+    def _put(self, session, start, end, body=None):
+        body = self.data[start:end + 1] if body is None else body
+        return write_chunk(session.pk, self.user, start, end, io.BytesIO(body))
+
+    def test_resume_after_broken_chunk(self):
+        session = start_upload(self.user, 'a.pdf', len(self.data), hashlib.sha256(self.data).hexdigest())
+        half = len(self.data) // 2
+        self._put(session, 0, half - 1)
+
+        with self.assertRaises(UploadError) as broken:
+            self._put(session, half, len(self.data) - 1, body=self.data[half:half + 100])
+        self.assertEqual(broken.exception.status, 400)
+        with self.assertRaises(UploadError) as out_of_order:
+            self._put(session, half + 10, len(self.data) - 1)
+        self.assertEqual(out_of_order.exception.status, 409)
+        session.refresh_from_db()
+        self.assertEqual(session.received, half)
+
+        self._put(session, half, len(self.data) - 1)
+        session = finish_upload(session.pk, self.user)
+        self.assertEqual(session.status, 'complete')
+        self.assertEqual(session.sha256, hashlib.sha256(self.data).hexdigest())
+        with DocumentFile._meta.get_field('file').storage.open(session.stored_name) as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_checksum_mismatch_restarts_upload(self):
+        session = start_upload(self.user, 'a.pdf', len(self.data), '0' * 64)
+        self._put(session, 0, len(self.data) - 1)
+        with self.assertRaises(UploadError) as mismatch:
+            finish_upload(session.pk, self.user)
+        self.assertEqual(mismatch.exception.status, 422)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.received), ('open', 0))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentDetailQueryTests(RouteFixture, TestCase):
+    """Карточка документа не делает запросов на каждый файл и версию."""
+
+    def _detail_queries(self, document):
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/documents/{document.id}/')
+        self.assertEqual(response.status_code, 200)
+        versions = response.json()['versions']
+        self.assertTrue(all(version['file_id'] for version in versions))
+        self.assertNotIn('file', versions[0])
+        return len(context)
+
+    def _add_versions(self, document, count):
+        for _ in range(count):
+            name = f'blobs/00/00/{DocumentFile.objects.count():064d}.pdf'
+            DocumentFile.objects.create(document=document, file=name, file_name='a.pdf', uploaded_by=self.author)
+            DocumentVersion.objects.create(document=document, file=name, created_by=self.author)
+
+    def test_queries_do_not_depend_on_versions(self):
+        small, large = self._create(status_code='draft'), self._create(status_code='draft')
+        self._add_versions(small, 1)
+        self._add_versions(large, 5)
+        self.assertEqual(self._detail_queries(small), self._detail_queries(large))
+
+
+class RouteTests(RouteFixture, TestCase):
+    """Маршрут согласования, строки входящих и состояние документа."""
+
+    def _act(self, user, document, action, **data):
+        self.client.force_login(user)
+        response = self.client.post(f'/api/documents/{document.id}/{action}/', data)
+        self.assertEqual(response.status_code, 200, response.content)
+        document.refresh_from_db()
+        return response
+
+    def _inbox(self, document):
+        return {
+            entry.user_id: (entry.is_actionable, entry.is_visible, entry.last_decision, entry.cycle)
+            for entry in InboxEntry.objects.filter(document=document)
+        }
+
+    def _assert_inbox_matches_rebuild(self, document):
+        incremental = self._inbox(document)
+        rebuild_inbox()
+        self.assertEqual(incremental, self._inbox(document))
+
+    def test_auto_route_is_sequential(self):
+        document = self._create()
+        self.assertEqual(
+            sorted(document.approvals.values_list('approver_id', 'step', 'cycle')),
+            sorted([(self.first.id, 1, 1), (self.second.id, 2, 1)]),
+        )
+        self.assertEqual((document.current_cycle, document.current_step, document.pending_count), (1, 1, 2))
+        inbox = self._inbox(document)
+        self.assertEqual(inbox[self.first.id][:2], (True, True))
+        self.assertEqual(inbox[self.second.id][:2], (False, False))
+
+    def test_parallel_manual_route_dedupes_approvers(self):
+        route = json.dumps([{'type': 'department', 'id': self.legal.id}, {'type': 'user', 'id': self.second.id}])
+        document = self._create(delivery_mode='manual', approval_order='parallel', manual_route=route)
+        self.assertEqual(
+            sorted(document.approvals.values_list('approver_id', 'step')),
+            sorted([(self.second.id, 1), (self.third.id, 1)]),
+        )
+        self.assertEqual(document.pending_count, 2)
+
+    def test_approve_moves_to_next_step(self):
+        document = self._create()
+        self._act(self.first, document, 'approve')
+        self.assertEqual((document.current_step, document.pending_count), (2, 1))
+        inbox = self._inbox(document)
+        self.assertEqual(inbox[self.first.id][:3], (False, True, 'approved'))
+        self.assertEqual(inbox[self.second.id][:2], (True, True))
+        self._assert_inbox_matches_rebuild(document)
+
+    def test_reject_and_resubmit_start_new_cycle(self):
+        document = self._create()
+        self._act(self.first, document, 'reject', comment='Нет подписи')
+        self.assertEqual((document.current_cycle, document.current_step, document.pending_count), (1, None, 0))
+        self.assertFalse(InboxEntry.objects.filter(document=document, is_actionable=True).exists())
+
+        self._act(self.author, document, 'resubmit')
+        self.assertEqual((document.current_cycle, document.current_step, document.pending_count), (2, 1, 2))
+        self.assertEqual(document.approvals.filter(cycle=2).count(), 2)
+        self.assertEqual(self._inbox(document)[self.first.id], (True, True, 'pending', 2))
+        self._assert_inbox_matches_rebuild(document)
+
+
+class DeadlineAndRetentionTests(RouteFixture, TestCase):
+    """Уведомления о сроке не дублируются, в том числе после очистки."""
+
+    def test_scan_is_idempotent_across_retention(self):
+        document = self._create(deadline=(timezone.localdate() + timezone.timedelta(days=1)).isoformat())
+        self.assertEqual(scan_deadlines(), 1)
+        self.assertEqual(scan_deadlines(), 0)
+        notification = Notification.objects.get(notification_type='deadline', document=document)
+        self.assertEqual(notification.user_id, self.first.id)
+
+        # Прочитанное уведомление о сроке при очистке переносится в архив, а не удаляется
+        Notification.objects.filter(pk=notification.pk).update(
+            is_read=True, created_at=timezone.now() - timezone.timedelta(days=400)
+        )
+        self.assertEqual(purge_notifications(read_days=90, unread_days=180), {'deleted': 0, 'archived': 1})
+        self.assertTrue(ArchivedNotification.objects.filter(notification_id=notification.pk).exists())
+        self.assertEqual(scan_deadlines(), 0)
+
+    def test_retention_deletes_read_and_archives_unread(self):
+        old = timezone.now() - timezone.timedelta(days=400)
+        read = Notification.objects.create(user=self.first, title='Прочитано', is_read=True)
+        unread = Notification.objects.create(user=self.first, title='Не прочитано')
+        fresh = Notification.objects.create(user=self.first, title='Свежее')
+        Notification.objects.filter(pk__in=[read.pk, unread.pk]).update(created_at=old)
+
+        self.assertEqual(purge_notifications(read_days=90, unread_days=180), {'deleted': 1, 'archived': 1})
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [fresh.pk])
+        self.assertTrue(ArchivedNotification.objects.filter(notification_id=unread.pk).exists())
+        self.assertEqual(NotificationCounter.objects.get(user=self.first).unread_count, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FileDownloadTests(RouteFixture, TestCase):
+    """Скачивание файла: ETag, условные запросы и диапазоны."""
+
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        document = self._create(status_code='draft')
+        document_file = DocumentFile(document=document, file_name='a.pdf', uploaded_by=self.author)
+        document_file.file.save('a.pdf', ContentFile(self.content), save=False)
+        document_file.sha256 = hashlib.sha256(self.content).hexdigest()
+        document_file.save()
+        self.url = f'/api/files/{document_file.id}/download/'
+
+    def test_full_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-16')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-16:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"другая-версия"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_users_cannot_download(self):
+        self.client.force_login(self.third)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -0,0 +1,248 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.template.defaultfilters import filesizeformat
+
+
+MB = 1024 * 1024
+DEFAULT_UPLOAD_LIMITS = {
+    'PDF': 50 * MB,
+    'Word': 30 * MB,
+    'Excel': 30 * MB,
+    'Image': 15 * MB,
+    'Other': 20 * MB,
+}
+
+FILE_TYPE_EXTENSIONS = {
+    'PDF': ['.pdf'],
+    'Word': ['.doc', '.docx'],
+    'Excel': ['.xls', '.xlsx'],
+    'Image': ['.jpg', '.jpeg', '.png', '.gif'],
+}
+
+# Сигнатуры начала файла: (префикс, MIME-тип)
+MAGIC_SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'{\\rtf', 'application/rtf'),
+]
+ZIP_SIGNATURE = b'PK\x03\x04'
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_FORMATS = {
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+OLE_FORMATS = {
+    '.doc': 'application/msword',
+    '.xls': 'application/vnd.ms-excel',
+}
+
+
+def file_type_for(name):
+    """Категория файла по расширению: PDF, Word, Excel, Image или Other."""
+    ext = os.path.splitext(name)[1].lower()
+    for file_type, extensions in FILE_TYPE_EXTENSIONS.items():
+        if ext in extensions:
+            return file_type
+    return 'Other'
+
+
+def sniff_mime(head, name=''):
+    """MIME-тип по первым байтам содержимого; для контейнеров ZIP/OLE уточняется по расширению."""
+    for signature, mime in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    ext = os.path.splitext(name)[1].lower()
+    if head.startswith(ZIP_SIGNATURE):
+        return ZIP_FORMATS.get(ext, 'application/zip')
+    if head.startswith(OLE_SIGNATURE):
+        return OLE_FORMATS.get(ext, 'application/x-ole-storage')
+    if head[8:12] == b'WEBP' and head.startswith(b'RIFF'):
+        return 'image/webp'
+    try:
+        head[:1024].decode('utf-8')
+    except UnicodeDecodeError:
+        return 'application/octet-stream'
+    return 'text/plain'
+
+
+def file_type_for_mime(mime):
+    if mime == 'application/pdf':
+        return 'PDF'
+    if mime.startswith('image/'):
+        return 'Image'
+    if mime in ('application/msword', 'application/rtf', ZIP_FORMATS['.docx']):
+        return 'Word'
+    if mime in ('application/vnd.ms-excel', ZIP_FORMATS['.xlsx']):
+        return 'Excel'
+    return 'Other'
+
+
+def upload_limit(file_type):
+    limits = {**DEFAULT_UPLOAD_LIMITS, **getattr(settings, 'UPLOAD_SIZE_LIMITS', {})}
+    return limits.get(file_type, limits['Other'])
+
+
+class StreamedUpload(UploadedFile):
+    """
+    Файл, уже записанный обработчиком в итоговое хранилище.
+    stored_name — имя в хранилище, его можно присвоить FileField без
+    повторного копирования.
+    """
+
+    def __init__(self, storage, stored_name, name, size, content_type, sha256, file_type):
+        self.storage = storage
+        self.stored_name = stored_name
+        self.sha256 = sha256
+        self.file_type = file_type
+        self.attached = False
+        self._file = None
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = self.storage.open(self.stored_name, 'rb')
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = value
+
+    def discard(self):
+        self.close()
+        self.storage.delete(self.stored_name)
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Пишет каждый фрагмент загружаемого файла сразу в итоговое место
+    хранилища, по ходу считая SHA-256 и размер и определяя MIME-тип
+    по первым байтам. Превышение лимита для типа файла прерывает приём
+    сразу, а не после загрузки: недописанный файл удаляется, ошибка
+    сохраняется в request.upload_errors.
+    """
+
+    def __init__(self, request, field):
+        super().__init__(request)
+        self.field = field
+        self.storage = field.storage
+        self.destination = None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.file_type = file_type_for(file_name)
+        self.limit = upload_limit(self.file_type)
+        if content_length and content_length > self.limit:
+            self._reject()
+        self.stored_name, self.destination = self._open_destination(file_name)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.mime_type = ''
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.mime_type:
+            self.mime_type = sniff_mime(raw_data, self.file_name)
+            # Содержимое, не похожее на расширение, ограничивается строже
+            self.limit = min(self.limit, upload_limit(file_type_for_mime(self.mime_type)))
+        self.size += len(raw_data)
+        if self.size > self.limit:
+            self._discard_destination()
+            self._reject()
+        self.digest.update(raw_data)
+        self.destination.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.destination.close()
+        self.destination = None
+        upload = StreamedUpload(
+            self.storage,
+            self.stored_name,
+            self.file_name,
+            self.size,
+            self.mime_type or 'application/octet-stream',
+            self.digest.hexdigest(),
+            self.file_type,
+        )
+        self.request.streamed_uploads.append(upload)
+        return upload
+
+    def upload_interrupted(self):
+        self._discard_destination()
+
+    def _open_destination(self, file_name):
+        if hasattr(self.storage, 'staging_name'):
+            # Хранилище по содержимому: имя станет известно после подсчёта хэша
+            name = self.storage.staging_name()
+        else:
+            name = self.field.generate_filename(None, file_name)
+        while True:
+            name = self.storage.get_available_name(name, max_length=self.field.max_length)
+            path = self.storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            except FileExistsError:
+                # Имя успели занять параллельно, берём следующее свободное
+                continue
+            if self.storage.file_permissions_mode is not None:
+                os.chmod(path, self.storage.file_permissions_mode)
+            return name, os.fdopen(fd, 'wb')
+
+    def _discard_destination(self):
+        if self.destination is not None:
+            self.destination.close()
+            self.destination = None
+            self.storage.delete(self.stored_name)
+
+    def _reject(self):
+        self.request.upload_errors.append(size_limit_error(self.file_name, self.limit))
+        raise SkipFile()
+
+
+def install_upload_handlers(request, field):
+    """
+    Ставит потоковый обработчик первым для запроса, пока тело ещё не
+    прочитано. Для хранилищ без локального пути (S3 и т.п.) остаются
+    стандартные обработчики Django.
+    """
+    request.upload_errors = []
+    request.streamed_uploads = []
+    try:
+        field.storage.path('')
+    except NotImplementedError:
+        return
+    request.upload_handlers = [StreamingUploadHandler(request, field)] + list(request.upload_handlers)
+
+
+def upload_errors(request, files=()):
+    """
+    Ошибки загрузки файлов запроса. Файлы, принятые стандартными
+    обработчиками, проверяются на лимит здесь, по уже известному размеру.
+    """
+    errors = list(getattr(request, 'upload_errors', []))
+    for upload in files:
+        if not isinstance(upload, StreamedUpload):
+            limit = upload_limit(file_type_for(upload.name))
+            if upload.size > limit:
+                errors.append(size_limit_error(upload.name, limit))
+    return errors
+
+
+def discard_unattached_uploads(request):
+    """Удаляет записанные файлы, которые так и не были привязаны к документу."""
+    for upload in getattr(request, 'streamed_uploads', []):
+        if not upload.attached:
+            upload.discard()
+
+
+def size_limit_error(name, limit):
+    return f'Файл «{name}» больше допустимых {filesizeformat(limit)}'
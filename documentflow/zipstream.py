@@ -0,0 +1,57 @@
+import os
+import zipfile
+
+
+READ_SIZE = 64 * 1024
+
+# Форматы, которые уже сжаты внутри: повторное сжатие только тратит процессор
+STORED_EXTENSIONS = {
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.pdf', '.jpg', '.jpeg', '.png',
+    '.gif', '.webp', '.zip', '.rar', '.7z', '.gz', '.mp3', '.mp4',
+}
+
+
+class ZipStream:
+    """
+    Приёмник для zipfile без перемотки: записанное забирается порциями,
+    поэтому архив отдаётся клиенту по мере формирования.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_entry(name, date_time, size=None):
+    """Запись архива; уже сжатые форматы кладутся без сжатия."""
+    entry = zipfile.ZipInfo(name, date_time=date_time)
+    extension = os.path.splitext(name)[1].lower()
+    entry.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    if size is not None:
+        # По известному размеру zipfile заранее решает, нужен ли ZIP64
+        entry.file_size = size
+    return entry
+
+
+def write_file(stream, archive, entry, source):
+    """Копирует файл в архив порциями, отдавая готовые байты по ходу записи."""
+    with archive.open(entry, 'w') as target:
+        for data in iter(lambda: source.read(READ_SIZE), b''):
+            target.write(data)
+            yield stream.pop()
@@ -3,6 +3,10 @@ ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Потоковые уведомления (/api/notifications/stream/ и /poll/) рассчитаны
+на запуск под ASGI-сервером (uvicorn, daphne): под WSGI каждое открытое
+соединение занимает рабочий поток.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -81,6 +81,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'documentflow.context_processors.notification_delivery',
             ],
         },
     },
@@ -180,3 +181,58 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool, default=True)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=(EMAIL_HOST_USER or 'no-reply@documentflow.local'))
+# Очередь исходящих писем (команда send_outbox): число попыток и начальная задержка повтора, секунд
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', cast=int, default=5)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', cast=int, default=60)
+
+# Регистрационные номера: отдельная нумерация для каждого кода типа документа (КОД-ГГГГ-ММ-NNNN)
+REGISTRATION_NUMBER_PER_TYPE = config('REGISTRATION_NUMBER_PER_TYPE', cast=bool, default=False)
+
+# Кэш (локально locmem). В продакшене нужен общий бэкенд, например Redis или Memcached:
+# счётчики кабинета сбрасываются через кэш, и locmem одного процесса не видит
+# сбросов, сделанных в других воркерах
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='documentflow'),
+    }
+}
+
+# Время жизни кэша счётчиков рабочего кабинета, секунд
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', cast=int, default=300)
+
+# Доставка уведомлений в реальном времени (SSE / long-poll, требует ASGI-сервера)
+NOTIFICATION_BROKER = config('NOTIFICATION_BROKER', default='documentflow.services.notification_bus.InProcessBroker')
+NOTIFICATION_STREAM_HEARTBEAT = config('NOTIFICATION_STREAM_HEARTBEAT', cast=int, default=15)
+NOTIFICATION_STREAM_RESYNC = config('NOTIFICATION_STREAM_RESYNC', cast=int, default=30)
+
+# Хранение уведомлений (команда purge_notifications), дней; 0 отключает правило
+NOTIFICATION_READ_RETENTION_DAYS = config('NOTIFICATION_READ_RETENTION_DAYS', cast=int, default=90)
+NOTIFICATION_UNREAD_ARCHIVE_DAYS = config('NOTIFICATION_UNREAD_ARCHIVE_DAYS', cast=int, default=180)
+
+# Фоновое формирование отчётов об истории документов: число рабочих потоков на процесс
+HISTORY_REPORT_WORKERS = config('HISTORY_REPORT_WORKERS', cast=int, default=2)
+
+# Лимиты размера загружаемых файлов по типу, байт (PDF, Word, Excel, Image, Other)
+UPLOAD_SIZE_LIMITS = {
+    'PDF': config('UPLOAD_MAX_PDF', cast=int, default=50 * 1024 * 1024),
+    'Word': config('UPLOAD_MAX_WORD', cast=int, default=30 * 1024 * 1024),
+    'Excel': config('UPLOAD_MAX_EXCEL', cast=int, default=30 * 1024 * 1024),
+    'Image': config('UPLOAD_MAX_IMAGE', cast=int, default=15 * 1024 * 1024),
+    'Other': config('UPLOAD_MAX_OTHER', cast=int, default=20 * 1024 * 1024),
+}
+
+# Загрузка файлов частями: максимальный размер одной части, байт, и срок жизни брошенной загрузки, часов
+UPLOAD_CHUNK_MAX_SIZE = config('UPLOAD_CHUNK_MAX_SIZE', cast=int, default=16 * 1024 * 1024)
+UPLOAD_SESSION_TTL_HOURS = config('UPLOAD_SESSION_TTL_HOURS', cast=int, default=24)
+
+# Передача файлов документов через прокси: '' — отдаёт Django, 'x-accel-redirect' — nginx
+# (internal-локация FILE_DOWNLOAD_ACCEL_PREFIX с alias на MEDIA_ROOT), 'x-sendfile' — Apache/lighttpd
+FILE_DOWNLOAD_OFFLOAD = config('FILE_DOWNLOAD_OFFLOAD', default='')
+FILE_DOWNLOAD_ACCEL_PREFIX = config('FILE_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+
+# Превью файлов (миниатюры изображений, начало текста DOCX): число процессов построения
+PREVIEW_WORKERS = config('PREVIEW_WORKERS', cast=int, default=2)
+
+# Полнотекстовый поиск по документам: конфигурация текстового поиска PostgreSQL
+SEARCH_CONFIG = config('SEARCH_CONFIG', default='russian')